@@ -0,0 +1,372 @@
+"""
+Pipeline Load Test
+Drives StockTicker.on_message and stock_command with a synthetic message
+firehose, fully offline: fake Discord channels, a stub Yahoo backend and a
+local fake chart-img.com server, each with configurable latency
+
+Reports throughput, reply latency percentiles and upstream call counts.
+With --max-p95 the exit status is 1 when the p95 reply latency is above
+the limit, so a release can be gated on it.
+
+Usage: python benchmarks/bench_pipeline.py [--messages 2000] [--rate 200] [--max-p95 1500]
+"""
+import os
+import sys
+import time
+import types
+import random
+import socket
+import asyncio
+import zlib
+import struct
+import argparse
+import tempfile
+import itertools
+import contextlib
+import collections
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHATTER = [
+    "gm everyone, coffee first then charts",
+    "did anyone watch the fed presser? rates unchanged apparently",
+    "lol that dip this morning was brutal",
+    "I'm holding until earnings, not selling a single share",
+    "anyone know a good book on options pricing?",
+    "posting my watchlist later tonight after dinner",
+]
+# Single-ticker templates; the options ask for bars (indicator values) as well as charts
+SINGLE = [
+    "${0} looks strong today",
+    "${0} 1h RSI breaking out?",
+    "what do you think of ${0} 4h EMA,MACD",
+    "${0} 1d",
+]
+MULTI = [
+    "${0} and ${1} both green",
+    "watching ${0} 4h MACD and ${1} 1d BB",
+    "${0} ${1} ${2}",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--messages', type=int, default=2000, help='Messages sent')
+    parser.add_argument('--rate', type=float, default=50, help='Messages per second (0 = all at once)')
+    parser.add_argument('--no-ticker', type=float, default=0.80, help='Share of messages without a ticker')
+    parser.add_argument('--multi', type=float, default=0.05, help='Share of messages with several tickers')
+    parser.add_argument('--commands', type=float, default=0.02, help='Share of !stock commands')
+    parser.add_argument('--symbols', type=int, default=500, help='Size of the symbol universe')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of symbol popularity')
+    parser.add_argument('--yahoo-latency', type=float, default=0.15, help='Seconds per Yahoo call')
+    parser.add_argument('--chart-latency', type=float, default=0.4, help='Seconds per chart-img.com call')
+    parser.add_argument('--chart-errors', type=float, default=0.0, help='Share of chart calls answered 429')
+    parser.add_argument('--send-latency', type=float, default=0.05, help='Seconds per Discord send')
+    parser.add_argument('--channels', type=int, default=20, help='Channels the messages are spread over')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--max-p95', type=float, default=None, help='Fail above this p95 reply latency (ms)')
+    parser.add_argument('--verbose', action='store_true', help="Show the bot's own log lines")
+    return parser.parse_args()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def configure(port):
+    """Point the bot at the fake services; explicit environment variables win"""
+    defaults = {
+        'DISCORD_TOKEN': 'bench',
+        'CHARTIMG_API_KEY': 'bench',
+        'CHARTIMG_API_URL': f'http://127.0.0.1:{port}/v2/tradingview/advanced-chart',
+        'CHART_RENDERER': 'chartimg',
+        'USE_EMBEDDED_CHARTS': 'true',
+        'CACHE_BACKEND_URL': 'memory://',
+        'HISTORY_DIR': tempfile.mkdtemp(prefix='bench-bars-'),
+        'PREFETCH_ENABLED': 'false',
+        'METRICS_PORT': '0',
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+    # Nothing below may reach Yahoo: quotes and bars come from StubYahoo
+    def offline(*args, **kwargs):
+        raise RuntimeError("yfinance is not available in the offline benchmark")
+    sys.modules['yfinance'] = types.SimpleNamespace(Ticker=offline, download=offline)
+
+
+def solid_png(width, height, color=(19, 23, 34)):
+    """Minimal valid PNG, standing in for a chart-img.com image"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    row = b'\x00' + bytes(color) * width
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(row * height)) + chunk(b'IEND', b''))
+
+
+class StubYahoo:
+    """Deterministic quotes and bars, with a fixed latency per call (blocking, like yfinance)"""
+
+    def __init__(self, latency, seed):
+        self.latency = latency
+        self.seed = seed
+        self.calls = {'quote_batches': 0, 'quoted_symbols': 0, 'history': 0}
+
+    def fetch_stock_infos(self, symbols):
+        from utils.quotes import Quote
+
+        time.sleep(self.latency)
+        self.calls['quote_batches'] += 1
+        self.calls['quoted_symbols'] += len(symbols)
+        results = {}
+        for symbol in symbols:
+            rng = random.Random(f'{self.seed}:{symbol}')
+            price = rng.uniform(5, 500)
+            results[symbol] = Quote(
+                price=price,
+                previous_close=price * rng.uniform(0.95, 1.05),
+                name=f'{symbol} Corporation',
+                volume=rng.randint(10_000, 50_000_000),
+                market_cap=price * rng.randint(10**6, 10**9),
+                day_low=price * 0.98,
+                day_high=price * 1.02,
+                year_low=price * 0.6,
+                year_high=price * 1.4,
+            )
+        return results
+
+    def fetch_ohlcv(self, symbol, yahoo_interval='1d', period=None, start=None):
+        import numpy as np
+
+        time.sleep(self.latency)
+        self.calls['history'] += 1
+        step = {'1m': 60, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '1d': 86400,
+                '1wk': 7 * 86400, '1mo': 30 * 86400}.get(yahoo_interval, 86400)
+        end = time.time() // step * step
+        first = end - 500 * step if start is None else max(start, end - 500 * step)
+        times = np.arange(first, end + step, step, dtype=np.float64)
+        rng = np.random.default_rng(zlib.crc32(f'{self.seed}:{symbol}:{yahoo_interval}'.encode()))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(times))))
+        spread = close * rng.uniform(0.001, 0.01, len(times))
+        return {
+            'time': times,
+            'open': close - spread / 2,
+            'high': close + spread,
+            'low': close - spread,
+            'close': close,
+            'volume': rng.integers(1_000, 1_000_000, len(times)).astype(np.float64),
+        }
+
+
+async def start_chart_server(port, latency, error_ratio, seed):
+    """Fake chart-img.com endpoint; returns (runner, call counts by status)"""
+    from aiohttp import web
+
+    image = solid_png(800, 500)
+    rng = random.Random(seed)
+    calls = {}
+
+    async def handle(request):
+        await request.json()
+        await asyncio.sleep(latency)
+        status = 429 if rng.random() < error_ratio else 200
+        calls[status] = calls.get(status, 0) + 1
+        if status != 200:
+            return web.Response(status=status, text='Too Many Requests')
+        return web.Response(body=image, content_type='image/png')
+
+    app = web.Application()
+    app.router.add_post('/v2/tradingview/advanced-chart', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner, calls
+
+
+class FakeAuthor:
+    bot = False
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f'user{user_id}'
+
+
+class FakeChannel:
+    """Discord channel whose sends take a fixed time"""
+
+    def __init__(self, channel_id, latency):
+        self.id = channel_id
+        self.latency = latency
+        self.guild = None
+        self.sent = 0
+        self.embeds = 0
+        self.notices = collections.Counter()  # Error notice line by leading emoji
+
+    async def send(self, content=None, *, embed=None, embeds=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        self.embeds += len(embeds or ()) + (embed is not None)
+        for line in (content or '').splitlines():
+            self.notices[line.split(' ', 1)[0]] += 1
+        return FakeMessage(0, content or '', self, FakeAuthor(0))
+
+
+class FakeMessage:
+    def __init__(self, message_id, content, channel, author):
+        self.id = message_id
+        self.content = content
+        self.channel = channel
+        self.author = author
+        self.guild = None
+        self.embeds = []
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.channel.latency)
+
+
+class FakeContext:
+    """Command context: replies go through ctx.send"""
+
+    def __init__(self, channel, author):
+        self.channel = channel
+        self.author = author
+        self.guild = None
+
+    async def send(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+
+def build_firehose(args):
+    """(kind, text or symbol) per message; symbols follow a Zipf law"""
+    rng = random.Random(args.seed)
+    symbols = [f"S{index:03d}" if index >= 26 else chr(65 + index) * 3 for index in range(args.symbols)]
+    weights = list(itertools.accumulate(1 / (rank + 1) ** args.zipf for rank in range(len(symbols))))
+
+    def pick(count):
+        return rng.choices(symbols, cum_weights=weights, k=count)
+
+    firehose = []
+    for _ in range(args.messages):
+        roll = rng.random()
+        if roll < args.commands:
+            firehose.append(('command', pick(1)[0]))
+        elif roll < args.commands + args.no_ticker:
+            firehose.append(('none', rng.choice(CHATTER)))
+        elif roll < args.commands + args.no_ticker + args.multi:
+            template = rng.choice(MULTI)
+            firehose.append(('multi', template.format(*pick(3))))
+        else:
+            firehose.append(('single', rng.choice(SINGLE).format(*pick(1))))
+    return firehose
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def timed(handler, latencies):
+    """Run one handler; its latency is the time until all of its replies are sent"""
+    start = time.perf_counter()
+    await handler
+    latencies.append(time.perf_counter() - start)
+
+
+async def dispatch(cog, args, firehose, channels, latencies, counts):
+    """Deliver the firehose at args.rate, each message handled in its own task like discord.py does"""
+    ids = itertools.count(1)
+    tasks = []
+    start = time.perf_counter()
+    for index, (kind, payload) in enumerate(firehose):
+        if args.rate:
+            delay = start + index / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        counts[kind] = counts.get(kind, 0) + 1
+        channel = channels[index % len(channels)]
+        author = FakeAuthor(index % 97)
+        if kind == 'command':
+            handler = cog.stock_command.callback(cog, FakeContext(channel, author), payload)
+        else:
+            handler = cog.on_message(FakeMessage(next(ids), payload, channel, author))
+        # Chatter is handled too, but only messages with a reply count towards latency
+        tasks.append(asyncio.ensure_future(handler if kind == 'none' else timed(handler, latencies)))
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run(args, port):
+    import utils.quotes
+    from cogs.stock_ticker import StockTicker
+    from utils.tradingview import create_chart_session
+    from utils.metrics import metrics
+
+    yahoo = StubYahoo(args.yahoo_latency, args.seed)
+    utils.quotes.fetch_stock_infos = yahoo.fetch_stock_infos
+    utils.quotes.fetch_ohlcv = yahoo.fetch_ohlcv
+    runner, chart_calls = await start_chart_server(port, args.chart_latency, args.chart_errors, args.seed)
+
+    cog = StockTicker(bot=None)
+    cog.chart_session = create_chart_session()
+    cog.work_queue.start()
+    loop_lag = asyncio.ensure_future(metrics.watch_loop_lag(0.1))
+
+    latencies = []
+    channels = [FakeChannel(index, args.send_latency) for index in range(args.channels)]
+    firehose = build_firehose(args)
+    counts = {}
+
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, 'w')):
+        start = time.perf_counter()
+        results = await dispatch(cog, args, firehose, channels, latencies, counts)
+        elapsed = time.perf_counter() - start
+    loop_lag.cancel()
+
+    await cog.work_queue.close()
+    await cog.replies.close()
+    await cog.chart_session.close()
+    cog.quotes.close()
+    await cog.shared_backend.close()
+    await runner.cleanup()
+
+    failures = [result for result in results if isinstance(result, Exception)]
+    print(f"{args.messages} messages in {elapsed:.2f}s: "
+          + ', '.join(f"{kind} {count}" for kind, count in sorted(counts.items())))
+    embeds = sum(channel.embeds for channel in channels)
+    print(f"throughput   {args.messages / elapsed:8.1f} messages/s  {embeds / elapsed:8.1f} embeds/s")
+    print(f"latency      p50 {percentile(latencies, 0.50) * 1000:7.1f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  ({len(latencies)} messages answered)")
+    print(f"yahoo        {yahoo.calls['quote_batches']} quote batches "
+          f"({yahoo.calls['quoted_symbols']} symbols), {yahoo.calls['history']} history")
+    print("chart-img    " + (', '.join(f"{status}: {count}" for status, count in sorted(chart_calls.items())) or '0'))
+    print(f"discord      {sum(channel.sent for channel in channels)} sends, {embeds} embeds")
+    notices = sum((channel.notices for channel in channels), collections.Counter())
+    if notices:
+        print(f"notices      {', '.join(f'{kind} {count}' for kind, count in notices.most_common())}")
+    if failures:
+        print(f"errors       {len(failures)} handlers raised, first: {failures[0]!r}")
+    print()
+    print(metrics.summary())
+    return percentile(latencies, 0.95) * 1000, failures
+
+
+def main():
+    args = parse_args()
+    port = free_port()
+    configure(port)
+    p95, failures = asyncio.run(run(args, port))
+    if failures:
+        sys.exit(1)
+    if args.max_p95 is not None and p95 > args.max_p95:
+        print(f"\np95 {p95:.1f} ms au-dessus de la limite de {args.max_p95:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
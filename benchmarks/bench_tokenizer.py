@@ -0,0 +1,94 @@
+"""
+Tokenizer Micro-Benchmark
+Compares the single-pass tokenizer with the previous regex parser on a
+chat-like corpus where most messages contain no ticker
+
+Usage: python benchmarks/bench_tokenizer.py [messages]
+"""
+import os
+import re
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TIMEFRAME_MAPPING, TECHNICAL_INDICATORS  # noqa: E402
+from utils.tokenizer import tokenize  # noqa: E402
+
+# Parser used before utils/tokenizer.py, kept here for comparison
+LEGACY_PATTERN = re.compile(r'\$([A-Z]{1,5})(?:\s+(\d+[smhdwMy]))?(?:\s+([A-Za-z,\s]+))?')
+
+
+def legacy_parse(text):
+    match = LEGACY_PATTERN.search(text)
+    if not match:
+        return None
+    symbol = match.group(1).upper()
+    timeframe = match.group(2)
+    indicators_str = match.group(3)
+    if timeframe:
+        interval = TIMEFRAME_MAPPING.get(timeframe.lower(), TIMEFRAME_MAPPING['default'])
+    else:
+        interval = TIMEFRAME_MAPPING['default']
+    indicators = []
+    if indicators_str:
+        for ind in re.split(r'[,\s]+', indicators_str.strip()):
+            if ind.lower() in TECHNICAL_INDICATORS:
+                indicators.append(TECHNICAL_INDICATORS[ind.lower()])
+    return (symbol, interval, indicators)
+
+
+def legacy_tokenize(content):
+    requests = []
+    for match in LEGACY_PATTERN.finditer(content):
+        parsed = legacy_parse(match.group(0))
+        if parsed:
+            requests.append(parsed)
+    return requests
+
+
+CHATTER = [
+    "gm everyone, coffee first then charts",
+    "did anyone watch the fed presser? rates unchanged apparently",
+    "lol that dip this morning was brutal",
+    "I'm holding until earnings, not selling a single share",
+    "anyone know a good book on options pricing?",
+    "the market is closed on monday right?",
+    "posting my watchlist later tonight after dinner",
+]
+TICKERS = [
+    "$AAPL looks strong today",
+    "$TSLA 1h EMA,RSI breaking out?",
+    "watching $MSFT 4h MACD and $NVDA 1d BB",
+    "$BRK.B and $BTC-USD both green",
+    "$SPY $QQQ $IWM",
+]
+
+
+def build_corpus(size, ticker_ratio=0.05, seed=42):
+    """Mostly ticker-free messages, like a busy general channel"""
+    rng = random.Random(seed)
+    return [
+        rng.choice(TICKERS) if rng.random() < ticker_ratio else rng.choice(CHATTER)
+        for _ in range(size)
+    ]
+
+
+def bench(name, func, corpus, repeat=5):
+    best = min(timeit.repeat(lambda: [func(text) for text in corpus], number=1, repeat=repeat))
+    print(f"{name:<10} {best * 1000:8.2f} ms  {best / len(corpus) * 1e6:6.2f} µs/message")
+    return best
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    corpus = build_corpus(size)
+    print(f"{size} messages, {sum('$' in text for text in corpus)} with a '$'")
+    legacy = bench('legacy', legacy_tokenize, corpus)
+    current = bench('tokenize', tokenize, corpus)
+    print(f"speedup    {legacy / current:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,53 +3,693 @@ Stock Ticker Cog
 Detects stock ticker symbols in messages and provides stock information
 """
 import discord
-from discord.ext import commands
-import re
-import yfinance as yf
-from datetime import datetime
+from discord.ext import commands, tasks
+import asyncio
 import time
-from functools import lru_cache
-from config import (TICKER_PATTERN, ADVANCED_TICKER_PATTERN, EMBED_COLOR_GREEN, EMBED_COLOR_RED,
-                    CACHE_EXPIRY_SECONDS, USE_EMBEDDED_CHARTS, CHARTIMG_API_KEY,
-                    TIMEFRAME_MAPPING, TECHNICAL_INDICATORS)
-from utils.tradingview import format_chart_links_markdown, generate_chart_image_bytes
+from collections import OrderedDict
+from datetime import datetime, timezone
+from config import (EMBED_COLOR_GREEN, EMBED_COLOR_RED,
+                    CACHE_EXPIRY_SECONDS, CACHE_TTL_JITTER, QUOTE_CACHE_SIZE, RENDER_CACHE_SIZE, QUOTE_NOT_FOUND_TTL,
+                    BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS,
+                    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS,
+                    CHARTS_ENABLED, CHART_RENDERER, CHART_CACHE_MAX_BYTES,
+                    CHART_WIDTH, CHART_HEIGHT, CHART_THEME,
+                    TICKER_WORKERS, TICKER_QUEUE_SIZE, TICKER_TIMEOUT_SECONDS,
+                    USER_RATE_LIMIT, USER_BURST, CHANNEL_RATE_LIMIT, CHANNEL_BURST,
+                    CHARTIMG_RATE_LIMIT, CHARTIMG_BURST, CHARTIMG_DAILY_QUOTA,
+                    CHARTIMG_QUOTA_RESERVE, CHARTIMG_QUEUE_TIMEOUT, SYMBOL_RELOAD_SECONDS,
+                    PREFETCH_ENABLED, PREFETCH_CHARTS, PREFETCH_TOP_N, PREFETCH_BUDGET,
+                    PREFETCH_INTERVAL_SECONDS, PREFETCH_LOOKAHEAD_SECONDS, PREFETCH_HALF_LIFE_SECONDS,
+                    LIVE_KEYWORD, WATCH_INTERVAL_SECONDS, WATCH_DURATION_MINUTES, WATCH_MAX_MINUTES,
+                    WATCH_MAX_PER_CHANNEL, WATCH_MAX_EDITS_PER_CHANNEL,
+                    CACHE_BACKEND_URL, MESSAGE_DEDUP_SECONDS, MULTI_KEYWORD,
+                    METRICS_HOST, METRICS_PORT, LOOP_LAG_INTERVAL_SECONDS,
+                    ALERTS_DB, ALERT_INTERVAL_SECONDS, ALERT_MAX_PER_USER)
+from utils.tradingview import (format_chart_links_markdown, generate_chart_image_bytes, create_chart_session,
+                               tradingview_ticker, ChartImageError,
+                               chart_cache_key, chart_cache_ttl)
+from utils.quotes import (QuoteFetcher, QuoteUnavailable, CircuitOpen, RateLimited, QUOTE_SERIALIZER,
+                          quote_fingerprint)
+from utils.circuit import CircuitBreaker, Backoff
+from utils.cache import AsyncTTLCache
+from utils.backends import create_backend, BYTES_SERIALIZER
+from utils.ratelimit import (TokenBucket, DailyQuota, KeyedLimiter,
+                             PRIORITY_COMMAND, PRIORITY_PASSIVE, PRIORITY_PREFETCH)
+from utils.prefetch import PopularityTracker
+from utils.watch import WatchScheduler, is_market_open
+from utils.tokenizer import tokenize, INTERVAL_LABELS
+from utils.symbols import symbol_directory, normalize_symbol
+from utils.renderer import LocalChartRenderer
+from utils.indicators import IndicatorEngine, describe_indicators
+from utils.history import BarStore
+from utils.grid import compose_chart_grid
+from utils.metrics import metrics, start_metrics_server
+from utils.replies import ReplyBatcher
+from utils.workqueue import WorkQueue, Shed
+from utils.startup import startup, warm_imports
+from utils.alerts import PriceAlerts, parse_condition, resolve_threshold, is_met, ABOVE
 import io
 
 
+def copy_reply(result):
+    """
+    Copy a (embed, chart_file) reply for another recipient
+
+    Embeds are edited before sending and a file can only be uploaded once,
+    so replies shared by deduplicated requests are copied.
+    """
+    if result is None:
+        return None
+    embed, chart_file = result
+    if chart_file is not None:
+        chart_file = discord.File(io.BytesIO(chart_file.fp.getvalue()), filename=chart_file.filename)
+    return embed.copy(), chart_file
+
+
 class StockTicker(commands.Cog):
     """Cog for detecting and responding to stock ticker symbols"""
 
     def __init__(self, bot):
         self.bot = bot
-        self.ticker_pattern = re.compile(TICKER_PATTERN)
-        self.advanced_ticker_pattern = re.compile(ADVANCED_TICKER_PATTERN)
-        # Track recently processed messages to avoid duplicates
-        self.processed_messages = set()
+        # Backend shared by all shard processes: message dedup and, when it is
+        # not process-local, a second cache level behind the quote/chart caches
+        self.shared_backend = create_backend(CACHE_BACKEND_URL)
+        shared = self.shared_backend if self.shared_backend.shared else None
+        # yfinance is blocking, so lookups run on a bounded thread pool; chart
+        # bars are kept on disk and only the newest ones are downloaded
+        self.quotes = QuoteFetcher(store=BarStore())
+        self.quote_cache = AsyncTTLCache(
+            maxsize=QUOTE_CACHE_SIZE,
+            ttl=CACHE_EXPIRY_SECONDS,
+            jitter=CACHE_TTL_JITTER,
+            backend=shared,
+            namespace='quote',
+            serializer=QUOTE_SERIALIZER
+        )
+        # Rendered embed per symbol, reused until its quote snapshot changes
+        self.embed_payloads = OrderedDict()  # symbol -> (fingerprint, embed dict)
+        # Symbols whose lookups keep failing are retried with exponential backoff
+        self.quote_backoff = Backoff(BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS)
+        # Pooled chart-img.com session, opened in cog_load
+        self.chart_session = None
+        # OHLCV bars per (symbol, interval), for indicator values and local charts
+        self.bar_cache = AsyncTTLCache(maxsize=RENDER_CACHE_SIZE, jitter=CACHE_TTL_JITTER)
+        # Latest indicator values per (symbol, interval), updated as new bars arrive
+        self.indicators = IndicatorEngine(RENDER_CACHE_SIZE)
+        # Charts drawn in the bot instead of chart-img.com (CHART_RENDERER=local)
+        self.chart_renderer = LocalChartRenderer() if CHART_RENDERER == 'local' else None
+        # Rendered chart images, bounded by total bytes
+        self.chart_cache = AsyncTTLCache(
+            maxsize=10_000,
+            jitter=CACHE_TTL_JITTER,
+            max_weight=CHART_CACHE_MAX_BYTES,
+            weigher=len,
+            backend=shared,
+            namespace=f'chart-{CHART_RENDERER}',
+            serializer=BYTES_SERIALIZER
+        )
+        # chart-img.com request rate and daily budget
+        self.chart_limiter = TokenBucket(CHARTIMG_RATE_LIMIT, CHARTIMG_BURST)
+        self.chart_quota = DailyQuota(CHARTIMG_DAILY_QUOTA)
+        self.chart_breaker = CircuitBreaker('chart-img.com', BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        # Request frequency per symbol, drives the refresh-ahead prefetcher
+        self.popularity = PopularityTracker(PREFETCH_HALF_LIFE_SECONDS)
+        # Live quote messages, refreshed together by one scheduler
+        self.watches = WatchScheduler(
+            self.fetch_watched_quotes,
+            self.update_watched_message,
+            quote_fingerprint,
+            WATCH_MAX_EDITS_PER_CHANNEL
+        )
+        # Price alerts, indexed by threshold per symbol and stored in SQLite
+        self.alerts = PriceAlerts(ALERTS_DB)
+        # Ticker replies are built by a fixed worker pool behind a bounded queue;
+        # identical pending requests share one job
+        self.work_queue = WorkQueue(TICKER_WORKERS, TICKER_QUEUE_SIZE, TICKER_TIMEOUT_SECONDS, clone=copy_reply)
+        self.user_limiter = KeyedLimiter(USER_RATE_LIMIT, USER_BURST)
+        self.channel_limiter = KeyedLimiter(CHANNEL_RATE_LIMIT, CHANNEL_BURST)
+        # Ticker replies for the same channel are packed into as few messages as possible
+        self.replies = ReplyBatcher(self.send_reply)
+        # Cache hit ratios are reported by the metrics endpoint and !stats
+        metrics.register_cache('quote', self.quote_cache)
+        metrics.register_cache('chart', self.chart_cache)
+        metrics.register_cache('bars', self.bar_cache)
+        self.metrics_runner = None
+        self.loop_lag_task = None
+        self.warm_up_task = None
 
-    @lru_cache(maxsize=100)
-    def get_stock_data_cached(self, symbol, timestamp_bucket):
+    async def cog_load(self):
         """
-        Get stock data with caching to avoid rate limits
-        timestamp_bucket groups requests into time buckets for caching
+        Open the shared chart-img.com session, start the metrics and the background startup work
+
+        Nothing slow is awaited here: cogs are loaded before the bot connects,
+        so the symbol directory and heavy libraries load in the background.
         """
+        self.chart_session = create_chart_session()
+        self.work_queue.start()
+        self.loop_lag_task = asyncio.ensure_future(metrics.watch_loop_lag(LOOP_LAG_INTERVAL_SECONDS))
+        if METRICS_PORT:
+            try:
+                self.metrics_runner = await start_metrics_server(metrics, METRICS_HOST, METRICS_PORT)
+                print(f"Métriques disponibles sur http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+            except OSError as e:
+                print(f"Impossible de démarrer le serveur de métriques: {e}")
+        self.warm_up_task = asyncio.ensure_future(self.warm_up())
+        self.reload_symbols.start()
+        if PREFETCH_ENABLED:
+            self.prefetch_hot_symbols.start()
+        self.refresh_watches.start()
+        self.check_alerts.start()
+
+    async def cog_unload(self):
+        """Release the quote thread pool and chart session when the cog is unloaded"""
+        if self.warm_up_task is not None:
+            self.warm_up_task.cancel()
+        self.reload_symbols.cancel()
+        self.prefetch_hot_symbols.cancel()
+        self.refresh_watches.cancel()
+        self.check_alerts.cancel()
+        await self.work_queue.close()
+        await self.replies.close()
+        if self.loop_lag_task is not None:
+            self.loop_lag_task.cancel()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        self.quotes.close()
+        await self.alerts.close()
+        if self.chart_renderer is not None:
+            self.chart_renderer.close()
+        if self.chart_session is not None:
+            await self.chart_session.close()
+        await self.shared_backend.close()
+
+    async def warm_up(self):
+        """
+        Import the libraries deferred off the startup path, once connected
+
+        Until the gateway is ready the event loop is left to the connection;
+        the imports then run in a worker thread so the first ticker reply
+        does not pay for them.
+        """
+        await self.bot.wait_until_ready()
+        timings = await warm_imports()
+        if timings:
+            print("Bibliothèques préchargées: " + ', '.join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+        startup.mark('warm')
+
+    @tasks.loop(seconds=SYMBOL_RELOAD_SECONDS)
+    async def reload_symbols(self):
+        """Reload the symbol directory when a listing file changed"""
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
+            if await symbol_directory.reload():
+                # Exchanges may have changed, so chart links are rebuilt
+                format_chart_links_markdown.cache_clear()
+                self.embed_payloads.clear()
+                print(f"Annuaire de symboles chargé: {len(symbol_directory.index)} symboles")
+        except Exception as e:
+            print(f"Erreur lors du rechargement de l'annuaire de symboles: {e}")
 
-            # Check if we got valid data
-            if not info or 'regularMarketPrice' not in info:
-                return None
+    @tasks.loop(seconds=PREFETCH_INTERVAL_SECONDS)
+    async def prefetch_hot_symbols(self):
+        """
+        Refresh the most requested symbols shortly before they expire
 
-            return info
+        At most PREFETCH_BUDGET refreshes per cycle, only with spare Yahoo
+        rate-limit tokens, and at the lowest priority so live requests are
+        always served first.
+        """
+        budget = min(PREFETCH_BUDGET, self.quotes.limiter.available())
+        if budget <= 0:
+            return
+
+        due = []
+        for symbol, _ in self.popularity.top(PREFETCH_TOP_N):
+            expires_in = self.quote_cache.expires_in(symbol)
+            if expires_in is None or expires_in < PREFETCH_LOOKAHEAD_SECONDS:
+                due.append(symbol)
+            if len(due) >= budget:
+                break
+        if not due:
+            return
+
+        refreshes = [self.get_stock_data(symbol, PRIORITY_PREFETCH, refresh=True) for symbol in due]
+        if PREFETCH_CHARTS and CHARTS_ENABLED:
+            for symbol in due:
+                key = chart_cache_key(symbol, 'D', CHART_WIDTH, CHART_HEIGHT, None, CHART_THEME)
+                expires_in = self.chart_cache.expires_in(key)
+                if expires_in is not None and expires_in < PREFETCH_LOOKAHEAD_SECONDS:
+                    refreshes.append(self.get_chart_image(symbol, 'D', None, PRIORITY_PREFETCH, refresh=True))
+
+        await asyncio.gather(*refreshes, return_exceptions=True)
+
+    @prefetch_hot_symbols.before_loop
+    async def before_prefetch(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=WATCH_INTERVAL_SECONDS)
+    async def refresh_watches(self):
+        """Refresh all live quote messages (one quote fetch per watched symbol)"""
+        try:
+            await self.watches.tick()
+        except Exception as e:
+            print(f"Erreur lors de la mise à jour des suivis en direct: {e}")
+
+    @refresh_watches.before_loop
+    async def before_refresh_watches(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=ALERT_INTERVAL_SECONDS)
+    async def check_alerts(self):
+        """Notify the price alerts met by the latest quotes, during market hours"""
+        try:
+            symbols = self.alerts.symbols()
+            if not symbols or not is_market_open():
+                return
+            quotes = await self.fetch_alert_quotes(symbols)
+            prices = {symbol: quote.price for symbol, quote in quotes.items() if quote is not None}
+            triggered = await self.alerts.evaluate(prices)
+            if triggered:
+                try:
+                    retry = await self.notify_alerts(triggered, quotes)
+                except Exception:
+                    self.alerts.restore(triggered)
+                    raise
+                retry_ids = {alert.id for alert in retry}
+                done = [alert for alert in triggered if alert.id not in retry_ids]
+                self.alerts.restore(retry)
+                await self.alerts.acknowledge(done)
+                metrics.increment('alerts_triggered_total', len(done))
+            metrics.set_gauge('alerts_active', len(self.alerts.book))
         except Exception as e:
-            print(f"Erreur lors de la récupération des données pour {symbol}: {e}")
+            print(f"Erreur lors de la vérification des alertes de prix: {e}")
+
+    @check_alerts.before_loop
+    async def before_check_alerts(self):
+        await self.bot.wait_until_ready()
+        await self.alerts.load()
+        metrics.set_gauge('alerts_active', len(self.alerts.book))
+
+    async def fetch_alert_quotes(self, symbols):
+        """
+        Quotes for the alerted symbols, at most ALERT_INTERVAL_SECONDS old
+
+        Cached quotes recent enough are reused; the other lookups are issued
+        together, so the quote fetcher resolves them with bulk requests.
+
+        Returns:
+            dict: symbol -> Quote, or None if unavailable; the last known
+            quote served from an expired entry when Yahoo fails is not
+            returned, so alerts never fire on an old price
+        """
+        def stale(symbol):
+            quote = self.quote_cache.peek(symbol)
+            return quote is not None and time.time() - quote.fetched_at >= ALERT_INTERVAL_SECONDS
+
+        def fresh(symbol, quote):
+            expires_in = self.quote_cache.expires_in(symbol)
+            return not isinstance(quote, Exception) and expires_in is not None and expires_in > 0
+
+        quotes = await asyncio.gather(
+            *(self.get_stock_data(symbol, refresh=stale(symbol)) for symbol in symbols),
+            return_exceptions=True
+        )
+        return {symbol: quote if fresh(symbol, quote) else None for symbol, quote in zip(symbols, quotes)}
+
+    async def notify_alerts(self, triggered, quotes):
+        """
+        Ping the owners of triggered alerts
+
+        Alerts of the same symbol in the same channel share one message with
+        the quote embed.
+
+        Returns:
+            list: Alerts to fire again, whose message failed for a transient
+            reason (Discord 5xx or 429, network error); alerts of deleted
+            channels or refused messages are dropped
+        """
+        retry = []
+        groups = {}  # (channel id, symbol) -> alerts
+        for alert in triggered:
+            groups.setdefault((alert.channel_id, alert.symbol), []).append(alert)
+
+        for (channel_id, symbol), alerts in groups.items():
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                print(f"Salon {channel_id} introuvable pour {len(alerts)} alerte(s) ${symbol}")
+                continue
+            quote = quotes[symbol]
+            lines = [
+                f"🔔 <@{alert.user_id}> `${symbol}` {alert.direction} {alert.threshold:,.2f} "
+                f"(cours actuel {quote.price:,.2f})"
+                for alert in alerts
+            ]
+            try:
+                embed = await self.create_stock_embed(symbol, quote)
+                await channel.send(
+                    "\n".join(lines)[:2000],
+                    embed=embed,
+                    allowed_mentions=discord.AllowedMentions(users=True, roles=False, everyone=False)
+                )
+                metrics.record_upstream('discord', 'ok')
+            except discord.HTTPException as e:
+                metrics.record_upstream('discord', e.status)
+                print(f"Erreur lors de l'envoi des alertes ${symbol} dans le salon {channel_id}: {e}")
+                if e.status >= 500 or e.status == 429:
+                    retry.extend(alerts)
+            except Exception as e:
+                print(f"Erreur lors de l'envoi des alertes ${symbol} dans le salon {channel_id}: {e}")
+                retry.extend(alerts)
+        return retry
+
+    async def fetch_watched_quotes(self, symbols):
+        """Fetch fresh quotes for the watched symbols (sent as one batch)"""
+        quotes = await asyncio.gather(
+            *(self.get_stock_data(symbol, refresh=True) for symbol in symbols),
+            return_exceptions=True
+        )
+        return {symbol: quote if not isinstance(quote, Exception) else None for symbol, quote in zip(symbols, quotes)}
+
+    async def update_watched_message(self, subscription, quote):
+        """
+        Edit a live message with a new quote
+
+        The interval and indicator fields of the original reply are redrawn,
+        with the current indicator values, so they match the kept chart.
+
+        Returns:
+            bool: False if the message no longer exists
+        """
+        embed = await self.create_stock_embed(subscription.symbol, quote)
+        if subscription.request is not None:
+            interval, indicators, intervals = subscription.request
+            indicator_fields = await self.get_indicator_fields(subscription.symbol, interval, indicators) \
+                if indicators else []
+            self.add_request_fields(embed, interval, indicators, intervals, indicator_fields)
+        self.mark_live(embed)
+        if subscription.image_url:
+            embed.set_image(url=subscription.image_url)
+        try:
+            await subscription.message.edit(embed=embed)
+        except discord.NotFound:
+            return False
+        except discord.HTTPException as e:
+            print(f"Erreur lors de la mise à jour du message en direct ${subscription.symbol}: {e}")
+        return True
+
+    def mark_live(self, embed):
+        """Flag an embed as a live quote"""
+        embed.set_footer(
+            text=f"🔴 En direct · mis à jour toutes les {WATCH_INTERVAL_SECONDS}s pendant les heures de marché "
+                 f"· Données fournies par Yahoo Finance via yfinance"
+        )
+
+    def start_watch(self, message, symbol, minutes=WATCH_DURATION_MINUTES, request=None):
+        """
+        Keep a sent reply updated with the live quote
+
+        Args:
+            request (tuple): (interval, indicators, intervals) of a ticker
+                reply, redrawn on each edit (see add_request_fields)
+
+        Returns:
+            bool: False if the channel already has WATCH_MAX_PER_CHANNEL live messages
+        """
+        if self.watches.channel_count(message.channel.id) >= WATCH_MAX_PER_CHANNEL:
+            return False
+        image_url = message.embeds[0].image.url if message.embeds and message.embeds[0].image else None
+        self.watches.subscribe(message, symbol, minutes * 60, self.quote_cache.peek(symbol), image_url, request)
+        return True
+
+    async def mark_processed(self, message):
+        """
+        Record a message as processed in the shared backend
+
+        Returns:
+            bool: False if the message was already processed
+        """
+        try:
+            return await self.shared_backend.add(f"msg:{message.id}", b'1', MESSAGE_DEDUP_SECONDS)
+        except Exception as e:
+            print(f"Erreur du cache partagé lors de la déduplication: {e}")
+            return True
+
+    def is_known_symbol(self, symbol):
+        """
+        Check whether a detected symbol should be looked up
+
+        Common false positives (currencies, etc.) are always ignored. When a
+        symbol directory is loaded, symbols it does not list are rejected
+        before any network call.
+        """
+        if symbol in ['USD', 'EUR', 'GBP', 'CAD', 'JPY', 'CHF', 'AUD']:
+            return False
+        if symbol_directory.loaded:
+            return symbol in symbol_directory
+        return True
+
+    async def get_stock_data(self, symbol, priority=PRIORITY_PASSIVE, refresh=False):
+        """
+        Get stock data through the quote cache
+
+        Entries live for about CACHE_EXPIRY_SECONDS; concurrent requests for
+        the same symbol share a single yfinance lookup. Unknown symbols are
+        cached for QUOTE_NOT_FOUND_TTL. Failed lookups are not cached and
+        fall back to the last known data, even expired. Yahoo errors and
+        timeouts also make the symbol back off exponentially; requests
+        refused locally (rate limiter, open circuit) do not.
+
+        With refresh=True the cached entry is replaced even if still fresh
+        (used by the prefetcher).
+
+        Returns:
+            Quote: Quote, or None if Yahoo does not know the symbol
+
+        Raises:
+            QuoteUnavailable: If the lookup failed and no earlier quote is known
+        """
+        if not self.quote_backoff.ready(symbol):
+            return self.stale_quote(symbol, QuoteUnavailable(f"Nouvel essai de {symbol} en attente"))
+
+        lookup = self.quote_cache.refresh if refresh else self.quote_cache.get_or_fetch
+        try:
+            quote = await lookup(
+                symbol,
+                lambda: self.fetch_quote(symbol, priority),
+                ttl=lambda quote: CACHE_EXPIRY_SECONDS if quote is not None else QUOTE_NOT_FOUND_TTL
+            )
+        except (CircuitOpen, RateLimited) as e:
+            # Yahoo was not called, so this says nothing about the symbol
+            return self.stale_quote(symbol, e)
+        except QuoteUnavailable as e:
+            delay = self.quote_backoff.failure(symbol)
+            print(f"Erreur lors de la récupération des données pour {symbol}: {e} (nouvel essai dans {delay:.0f}s)")
+            return self.stale_quote(symbol, e)
+
+        self.quote_backoff.success(symbol)
+        return quote
+
+    async def fetch_quote(self, symbol, priority=PRIORITY_PASSIVE):
+        """
+        Fetch a quote from Yahoo, completing a bulk quote's missing fields
+
+        Quotes resolved by a bulk download have no name, market cap or P/E;
+        they are taken from the quote being replaced, and the name from the
+        symbol directory, so a full cached quote is never degraded.
+        """
+        quote = await self.quotes.fetch(symbol, priority=priority)
+        if quote is None:
             return None
+        previous = self.quote_cache.peek(symbol)
+        if previous is not None:
+            quote.fill_missing(previous)
+        if quote.name is None:
+            listing = symbol_directory.lookup(symbol)
+            if listing is not None and listing.name:
+                quote.name = listing.name
+        return quote
+
+    def stale_quote(self, symbol, error):
+        """Last known quote of a symbol, even expired; raises error if there is none"""
+        quote = self.quote_cache.peek(symbol, error)
+        if quote is error:
+            raise error
+        return quote
+
+    def chart_budget_available(self, priority=PRIORITY_PASSIVE):
+        """
+        Check whether the chart-img.com daily budget allows a new chart
+
+        Passive detections stop getting charts once the budget drops to
+        CHARTIMG_QUOTA_RESERVE, keeping the rest for !stock commands.
+        """
+        remaining = self.chart_quota.remaining()
+        if remaining is None:
+            return True
+        if priority == PRIORITY_COMMAND:
+            return remaining > 0
+        return remaining > CHARTIMG_QUOTA_RESERVE
+
+    async def get_chart_image(self, symbol, interval='D', indicators=None, priority=PRIORITY_PASSIVE,
+                              refresh=False):
+        """
+        Get chart image bytes through the chart cache
+
+        Images are shared across channels until they expire (see
+        chart_cache_ttl); failed renders are not cached. When the daily
+        budget is low, the rate limiter is saturated or the circuit breaker
+        is open, None (or the last cached image) is returned and the reply
+        falls back to the TradingView links.
+
+        With CHART_RENDERER=local the chart is drawn from Yahoo bars instead
+        (see render_local_chart) and the chart-img.com limits do not apply.
 
-    def get_stock_data(self, symbol):
-        """Get stock data with cache buckets based on CACHE_EXPIRY_SECONDS"""
-        # Create time buckets for caching (e.g., 5-minute buckets)
-        timestamp_bucket = int(time.time() / CACHE_EXPIRY_SECONDS)
-        return self.get_stock_data_cached(symbol, timestamp_bucket)
+        Returns:
+            bytes: PNG data, or None if charts are unavailable
+        """
+        key = chart_cache_key(symbol, interval, CHART_WIDTH, CHART_HEIGHT, indicators, CHART_THEME)
+        ttl = chart_cache_ttl(interval)
+        lookup = self.chart_cache.refresh if refresh else self.chart_cache.get_or_fetch
+
+        if self.chart_renderer is not None:
+            return await lookup(
+                key,
+                lambda: self.render_local_chart(symbol, interval, indicators, priority),
+                ttl=lambda image: ttl if image else 0
+            )
+
+        async def render():
+            if not self.chart_budget_available(priority):
+                return None
+            if not await self.chart_limiter.acquire(priority, timeout=CHARTIMG_QUEUE_TIMEOUT):
+                print(f"Limite chart-img.com atteinte, graphique ignoré pour {symbol}")
+                return None
+            if not self.chart_quota.consume():
+                return None
+            try:
+                image = await generate_chart_image_bytes(
+                    symbol,
+                    interval=interval,
+                    width=CHART_WIDTH,
+                    height=CHART_HEIGHT,
+                    indicators=indicators,
+                    session=self.chart_session,
+                    theme=CHART_THEME
+                )
+            except ChartImageError as e:
+                if e.quota_exceeded:
+                    # The account's quota is the real one: stop spending ours until tomorrow
+                    print("Quota journalier chart-img.com épuisé, graphiques désactivés jusqu'à demain")
+                    self.chart_quota.exhaust()
+                # Refused requests (bad symbol, 429) say nothing about chart-img.com being down
+                if e.upstream_failure:
+                    self.chart_breaker.record_failure()
+                return None
+            self.chart_breaker.record_success()
+            return image
+
+        # While chart-img.com is down, serve the last image (even expired) or links only
+        if not self.chart_breaker.allow():
+            return self.chart_cache.peek(key)
+
+        return await lookup(key, render, ttl=lambda image: ttl if image else 0)
+
+    async def get_chart_grid(self, symbol, intervals, indicators=None, priority=PRIORITY_PASSIVE):
+        """
+        Get one image combining the charts of several intervals
+
+        The charts are fetched concurrently through get_chart_image, so tiles
+        already cached for single-interval replies are reused. The grid is
+        cached until its shortest-lived chart expires; a grid with a missing
+        tile is not cached.
+
+        Args:
+            symbol (str): Stock ticker symbol
+            intervals (tuple): TradingView intervals, in grid order
+
+        Returns:
+            bytes: PNG data, or None if no chart is available
+        """
+        key = ('grid',) + tuple(
+            chart_cache_key(symbol, interval, CHART_WIDTH, CHART_HEIGHT, indicators, CHART_THEME)
+            for interval in intervals
+        )
+        ttl = min(chart_cache_ttl(interval) for interval in intervals)
+        complete = True
+
+        async def compose():
+            nonlocal complete
+            images = await asyncio.gather(*(
+                self.get_chart_image(symbol, interval, indicators, priority) for interval in intervals
+            ))
+            tiles = [
+                (INTERVAL_LABELS.get(interval, interval), image)
+                for interval, image in zip(intervals, images)
+                if image
+            ]
+            complete = len(tiles) == len(intervals)
+            if not tiles:
+                return None
+            return await asyncio.to_thread(compose_chart_grid, tiles, CHART_THEME)
+
+        return await self.chart_cache.get_or_fetch(
+            key, compose, ttl=lambda image: ttl if image and complete else 0
+        )
+
+    async def render_local_chart(self, symbol, interval='D', indicators=None, priority=PRIORITY_PASSIVE):
+        """
+        Draw a chart in the bot from Yahoo OHLCV bars
+
+        The bars are fetched through the quote fetcher (Yahoo rate limiter and
+        circuit breaker) and drawn by the local renderer's worker processes.
+
+        Returns:
+            bytes: PNG data, or None if there is no data for the interval
+        """
+        bars = await self.get_bars(symbol, interval, priority)
+        if bars is None:
+            return None
+        title = tradingview_ticker(symbol)
+        return await self.chart_renderer.render(
+            title, interval, bars, indicators or (), CHART_WIDTH, CHART_HEIGHT, CHART_THEME
+        )
+
+    async def get_bars(self, symbol, interval='D', priority=PRIORITY_PASSIVE):
+        """
+        Get OHLCV bars through the bar cache
+
+        Bars are kept for the quote cache duration, or less for intervals
+        shorter than that. Failed lookups are not cached and fall back to
+        the last known bars.
+
+        Returns:
+            dict: OHLCV arrays, or None if unavailable
+        """
+        key = (symbol, interval)
+        ttl = min(CACHE_EXPIRY_SECONDS, chart_cache_ttl(interval))
+        try:
+            return await self.bar_cache.get_or_fetch(
+                key,
+                lambda: self.quotes.history(symbol, interval, priority),
+                ttl=lambda bars: ttl if bars is not None else QUOTE_NOT_FOUND_TTL
+            )
+        except QuoteUnavailable as e:
+            print(f"Historique indisponible pour {symbol} ({interval}): {e}")
+            return self.bar_cache.peek(key)
+
+    async def get_indicator_fields(self, symbol, interval='D', indicators=None, priority=PRIORITY_PASSIVE):
+        """
+        Compute the current values of the requested indicators
+
+        Returns:
+            list: (field name, field value) pairs for the embed
+        """
+        bars = await self.get_bars(symbol, interval, priority)
+        if bars is None:
+            return []
+        values = await self.indicators.values((symbol, interval), bars)
+        if values is None:
+            return []
+        return describe_indicators(values, indicators)
 
     def parse_ticker_request(self, text):
         """
@@ -62,33 +702,15 @@ class StockTicker(commands.Cog):
             $GOOGL 1d RSI,MACD -> ('GOOGL', 'D', ['Relative Strength Index', 'MACD'])
 
         Returns:
-            tuple: (symbol, interval, indicators_list)
+            tuple: (symbol, interval, indicators_list) for the first request
+            in text, or None (see utils.tokenizer for the full grammar)
         """
-        match = self.advanced_ticker_pattern.search(text)
-        if not match:
+        requests = tokenize(text)
+        if not requests:
             return None
 
-        symbol = match.group(1).upper()
-        timeframe = match.group(2)  # e.g., "1h", "4h", "1d"
-        indicators_str = match.group(3)  # e.g., "EMA,RSI" or "Bollinger"
-
-        # Convert timeframe to TradingView format
-        if timeframe:
-            interval = TIMEFRAME_MAPPING.get(timeframe.lower(), TIMEFRAME_MAPPING['default'])
-        else:
-            interval = TIMEFRAME_MAPPING['default']  # Default to 1 day
-
-        # Parse indicators
-        indicators = []
-        if indicators_str:
-            # Split by comma or space
-            indicator_names = re.split(r'[,\s]+', indicators_str.strip())
-            for ind in indicator_names:
-                ind_lower = ind.lower()
-                if ind_lower in TECHNICAL_INDICATORS:
-                    indicators.append(TECHNICAL_INDICATORS[ind_lower])
-
-        return (symbol, interval, indicators)
+        symbol, interval, indicators, _ = requests[0]
+        return (symbol, interval, list(indicators))
 
     def format_number(self, num):
         """Format large numbers with appropriate suffixes (K, M, B, T)"""
@@ -128,16 +750,41 @@ class StockTicker(commands.Cog):
         except (ValueError, TypeError):
             return 'N/A'
 
-    async def create_stock_embed(self, symbol, info):
-        """Create a rich Discord embed with stock information"""
+    async def create_stock_embed(self, symbol, quote):
+        """
+        Create a rich Discord embed with stock information
+
+        The embed is rendered once per quote snapshot (see quote_fingerprint)
+        and copied for every reply, so a burst of requests for one symbol
+        formats it only once. The fingerprint leaves out the fetch time, so
+        each copy gets the timestamp of its own quote.
+        """
+        fingerprint = quote_fingerprint(quote)
+        cached = self.embed_payloads.get(symbol)
+        if cached is not None and cached[0] == fingerprint:
+            self.embed_payloads.move_to_end(symbol)
+            payload = cached[1]
+        else:
+            payload = self.render_stock_embed(symbol, quote).to_dict()
+            self.embed_payloads[symbol] = (fingerprint, payload)
+            if len(self.embed_payloads) > RENDER_CACHE_SIZE:
+                self.embed_payloads.popitem(last=False)
+
+        # Replies add fields to their copy, so the field list is not shared
+        embed = discord.Embed.from_dict(dict(payload, fields=[dict(field) for field in payload['fields']]))
+        embed.timestamp = datetime.fromtimestamp(quote.fetched_at, timezone.utc)
+        return embed
+
+    def render_stock_embed(self, symbol, quote):
+        """Build the stock embed from a Quote, without its timestamp (set by create_stock_embed)"""
 
         # Get basic info
-        company_name = info.get('longName', info.get('shortName', symbol))
-        current_price = info.get('regularMarketPrice', info.get('currentPrice'))
-        previous_close = info.get('regularMarketPreviousClose', info.get('previousClose'))
-        volume = info.get('volume', info.get('regularMarketVolume'))
-        market_cap = info.get('marketCap')
-        pe_ratio = info.get('trailingPE', info.get('forwardPE'))
+        company_name = quote.name or symbol
+        current_price = quote.price
+        previous_close = quote.previous_close
+        volume = quote.volume
+        market_cap = quote.market_cap
+        pe_ratio = quote.pe_ratio
 
         # Calculate price change
         price_change = None
@@ -152,8 +799,7 @@ class StockTicker(commands.Cog):
         # Create embed
         embed = discord.Embed(
             title=f"${symbol.upper()} - {company_name}",
-            color=embed_color,
-            timestamp=datetime.utcnow()
+            color=embed_color
         )
 
         # Price field
@@ -180,8 +826,7 @@ class StockTicker(commands.Cog):
             embed.add_field(name="P/E Ratio", value=f"{pe_ratio:.2f}", inline=True)
 
         # Day's range
-        day_low = info.get('regularMarketDayLow', info.get('dayLow'))
-        day_high = info.get('regularMarketDayHigh', info.get('dayHigh'))
+        day_low, day_high = quote.day_low, quote.day_high
         if day_low and day_high:
             embed.add_field(
                 name="Range du jour",
@@ -190,8 +835,7 @@ class StockTicker(commands.Cog):
             )
 
         # 52-week range
-        week_52_low = info.get('fiftyTwoWeekLow')
-        week_52_high = info.get('fiftyTwoWeekHigh')
+        week_52_low, week_52_high = quote.year_low, quote.year_high
         if week_52_low and week_52_high:
             embed.add_field(
                 name="Range 52 semaines",
@@ -208,6 +852,151 @@ class StockTicker(commands.Cog):
 
         return embed
 
+    async def build_ticker_reply(self, symbol, interval='D', indicators=None, priority=PRIORITY_PASSIVE,
+                                 intervals=None):
+        """
+        Build the reply for one ticker request
+
+        The quote, the chart image and the indicator values are fetched
+        concurrently; each lookup is timed as a pipeline stage (see
+        utils/metrics.py).
+
+        Args:
+            symbol (str): Stock ticker symbol
+            interval (str): TradingView interval
+            indicators (list): Technical indicator names
+            priority (int): Upstream priority (PRIORITY_COMMAND for !stock)
+            intervals (tuple): Several intervals for a multi-timeframe chart
+                grid; the indicator values use `interval`
+
+        Returns:
+            tuple: (embed, chart_file or None), or None if the symbol was not found
+        """
+        if not CHARTS_ENABLED:
+            chart = None
+        elif intervals:
+            chart = self.get_chart_grid(symbol, intervals, indicators, priority)
+        else:
+            chart = self.get_chart_image(symbol, interval, indicators, priority)
+
+        # sleep(0, result) stands in for the lookups that are not needed
+        quote, image_bytes, indicator_fields = await asyncio.gather(
+            metrics.timed('quote', self.get_stock_data(symbol, priority)),
+            metrics.timed('chart', chart) if chart else asyncio.sleep(0, None),
+            metrics.timed('indicators', self.get_indicator_fields(symbol, interval, indicators, priority))
+            if indicators else asyncio.sleep(0, [])
+        )
+
+        if quote is None:
+            return None
+
+        # Create embed
+        with metrics.timer('embed'):
+            embed = await self.create_stock_embed(symbol, quote)
+
+        self.add_request_fields(embed, interval, indicators, intervals, indicator_fields)
+
+        # Attach chart image if one was rendered
+        chart_file = None
+        if image_bytes:
+            filename = f"{symbol}_multi.png" if intervals else f"{symbol}_chart.png"
+            # Create Discord file from image bytes
+            chart_file = discord.File(io.BytesIO(image_bytes), filename=filename)
+            # Set the image in the embed
+            embed.set_image(url=f"attachment://{filename}")
+
+        return embed, chart_file
+
+    def add_request_fields(self, embed, interval='D', indicators=None, intervals=None, indicator_fields=()):
+        """Add the timeframe, indicator names and current indicator values of a request to its embed"""
+        if interval != 'D' or indicators or intervals:
+            extra_info = []
+            # Convert interval back to readable format
+            if intervals:
+                readable_intervals = ', '.join(INTERVAL_LABELS.get(value, value) for value in intervals)
+                extra_info.append(f"📊 Intervalles: **{readable_intervals}**")
+            else:
+                readable_interval = INTERVAL_LABELS.get(interval, interval)
+                extra_info.append(f"📊 Intervalle: **{readable_interval}**")
+            if indicators:
+                extra_info.append(f"📈 Indicateurs: **{', '.join(ind for ind in indicators)}**")
+            embed.add_field(name="\u200b", value="\n".join(extra_info), inline=False)
+
+        # Current indicator values and signals
+        for name, value in indicator_fields:
+            embed.add_field(name=name, value=value, inline=True)
+
+    def allow_request(self, user_id, channel_id):
+        """
+        Take a token from the user's and the channel's request buckets
+
+        Both buckets are checked before either is charged, so a throttled
+        user does not use up the channel's allowance.
+        """
+        if self.user_limiter.available(user_id) < 1:
+            metrics.increment('throttled_total', scope='user')
+            return False
+        if self.channel_limiter.available(channel_id) < 1:
+            metrics.increment('throttled_total', scope='channel')
+            return False
+        self.user_limiter.allow(user_id)
+        self.channel_limiter.allow(channel_id)
+        return True
+
+    def submit_reply(self, symbol, interval='D', indicators=(), priority=PRIORITY_PASSIVE, intervals=()):
+        """
+        Queue a ticker reply on the worker pool
+
+        Returns:
+            asyncio.Future: Resolved with build_ticker_reply's result; fails
+            with Shed when dropped under load, or asyncio.TimeoutError
+        """
+        return self.work_queue.submit(
+            (symbol, interval, tuple(indicators or ()), tuple(intervals or ())),
+            lambda: metrics.timed('reply', self.build_ticker_reply(symbol, interval, indicators, priority, intervals)),
+            priority
+        )
+
+    async def send_live(self, channel, embed, chart_file, symbol, request=None):
+        """
+        Send a live reply in a message of its own and start refreshing it
+
+        The caller must have reserved a live slot in the channel (see
+        WatchScheduler.reserve); it is released here.
+        """
+        try:
+            sent = await self.replies.add(channel, embed, chart_file, alone=True)
+        finally:
+            self.watches.release(channel.id)
+        self.start_watch(sent, symbol, request=request)
+
+    async def send_reply(self, destination, embeds, files=None):
+        """
+        Send ticker embeds in one message, timed as the 'send' stage
+
+        Discord errors are counted by HTTP status and re-raised.
+
+        Args:
+            destination: Channel or command context
+            embeds (list): Up to 10 embeds
+            files (list): Chart attachments referenced by the embeds
+
+        Returns:
+            discord.Message: The sent message
+        """
+        with metrics.timer('send'):
+            try:
+                if files:
+                    sent = await destination.send(embeds=embeds, files=files)
+                else:
+                    sent = await destination.send(embeds=embeds)
+            except discord.HTTPException as e:
+                metrics.record_upstream('discord', e.status)
+                raise
+        metrics.record_upstream('discord', 'ok')
+        startup.mark('first_reply')
+        return sent
+
     @commands.Cog.listener()
     async def on_message(self, message):
         """Listen for messages containing stock ticker symbols"""
@@ -216,99 +1005,79 @@ class StockTicker(commands.Cog):
         if message.author.bot:
             return
 
-        # Ignore if message was already processed (avoid duplicates)
-        if message.id in self.processed_messages:
+        # Parse ticker requests in a single pass (messages without '$' are rejected
+        # immediately). Look for patterns like: $AAPL, $TSLA 1h, $MSFT 4h EMA,RSI,
+        # $BRK.B 1h 4h, "$AAPL live" for a message kept up to date, or
+        # "$AAPL multi" / "$AAPL 1h 4h 1d multi" for one multi-timeframe chart grid.
+        # Duplicates are removed, keeping the order of appearance.
+        with metrics.timer('parse'):
+            unique_requests = list(dict.fromkeys(tokenize(message.content)))
+
+            # Ignore false positives and symbols that are not listed
+            unique_requests = [request for request in unique_requests if self.is_known_symbol(request[0])]
+
+        # Ignore requests over the author's or the channel's rate (spam, raids)
+        unique_requests = [
+            request for request in unique_requests
+            if self.allow_request(message.author.id, message.channel.id)
+        ]
+
+        for symbol in {request[0] for request in unique_requests}:
+            self.popularity.record(symbol)
+
+        if not unique_requests:
             return
 
-        # Parse ticker requests with advanced syntax
-        # Look for patterns like: $AAPL, $TSLA 1h, $MSFT 4h EMA,RSI
-        ticker_requests = []
-        for match in self.advanced_ticker_pattern.finditer(message.content):
-            parsed = self.parse_ticker_request(match.group(0))
-            if parsed:
-                ticker_requests.append(parsed)
-
-        # Remove duplicates
-        seen = set()
-        unique_requests = []
-        for symbol, interval, indicators in ticker_requests:
-            key = (symbol, interval, tuple(indicators))
-            if key not in seen:
-                seen.add(key)
-                unique_requests.append((symbol, interval, indicators))
-
-        # Process each unique ticker request
-        for symbol, interval, indicators in unique_requests:
-            # Ignore common false positives (currencies, etc.)
-            if symbol in ['USD', 'EUR', 'GBP', 'CAD', 'JPY', 'CHF', 'AUD']:
-                continue
+        # Ignore if message was already processed, by this or another shard process
+        if not await self.mark_processed(message):
+            return
+
+        # Queue every reply on the worker pool (quote and chart are fetched in
+        # parallel for each ticker); under load, passive replies may be shed
+        # before any upstream call. Quote misses of the jobs that do run within
+        # QUOTE_BATCH_WINDOW of each other are merged into one bulk request.
+        replies = [
+            self.submit_reply(symbol, interval, indicators, PRIORITY_PASSIVE, intervals)
+            for symbol, interval, indicators, options, intervals in unique_requests
+        ]
 
+        # Queue replies in the order the tickers appeared in the message; the
+        # batcher packs them (with other replies for this channel) into as few
+        # messages as possible and folds the error notices into one summary
+        sends = []
+        for (symbol, interval, indicators, options, intervals), reply in zip(unique_requests, replies):
             try:
-                # Get stock data
-                info = self.get_stock_data(symbol)
+                result = await reply
 
-                if info is None:
+                if result is None:
                     # Stock not found or error
-                    await message.channel.send(
-                        f"❌ Impossible de trouver les données pour `${symbol}`. "
-                        f"Vérifiez que le symbole est correct.",
-                        delete_after=10
-                    )
+                    self.replies.add_error(message.channel, 'not_found', symbol)
                     continue
 
-                # Create embed
-                embed = await self.create_stock_embed(symbol, info)
-
-                # Add timeframe and indicators info to embed if specified
-                if interval != 'D' or indicators:
-                    extra_info = []
-                    # Convert interval back to readable format
-                    readable_interval = {v: k for k, v in TIMEFRAME_MAPPING.items()}.get(interval, interval)
-                    extra_info.append(f"📊 Intervalle: **{readable_interval}**")
-                    if indicators:
-                        extra_info.append(f"📈 Indicateurs: **{', '.join(ind for ind in indicators)}**")
-                    embed.add_field(name="\u200b", value="\n".join(extra_info), inline=False)
-
-                # Generate and attach chart image if enabled
-                chart_file = None
-                if USE_EMBEDDED_CHARTS and CHARTIMG_API_KEY:
-                    # Free tier limit: 800x600 max
-                    image_bytes = await generate_chart_image_bytes(
-                        symbol,
-                        interval=interval,
-                        width=800,
-                        height=500,
-                        indicators=indicators if indicators else None
-                    )
-                    if image_bytes:
-                        # Create Discord file from image bytes
-                        chart_file = discord.File(io.BytesIO(image_bytes), filename=f"{symbol}_chart.png")
-                        # Set the image in the embed
-                        embed.set_image(url=f"attachment://{symbol}_chart.png")
-
-                # Send embed with optional chart attachment
-                if chart_file:
-                    await message.channel.send(embed=embed, file=chart_file)
+                embed, chart_file = result
+                if LIVE_KEYWORD in options and self.watches.reserve(message.channel.id, WATCH_MAX_PER_CHANNEL):
+                    # Live messages are edited in place, so they get a message of their own;
+                    # past the channel's cap the reply is sent as a regular one
+                    self.mark_live(embed)
+                    sends.append(asyncio.ensure_future(self.send_live(
+                        message.channel, embed, chart_file, symbol, (interval, indicators, intervals)
+                    )))
                 else:
-                    await message.channel.send(embed=embed)
-
-                # Mark message as processed
-                self.processed_messages.add(message.id)
-
-                # Limit cache size (keep last 1000 messages)
-                if len(self.processed_messages) > 1000:
-                    # Remove oldest half
-                    self.processed_messages = set(list(self.processed_messages)[500:])
+                    sends.append(self.replies.add(message.channel, embed, chart_file))
 
+            except Shed:
+                # Dropped under load: a notice would only add to the load
+                continue
+            except QuoteUnavailable:
+                self.replies.add_error(message.channel, 'unavailable', symbol)
             except Exception as e:
-                print(f"Erreur lors du traitement de ${ticker}: {e}")
+                print(f"Erreur lors du traitement de ${symbol}: {e!r}")
                 import traceback
                 traceback.print_exc()
 
-                await message.channel.send(
-                    f"❌ Erreur lors de la récupération des données pour `${ticker}`.",
-                    delete_after=10
-                )
+                self.replies.add_error(message.channel, 'error', symbol)
+
+        await asyncio.gather(*sends, return_exceptions=True)
 
     @commands.command(name='stock', aliases=['ticker', 's'])
     async def stock_command(self, ctx, symbol: str):
@@ -316,39 +1085,33 @@ class StockTicker(commands.Cog):
         Commande manuelle pour obtenir des informations sur une action
         Usage: !stock AAPL
         """
-        symbol = symbol.upper().replace('$', '')
+        symbol = normalize_symbol(symbol.upper().replace('$', ''))
+        if not self.allow_request(ctx.author.id, ctx.channel.id):
+            await ctx.send("⏳ Trop de requêtes, réessayez dans quelques secondes.", delete_after=10)
+            return
+        self.popularity.record(symbol)
 
         try:
-            info = self.get_stock_data(symbol)
+            result = await self.submit_reply(symbol, priority=PRIORITY_COMMAND)
 
-            if info is None:
+            if result is None:
                 await ctx.send(
                     f"❌ Impossible de trouver les données pour `${symbol}`. "
                     f"Vérifiez que le symbole est correct."
                 )
                 return
 
-            # Create embed
-            embed = await self.create_stock_embed(symbol, info)
-
-            # Generate and attach chart image if enabled
-            chart_file = None
-            if USE_EMBEDDED_CHARTS and CHARTIMG_API_KEY:
-                # Use 1-day interval for main chart
-                # Free tier limit: 800x600 max
-                image_bytes = await generate_chart_image_bytes(symbol, interval='D', width=800, height=500)
-                if image_bytes:
-                    # Create Discord file from image bytes
-                    chart_file = discord.File(io.BytesIO(image_bytes), filename=f"{symbol}_chart.png")
-                    # Set the image in the embed
-                    embed.set_image(url=f"attachment://{symbol}_chart.png")
-
             # Send embed with optional chart attachment
-            if chart_file:
-                await ctx.send(embed=embed, file=chart_file)
-            else:
-                await ctx.send(embed=embed)
+            embed, chart_file = result
+            await self.send_reply(ctx, [embed], [chart_file] if chart_file else None)
 
+        except Shed:
+            await ctx.send("⚠️ Le bot est surchargé, réessayez dans quelques instants.", delete_after=10)
+        except QuoteUnavailable:
+            await ctx.send(
+                f"⏳ Données temporairement indisponibles pour `${symbol}`, réessayez dans quelques instants.",
+                delete_after=10
+            )
         except Exception as e:
             print(f"Erreur lors du traitement de la commande !stock {symbol}: {e}")
             import traceback
@@ -356,6 +1119,184 @@ class StockTicker(commands.Cog):
 
             await ctx.send(f"❌ Erreur lors de la récupération des données pour `${symbol}`.")
 
+    @commands.command(name='chart', aliases=['multi', 'c'])
+    async def chart_command(self, ctx, symbol: str, *, timeframes: str = ''):
+        """
+        Affiche les graphiques de plusieurs intervalles dans une seule image
+        Usage: !chart AAPL 1h,4h,1d [EMA,RSI]
+        """
+        symbol = normalize_symbol(symbol.upper().replace('$', ''))
+        if not self.allow_request(ctx.author.id, ctx.channel.id):
+            await ctx.send("⏳ Trop de requêtes, réessayez dans quelques secondes.", delete_after=10)
+            return
+        self.popularity.record(symbol)
+
+        # Reuse the message syntax: "!chart AAPL 1h,4h RSI" reads as "$AAPL 1h 4h RSI multi"
+        requests = tokenize(f"${symbol} {timeframes.replace(',', ' ')} {MULTI_KEYWORD}")
+        if not requests:
+            await ctx.send(f"❌ Symbole invalide: `{symbol}`.")
+            return
+        _, interval, indicators, _, intervals = requests[0]
+
+        try:
+            result = await self.submit_reply(symbol, interval, indicators, PRIORITY_COMMAND, intervals)
+
+            if result is None:
+                await ctx.send(
+                    f"❌ Impossible de trouver les données pour `${symbol}`. "
+                    f"Vérifiez que le symbole est correct."
+                )
+                return
+
+            embed, chart_file = result
+            await self.send_reply(ctx, [embed], [chart_file] if chart_file else None)
+
+        except Shed:
+            await ctx.send("⚠️ Le bot est surchargé, réessayez dans quelques instants.", delete_after=10)
+        except QuoteUnavailable:
+            await ctx.send(
+                f"⏳ Données temporairement indisponibles pour `${symbol}`, réessayez dans quelques instants.",
+                delete_after=10
+            )
+        except Exception as e:
+            print(f"Erreur lors du traitement de la commande !chart {symbol}: {e}")
+            import traceback
+            traceback.print_exc()
+
+            await ctx.send(f"❌ Erreur lors de la récupération des données pour `${symbol}`.")
+
+    @commands.command(name='stats')
+    @commands.check_any(commands.is_owner(), commands.has_permissions(administrator=True))
+    async def stats_command(self, ctx):
+        """
+        Latence par étape, caches et erreurs des API (administrateurs)
+        Usage: !stats
+        """
+        await ctx.send(f"```\n{metrics.summary()[:1700]}\nDémarrage: {startup.report()[:200]}\n```")
+
+    @commands.command(name='alert', aliases=['alerte'])
+    async def alert_command(self, ctx, symbol: str, *, condition: str = ''):
+        """
+        Crée une alerte de prix, notifiée dans ce salon
+        Usage: !alert AAPL > 200 · !alert TSLA < 5% (baisse de 5% depuis le cours actuel)
+        · !alert TSLA < 150 %5 (alerte à 5% de 150, soit 157,50)
+        """
+        symbol = normalize_symbol(symbol.upper().replace('$', ''))
+        parsed = parse_condition(condition)
+        if parsed is None:
+            await ctx.send(
+                "❌ Condition invalide. Exemples: `!alert AAPL > 200`, `!alert TSLA < 150`, `!alert NVDA > 5%`, "
+                "`!alert TSLA < 150 %5` (une baisse doit être inférieure à 100%)."
+            )
+            return
+        direction, value, percent = parsed
+
+        await self.alerts.load()
+        if self.alerts.count_for_user(ctx.author.id) >= ALERT_MAX_PER_USER:
+            await ctx.send(f"❌ Vous avez déjà {ALERT_MAX_PER_USER} alertes actives. Supprimez-en avec `!unalert`.")
+            return
+
+        try:
+            quote = await self.get_stock_data(symbol, PRIORITY_COMMAND) if self.is_known_symbol(symbol) else None
+        except QuoteUnavailable:
+            await ctx.send(
+                f"⏳ Données temporairement indisponibles pour `${symbol}`, réessayez dans quelques instants.",
+                delete_after=10
+            )
+            return
+        price = quote.price if quote is not None else None
+        if price is None:
+            await ctx.send(
+                f"❌ Impossible de trouver les données pour `${symbol}`. "
+                f"Vérifiez que le symbole est correct."
+            )
+            return
+
+        threshold = resolve_threshold(direction, value, percent, price)
+        if is_met(direction, threshold, price):
+            await ctx.send(
+                f"ℹ️ `${symbol}` est déjà {'au-dessus' if direction == ABOVE else 'en dessous'} de "
+                f"{threshold:,.2f} (cours actuel {price:,.2f})."
+            )
+            return
+
+        alert = await self.alerts.add(ctx.author.id, ctx.channel.id, symbol, direction, threshold, price)
+        metrics.set_gauge('alerts_active', len(self.alerts.book))
+        await ctx.send(
+            f"🔔 Alerte #{alert.id} créée: `${symbol}` {direction} {threshold:,.2f} (cours actuel {price:,.2f}). "
+            f"Vérifiée toutes les {ALERT_INTERVAL_SECONDS}s pendant les heures de marché."
+        )
+
+    @commands.command(name='alerts', aliases=['alertes'])
+    async def alerts_command(self, ctx):
+        """
+        Liste vos alertes de prix actives
+        Usage: !alerts
+        """
+        await self.alerts.load()
+        alerts = self.alerts.for_user(ctx.author.id)
+        if not alerts:
+            await ctx.send("Vous n'avez aucune alerte active. Créez-en une avec `!alert AAPL > 200`.")
+            return
+        lines = [
+            f"#{alert.id} `${alert.symbol}` {alert.direction} {alert.threshold:,.2f} · <#{alert.channel_id}>"
+            for alert in alerts
+        ]
+        await ctx.send("\n".join(lines)[:2000], allowed_mentions=discord.AllowedMentions.none())
+
+    @commands.command(name='unalert', aliases=['delalert'])
+    async def unalert_command(self, ctx, alert_id: int):
+        """
+        Supprime une de vos alertes de prix
+        Usage: !unalert 12
+        """
+        alert = await self.alerts.remove(ctx.author.id, alert_id)
+        if alert is None:
+            await ctx.send(f"❌ Aucune alerte #{alert_id} à votre nom. Voir `!alerts`.")
+            return
+        metrics.set_gauge('alerts_active', len(self.alerts.book))
+        await ctx.send(f"🗑️ Alerte #{alert.id} supprimée (`${alert.symbol}` {alert.direction} {alert.threshold:,.2f}).")
+
+    @commands.command(name='watch', aliases=['live'])
+    async def watch_command(self, ctx, symbol: str, minutes: int = WATCH_DURATION_MINUTES):
+        """
+        Affiche une cotation mise à jour en direct pendant les heures de marché
+        Usage: !watch AAPL [minutes]
+        """
+        symbol = normalize_symbol(symbol.upper().replace('$', ''))
+        minutes = max(1, min(minutes, WATCH_MAX_MINUTES))
+
+        # The slot is held while the quote is fetched and sent, so concurrent
+        # commands cannot push the channel past its cap
+        if not self.watches.reserve(ctx.channel.id, WATCH_MAX_PER_CHANNEL):
+            await ctx.send(
+                f"❌ Trop de cotations en direct dans ce salon (max {WATCH_MAX_PER_CHANNEL})."
+            )
+            return
+
+        try:
+            try:
+                quote = await self.get_stock_data(symbol, PRIORITY_COMMAND)
+            except QuoteUnavailable:
+                await ctx.send(
+                    f"⏳ Données temporairement indisponibles pour `${symbol}`, réessayez dans quelques instants.",
+                    delete_after=10
+                )
+                return
+            if quote is None:
+                await ctx.send(
+                    f"❌ Impossible de trouver les données pour `${symbol}`. "
+                    f"Vérifiez que le symbole est correct."
+                )
+                return
+
+            embed = await self.create_stock_embed(symbol, quote)
+            self.mark_live(embed)
+            sent = await ctx.send(embed=embed)
+        finally:
+            self.watches.release(ctx.channel.id)
+        self.start_watch(sent, symbol, minutes)
+
 
 async def setup(bot):
     """Required function to load the cog"""
@@ -7,24 +7,176 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Discord Bot Configuration
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 
 # Chart-img.com API Configuration (optional - for embedded chart images)
 CHARTIMG_API_KEY = os.getenv('CHARTIMG_API_KEY', '')
 USE_EMBEDDED_CHARTS = os.getenv('USE_EMBEDDED_CHARTS', 'true').lower() == 'true'
+# Chart endpoint, overridable to point at a test server (see benchmarks/bench_pipeline.py)
+CHARTIMG_API_URL = os.getenv('CHARTIMG_API_URL', 'https://api.chart-img.com/v2/tradingview/advanced-chart')
+
+# Chart-img.com HTTP client (one pooled session shared by all chart requests)
+CHARTIMG_MAX_CONNECTIONS = int(os.getenv('CHARTIMG_MAX_CONNECTIONS', '10'))
+CHARTIMG_KEEPALIVE_SECONDS = float(os.getenv('CHARTIMG_KEEPALIVE_SECONDS', '60'))
+CHARTIMG_CONNECT_TIMEOUT = float(os.getenv('CHARTIMG_CONNECT_TIMEOUT', '5'))
+CHARTIMG_READ_TIMEOUT = float(os.getenv('CHARTIMG_READ_TIMEOUT', '15'))
+CHARTIMG_TOTAL_TIMEOUT = float(os.getenv('CHARTIMG_TOTAL_TIMEOUT', '20'))
+
+# Rendered chart cache (bounded by total image bytes, TTL depends on chart interval)
+CHART_CACHE_MAX_BYTES = int(os.getenv('CHART_CACHE_MAX_MB', '64')) * 1024 * 1024
+CHART_CACHE_MAX_TTL = 1800  # Longest TTL for intraday/daily charts (30 minutes)
+CHART_WIDTH = 800   # Free tier limit: 800x600 max
+CHART_HEIGHT = 500
+CHART_THEME = 'dark'
+
+# Chart renderer: 'chartimg' (chart-img.com API, needs CHARTIMG_API_KEY) or
+# 'local' (candlesticks drawn in the bot from Yahoo OHLCV data, needs matplotlib)
+CHART_RENDERER = os.getenv('CHART_RENDERER', 'chartimg').lower()
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '2'))  # Local renderer processes
+CHART_LOCAL_BARS = 120  # Candles drawn by the local renderer
+CHARTS_ENABLED = USE_EMBEDDED_CHARTS and (CHART_RENDERER == 'local' or bool(CHARTIMG_API_KEY))
+
+# Sharding: total shard count and the shard IDs run by this process
+# (e.g. SHARD_COUNT=4 SHARD_IDS=0,1 in one process and SHARD_IDS=2,3 in another).
+# Leave both empty to run a single unsharded bot.
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+SHARD_IDS = [int(i) for i in os.getenv('SHARD_IDS', '').split(',') if i.strip()] or None
+if SHARD_IDS and not SHARD_COUNT:
+    raise ValueError("SHARD_IDS requires SHARD_COUNT, the total number of shards across all processes")
+if SHARD_IDS and any(not 0 <= shard_id < SHARD_COUNT for shard_id in SHARD_IDS):
+    raise ValueError(f"SHARD_IDS must be between 0 and SHARD_COUNT - 1 ({SHARD_COUNT - 1}), got {SHARD_IDS}")
+
+# Shared cache and message dedup backend: memory:// (single process),
+# sqlite:///data/cache.sqlite3 (processes on one host) or redis://host:6379/0
+CACHE_BACKEND_URL = os.getenv('CACHE_BACKEND_URL', 'memory://')
+MESSAGE_DEDUP_SECONDS = 600  # How long a processed message ID is remembered
 
 # Bot Settings
 COMMAND_PREFIX = '!'
 BOT_DESCRIPTION = 'Stock ticker bot - automatically responds to $TICKER symbols'
 
-# Ticker Detection Settings
-TICKER_PATTERN = r'\$([A-Z]{1,5})\b'  # Matches $AAPL, $TSLA, etc.
-# Advanced pattern: $AAPL 1h EMA,RSI
-ADVANCED_TICKER_PATTERN = r'\$([A-Z]{1,5})(?:\s+(\d+[smhdwMy]))?(?:\s+([A-Za-z,\s]+))?'
+# Symbol directory: NASDAQ Trader listing files (pipe-delimited), comma-separated
+SYMBOL_FILES = [
+    os.path.join(BASE_DIR, path.strip())
+    for path in os.getenv('SYMBOL_FILES', 'data/nasdaqlisted.txt,data/otherlisted.txt').split(',')
+    if path.strip()
+]
+SYMBOL_RELOAD_SECONDS = 3600  # Check listing files for changes every hour
+# Crypto assets accepted as $BTCUSD or $BTC-USD pairs (quoted on Yahoo as BTC-USD)
+CRYPTO_BASES = frozenset(
+    base.strip().upper()
+    for base in os.getenv('CRYPTO_BASES', 'BTC,ETH,SOL,XRP,ADA,DOGE,LTC,BNB,DOT,AVAX,LINK,XLM,BCH,SHIB').split(',')
+    if base.strip()
+)
+CRYPTO_QUOTES = ('USD', 'EUR')
+
+# Local OHLCV history: one memory-mapped file per (symbol, interval), updated
+# with the bars newer than the last stored one
+HISTORY_DIR = os.path.join(BASE_DIR, os.getenv('HISTORY_DIR', 'data/bars'))
+# Bars kept per stored interval (other intervals are built from these)
+HISTORY_RETENTION = {
+    '1': 2000,    # 1 minute, about 5 sessions
+    '5': 4800,    # 5 minutes, about 60 sessions
+    '15': 1600,
+    '30': 800,
+    '60': 3500,   # 1 hour, about 2 years
+    'D': 2600,    # 1 day, about 10 years
+    'W': 1000,
+    'M': 600,
+}
 
 # Cache Settings (to avoid rate limiting)
 CACHE_EXPIRY_SECONDS = 300  # 5 minutes
+CACHE_TTL_JITTER = 0.1  # +/-10% per entry so entries don't all expire at once
+QUOTE_CACHE_SIZE = int(os.getenv('QUOTE_CACHE_SIZE', '20000'))  # Max cached quotes (a few hundred bytes each)
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '1000'))  # Symbols with cached bars, indicators and embeds
+QUOTE_NOT_FOUND_TTL = 3600  # Unknown symbols are remembered for 1 hour
+
+# Failure handling: per-symbol exponential backoff after upstream errors, and a
+# circuit breaker that stops calling an upstream after consecutive failures
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 300
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '60'))
+
+# Quote Fetching Settings (yfinance runs on a bounded thread pool)
+QUOTE_WORKERS = int(os.getenv('QUOTE_WORKERS', '4'))
+QUOTE_TIMEOUT_SECONDS = float(os.getenv('QUOTE_TIMEOUT_SECONDS', '8'))
+# Lookups arriving within this window (seconds) are sent as one bulk request
+QUOTE_BATCH_WINDOW = float(os.getenv('QUOTE_BATCH_WINDOW', '0.05'))
+QUOTE_BATCH_SIZE = 50  # Max symbols per bulk request
+
+# Upstream rate limits (token bucket: sustained requests per second and burst size)
+YAHOO_RATE_LIMIT = float(os.getenv('YAHOO_RATE_LIMIT', '2'))
+YAHOO_BURST = int(os.getenv('YAHOO_BURST', '5'))
+CHARTIMG_RATE_LIMIT = float(os.getenv('CHARTIMG_RATE_LIMIT', '1'))
+CHARTIMG_BURST = int(os.getenv('CHARTIMG_BURST', '3'))
+# chart-img.com daily request budget (0 = unlimited). When fewer than
+# CHARTIMG_QUOTA_RESERVE requests remain, only !stock commands get chart images.
+CHARTIMG_DAILY_QUOTA = int(os.getenv('CHARTIMG_DAILY_QUOTA', '0'))
+CHARTIMG_QUOTA_RESERVE = int(os.getenv('CHARTIMG_QUOTA_RESERVE', '20'))
+CHARTIMG_QUEUE_TIMEOUT = 5  # Max seconds a chart request waits for the rate limiter
+
+# Refresh-ahead prefetching of the most requested symbols
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true'
+PREFETCH_CHARTS = os.getenv('PREFETCH_CHARTS', 'false').lower() == 'true'  # Also refresh default 1D charts
+PREFETCH_TOP_N = int(os.getenv('PREFETCH_TOP_N', '30'))  # Symbols kept warm
+PREFETCH_BUDGET = int(os.getenv('PREFETCH_BUDGET', '10'))  # Max refreshes per cycle
+PREFETCH_INTERVAL_SECONDS = 15  # Time between prefetch cycles
+PREFETCH_LOOKAHEAD_SECONDS = 45  # Refresh entries expiring within this window
+PREFETCH_HALF_LIFE_SECONDS = 1800  # Popularity scores halve every 30 minutes
+
+# Live quote messages ($AAPL live or !watch AAPL), edited in place during market hours
+LIVE_KEYWORD = 'live'
+WATCH_INTERVAL_SECONDS = int(os.getenv('WATCH_INTERVAL_SECONDS', '60'))  # Refresh period
+WATCH_DURATION_MINUTES = 30  # Default watch duration
+WATCH_MAX_MINUTES = 240  # Longest watch a user can ask for
+WATCH_MAX_PER_CHANNEL = 5  # Live messages per channel
+WATCH_MAX_EDITS_PER_CHANNEL = 4  # Message edits per channel per refresh
+
+# Price alerts (!alert AAPL > 200), checked with one batched quote fetch per
+# interval during market hours and stored in SQLite
+ALERTS_DB = os.path.join(BASE_DIR, os.getenv('ALERTS_DB', 'data/alerts.sqlite3'))
+ALERT_INTERVAL_SECONDS = int(os.getenv('ALERT_INTERVAL_SECONDS', '60'))  # Time between checks
+ALERT_MAX_PER_USER = int(os.getenv('ALERT_MAX_PER_USER', '20'))  # Active alerts per user
+
+# Multi-timeframe charts ($AAPL multi, $AAPL 1h 4h 1d multi or !chart AAPL 1h,4h,1d),
+# combined into one grid image
+MULTI_KEYWORD = 'multi'
+MULTI_MAX_INTERVALS = 4  # Charts per grid
+MULTI_GRID_MAX_WIDTH = 1600  # Grid width in pixels, charts are scaled down to fit
+
+# Message pipeline: ticker replies are built by a fixed pool of workers fed by a
+# bounded queue. When the queue is full, passive $TICKER detections are dropped
+# before !stock commands.
+TICKER_WORKERS = int(os.getenv('TICKER_WORKERS', '32'))  # Replies built concurrently
+TICKER_QUEUE_SIZE = int(os.getenv('TICKER_QUEUE_SIZE', '200'))  # Replies waiting for a worker
+TICKER_TIMEOUT_SECONDS = float(os.getenv('TICKER_TIMEOUT_SECONDS', '25'))  # Max time to build one reply
+
+# Per-user and per-channel throttling of ticker requests (token buckets:
+# sustained requests per second and burst size). Excess passive detections are ignored.
+USER_RATE_LIMIT = float(os.getenv('USER_RATE_LIMIT', '0.5'))
+USER_BURST = int(os.getenv('USER_BURST', '5'))
+CHANNEL_RATE_LIMIT = float(os.getenv('CHANNEL_RATE_LIMIT', '1'))
+CHANNEL_BURST = int(os.getenv('CHANNEL_BURST', '10'))
+
+# Outbound replies: embeds for the same channel within the window are sent
+# together, packed up to Discord's per-message limits
+REPLY_BATCH_WINDOW = float(os.getenv('REPLY_BATCH_WINDOW', '0.25'))  # Seconds
+REPLY_MAX_EMBEDS = 10  # Discord limit per message
+REPLY_MAX_FILES = 10  # Discord limit per message
+REPLY_MAX_EMBED_CHARS = 6000  # Discord limit on the total text of a message's embeds
+REPLY_MAX_UPLOAD_BYTES = int(os.getenv('REPLY_MAX_UPLOAD_MB', '10')) * 1024 * 1024  # Lowered to the guild's limit
+REPLY_ERROR_DELETE_AFTER = 10  # Seconds before the error summary is deleted
+
+# Metrics: Prometheus-format endpoint at http://METRICS_HOST:METRICS_PORT/metrics
+# (0 = disabled) and the !stats admin command
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+LOOP_LAG_INTERVAL_SECONDS = 1.0  # How often event loop lag is sampled
 
 # Color for Discord embeds
 EMBED_COLOR_GREEN = 0x00ff00  # Green for positive/neutral
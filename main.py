@@ -2,11 +2,15 @@
 Discord Stock Ticker Bot
 Automatically detects stock ticker symbols (e.g., $AAPL) and provides stock information
 """
+from utils.startup import startup  # First, so startup times include the other imports
 import discord
 from discord.ext import commands
 import sys
 import asyncio
-from config import DISCORD_TOKEN, COMMAND_PREFIX, BOT_DESCRIPTION
+from config import DISCORD_TOKEN, COMMAND_PREFIX, BOT_DESCRIPTION, SHARD_COUNT, SHARD_IDS
+from utils.metrics import metrics
+
+startup.mark('imports')
 
 # Check if token is configured
 if not DISCORD_TOKEN:
@@ -19,19 +23,37 @@ if not DISCORD_TOKEN:
 intents = discord.Intents.default()
 intents.message_content = True  # Required to read message content
 
-# Initialize bot
-bot = commands.Bot(
-    command_prefix=COMMAND_PREFIX,
-    description=BOT_DESCRIPTION,
-    intents=intents
-)
+# Initialize bot (sharded when SHARD_COUNT or SHARD_IDS is set)
+if SHARD_COUNT or SHARD_IDS:
+    bot = commands.AutoShardedBot(
+        command_prefix=COMMAND_PREFIX,
+        description=BOT_DESCRIPTION,
+        intents=intents,
+        shard_count=SHARD_COUNT,
+        shard_ids=SHARD_IDS
+    )
+else:
+    bot = commands.Bot(
+        command_prefix=COMMAND_PREFIX,
+        description=BOT_DESCRIPTION,
+        intents=intents
+    )
+
+
+@bot.event
+async def on_connect():
+    """Called when the gateway connection is established"""
+    startup.mark('connected')
 
 
 @bot.event
 async def on_ready():
     """Called when the bot is ready and connected to Discord"""
+    startup.mark('ready')
     print(f'Bot connecté en tant que {bot.user.name} (ID: {bot.user.id})')
     print(f'Discord.py version: {discord.__version__}')
+    if isinstance(bot, commands.AutoShardedBot):
+        print(f'Shards: {sorted(bot.shards)} / {bot.shard_count}')
     print('------')
     print('Le bot est prêt à détecter les tickers boursiers!')
     print('Tapez $AAPL dans un channel pour tester.')
@@ -41,6 +63,7 @@ async def on_ready():
 @bot.event
 async def on_error(event, *args, **kwargs):
     """Handle errors"""
+    metrics.increment('errors_total', event=event)
     print(f'Erreur dans {event}:')
     import traceback
     traceback.print_exc()
@@ -61,6 +84,7 @@ async def main():
     """Main entry point"""
     async with bot:
         await load_cogs()
+        startup.mark('cogs')
         await bot.start(DISCORD_TOKEN)
 
 
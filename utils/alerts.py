@@ -0,0 +1,405 @@
+"""
+Price Alerts
+One-shot price alerts (!alert AAPL > 200) kept in per-symbol threshold
+indexes, so a new price finds the alerts it triggers with a bisect, and
+persisted in SQLite so they survive restarts
+"""
+import asyncio
+import bisect
+import math
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ABOVE = '>'
+BELOW = '<'
+
+_NUMBER = r'(\d+(?:[.,]\d+)?)'
+_PERCENT = rf'(?:%\s*{_NUMBER}|{_NUMBER}\s*%)'
+# "> 200", "<150.5", "< 5%", "> %5", "< 150 %5" (>= and <= are accepted; alerts are inclusive)
+CONDITION_PATTERN = re.compile(rf'^([<>])=?\s*(?:{_PERCENT}|{_NUMBER}(?:\s*{_PERCENT})?)$')
+
+
+def _number(text):
+    return float(text.replace(',', '.')) if text else None
+
+
+def parse_condition(text):
+    """
+    Parse the condition of an !alert command
+
+    Three forms are understood: a price ('> 200'), a move relative to the
+    current price ('< 5%', a drop of 100% or more is rejected) and a price
+    with an early warning margin ('< 150 %5' fires within 5% of 150, i.e.
+    at 157.50; '> 200 5%' at 190):
+
+    >>> parse_condition('> 200')
+    ('>', 200.0, False)
+    >>> parse_condition('< 5%')
+    ('<', 5.0, True)
+    >>> parse_condition('>%5')
+    ('>', 5.0, True)
+    >>> parse_condition('< 150 %5')
+    ('<', 157.5, False)
+    >>> parse_condition('>= 200 5%')
+    ('>', 190.0, False)
+    >>> parse_condition('< 100%') is None
+    True
+    >>> parse_condition('> 200 %100') is None
+    True
+    >>> parse_condition('200') is None
+    True
+
+    Args:
+        text (str): Condition such as '> 200', '< 5%' or '< 150 %5'
+
+    Returns:
+        tuple: (direction, value, percent) with direction ABOVE or BELOW and
+        percent True for a move relative to the current price; None if the
+        text is not a condition
+    """
+    match = CONDITION_PATTERN.match(text.strip())
+    if match is None:
+        return None
+    direction, percent_before, percent_after, price, margin_before, margin_after = match.groups()
+    percent = _number(percent_before or percent_after)
+    if percent is not None:
+        if percent <= 0 or (direction == BELOW and percent >= 100):
+            return None
+        return direction, percent, True
+
+    price, margin = _number(price), _number(margin_before or margin_after)
+    if price <= 0:
+        return None
+    if margin is not None:
+        if margin <= 0 or (direction == ABOVE and margin >= 100):
+            return None
+        # Fire before the price is reached: above it for a drop, below it for a rise
+        price = round(price * (1 + margin / 100) if direction == BELOW else price * (1 - margin / 100), 6)
+    return direction, price, False
+
+
+def resolve_threshold(direction, value, percent, price):
+    """
+    Absolute price threshold of a condition
+
+    A percentage is a move from the current price in the condition's
+    direction: '> 5%' is 5% above it, '< 5%' 5% below.
+    """
+    if not percent:
+        return value
+    return price * (1 + value / 100) if direction == ABOVE else price * (1 - value / 100)
+
+
+def is_met(direction, threshold, price):
+    return price >= threshold if direction == ABOVE else price <= threshold
+
+
+class Alert:
+    """A price threshold a user is notified of, in the channel it was set in"""
+
+    __slots__ = ('id', 'user_id', 'channel_id', 'symbol', 'direction', 'threshold', 'reference', 'created_at')
+
+    def __init__(self, id, user_id, channel_id, symbol, direction, threshold, reference, created_at):
+        self.id = id
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.symbol = symbol
+        self.direction = direction
+        self.threshold = threshold
+        self.reference = reference  # Price when the alert was set
+        self.created_at = created_at
+
+    @property
+    def key(self):
+        """Sort key in its symbol's threshold index"""
+        return (self.threshold, self.id)
+
+
+class SymbolAlerts:
+    """
+    Threshold index of one symbol
+
+    Alerts above the price are sorted by threshold, so the ones a price
+    reaches are a prefix of the list; alerts below the price are a suffix
+    of theirs. Both are found with one bisect each.
+    """
+
+    __slots__ = ('above', 'below')
+
+    def __init__(self):
+        self.above = []  # (threshold, id), ascending
+        self.below = []  # (threshold, id), ascending
+
+    def __len__(self):
+        return len(self.above) + len(self.below)
+
+    def _side(self, direction):
+        return self.above if direction == ABOVE else self.below
+
+    def add(self, alert):
+        bisect.insort(self._side(alert.direction), alert.key)
+
+    def remove(self, alert):
+        side = self._side(alert.direction)
+        index = bisect.bisect_left(side, alert.key)
+        if index < len(side) and side[index] == alert.key:
+            del side[index]
+
+    def pop_triggered(self, price):
+        """
+        Remove and return the ids of the alerts met at this price
+
+        Returns:
+            list: Alert ids
+        """
+        reached = bisect.bisect_right(self.above, (price, math.inf))  # threshold <= price
+        crossed = bisect.bisect_left(self.below, (price, -math.inf))  # threshold >= price
+        ids = [alert_id for _, alert_id in self.above[:reached]]
+        ids.extend(alert_id for _, alert_id in self.below[crossed:])
+        del self.above[:reached]
+        del self.below[crossed:]
+        return ids
+
+
+class AlertBook:
+    """In-memory alerts, indexed by id, user and symbol"""
+
+    def __init__(self):
+        self.alerts = {}  # id -> Alert
+        self._symbols = {}  # symbol -> SymbolAlerts
+        self._users = {}  # user id -> set of alert ids
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def __contains__(self, alert_id):
+        return alert_id in self.alerts
+
+    def symbols(self):
+        """Symbols with at least one alert"""
+        return list(self._symbols)
+
+    def for_user(self, user_id):
+        """Alerts of a user, oldest first"""
+        return [self.alerts[alert_id] for alert_id in sorted(self._users.get(user_id, ()))]
+
+    def count_for_user(self, user_id):
+        return len(self._users.get(user_id, ()))
+
+    def add(self, alert):
+        self.alerts[alert.id] = alert
+        self._users.setdefault(alert.user_id, set()).add(alert.id)
+        index = self._symbols.get(alert.symbol)
+        if index is None:
+            index = self._symbols[alert.symbol] = SymbolAlerts()
+        index.add(alert)
+
+    def remove(self, alert_id):
+        """
+        Remove an alert
+
+        Returns:
+            Alert: The removed alert, or None if unknown
+        """
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        index = self._symbols.get(alert.symbol)
+        if index is not None:
+            index.remove(alert)
+            if not index:
+                del self._symbols[alert.symbol]
+        self._forget_user(alert)
+        return alert
+
+    def trigger(self, symbol, price):
+        """
+        Remove and return the alerts of a symbol met at a price
+
+        Returns:
+            list: Triggered alerts, in id order
+        """
+        index = self._symbols.get(symbol)
+        if index is None:
+            return []
+        triggered = [self.alerts.pop(alert_id) for alert_id in sorted(index.pop_triggered(price))]
+        if not index:
+            del self._symbols[symbol]
+        for alert in triggered:
+            self._forget_user(alert)
+        return triggered
+
+    def _forget_user(self, alert):
+        ids = self._users.get(alert.user_id)
+        if ids is not None:
+            ids.discard(alert.id)
+            if not ids:
+                del self._users[alert.user_id]
+
+
+class AlertStore:
+    """
+    SQLite persistence of the alerts
+
+    Queries run on a dedicated thread so the event loop never blocks on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-alerts')
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS alerts ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, channel_id INTEGER NOT NULL, '
+                'symbol TEXT NOT NULL, direction TEXT NOT NULL, threshold REAL NOT NULL, '
+                'reference REAL NOT NULL, created_at REAL NOT NULL)'
+            )
+        return self._db
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _load(self):
+        rows = self._connect().execute(
+            'SELECT id, user_id, channel_id, symbol, direction, threshold, reference, created_at FROM alerts'
+        ).fetchall()
+        return [Alert(*row) for row in rows]
+
+    def _insert(self, user_id, channel_id, symbol, direction, threshold, reference, created_at):
+        cursor = self._connect().execute(
+            'INSERT INTO alerts (user_id, channel_id, symbol, direction, threshold, reference, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (user_id, channel_id, symbol, direction, threshold, reference, created_at)
+        )
+        return cursor.lastrowid
+
+    def _delete(self, ids):
+        db = self._connect()
+        db.execute('BEGIN')
+        db.executemany('DELETE FROM alerts WHERE id = ?', [(alert_id,) for alert_id in ids])
+        db.execute('COMMIT')
+
+    async def load(self):
+        """Every stored alert"""
+        return await self._run(self._load)
+
+    async def insert(self, *fields):
+        """Store a new alert and return its id"""
+        return await self._run(self._insert, *fields)
+
+    async def delete(self, ids):
+        if ids:
+            await self._run(self._delete, list(ids))
+
+    async def close(self):
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
+
+
+class PriceAlerts:
+    """
+    Alert book backed by the SQLite store
+
+    Stored alerts are loaded on first use, so the store is not read on the
+    startup path.
+    """
+
+    def __init__(self, path):
+        self.store = AlertStore(path)
+        self.book = AlertBook()
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def load(self):
+        """Load the stored alerts once"""
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for alert in await self.store.load():
+                if alert.id not in self.book:
+                    self.book.add(alert)
+            self._loaded = True
+
+    def symbols(self):
+        return self.book.symbols()
+
+    def for_user(self, user_id):
+        return self.book.for_user(user_id)
+
+    def count_for_user(self, user_id):
+        return self.book.count_for_user(user_id)
+
+    async def add(self, user_id, channel_id, symbol, direction, threshold, reference):
+        """
+        Store and index a new alert
+
+        Returns:
+            Alert: The new alert
+        """
+        await self.load()
+        created_at = time.time()
+        alert_id = await self.store.insert(user_id, channel_id, symbol, direction, threshold, reference, created_at)
+        alert = Alert(alert_id, user_id, channel_id, symbol, direction, threshold, reference, created_at)
+        self.book.add(alert)
+        return alert
+
+    async def remove(self, user_id, alert_id):
+        """
+        Delete one of a user's alerts
+
+        Returns:
+            Alert: The deleted alert, or None if the user has no alert with this id
+        """
+        await self.load()
+        alert = self.book.alerts.get(alert_id)
+        if alert is None or alert.user_id != user_id:
+            return None
+        self.book.remove(alert_id)
+        await self.store.delete([alert_id])
+        return alert
+
+    async def evaluate(self, prices):
+        """
+        Fire the alerts met by new prices
+
+        Triggered alerts are one-shot: they are removed from the book, but
+        stay in the store until acknowledge deletes them once notified. An
+        alert whose notification failed can be put back with restore, and
+        one left in the store by a crash is reloaded on the next start.
+
+        Args:
+            prices (dict): symbol -> latest price
+
+        Returns:
+            list: Triggered alerts
+        """
+        await self.load()
+        triggered = []
+        for symbol, price in prices.items():
+            if price is not None:
+                triggered.extend(self.book.trigger(symbol, price))
+        return triggered
+
+    async def acknowledge(self, alerts):
+        """Delete triggered alerts from the store once their owners were notified"""
+        await self.store.delete([alert.id for alert in alerts])
+
+    def restore(self, alerts):
+        """Put triggered alerts back in the book, to fire again on the next check"""
+        for alert in alerts:
+            if alert.id not in self.book:
+                self.book.add(alert)
+
+    async def close(self):
+        await self.store.close()
@@ -0,0 +1,280 @@
+"""
+Shared Cache Backends
+Key/value stores with expiry shared by several bot processes (shards):
+in-process memory, SQLite file, or any Redis-protocol server
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from config import BASE_DIR
+
+# (dumps, loads) pair converting cached values to bytes
+BYTES_SERIALIZER = (bytes, bytes)
+
+
+class CacheBackend:
+    """
+    Interface of a shared cache backend
+
+    Values are bytes; every key expires after its TTL. Errors are raised to
+    the caller, which treats them as cache misses.
+    """
+
+    # True if the data is visible to other processes
+    shared = True
+
+    async def get(self, key):
+        """Return the value for key, or None if absent or expired"""
+        raise NotImplementedError
+
+    async def set(self, key, value, ttl):
+        """Store value for ttl seconds"""
+        raise NotImplementedError
+
+    async def add(self, key, value, ttl):
+        """
+        Store value only if key is absent
+
+        Returns:
+            bool: True if the value was stored
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """Release connections"""
+
+
+class MemoryBackend(CacheBackend):
+    """Process-local backend (the default for a single process)"""
+
+    shared = False
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self._entries = {}  # key -> (expires_at, value)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def set(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        if len(self._entries) > self.maxsize:
+            self._purge()
+
+    async def add(self, key, value, ttl):
+        if self._get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    def _purge(self):
+        now = time.monotonic()
+        self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+        # Still full of live entries: drop the oldest inserted ones
+        while len(self._entries) > self.maxsize:
+            del self._entries[next(iter(self._entries))]
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    SQLite file backend, shared by processes on the same host
+
+    Queries run on a dedicated thread so the event loop never blocks on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-cache')
+        self._db = None
+        self._writes = 0
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+            )
+        return self._db
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key, value, ttl):
+        db = self._connect()
+        db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, value, time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            db.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+
+    def _add(self, key, value, ttl):
+        db = self._connect()
+        now = time.time()
+        db.execute('DELETE FROM cache WHERE key = ? AND expires_at <= ?', (key, now))
+        cursor = db.execute(
+            'INSERT OR IGNORE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, value, now + ttl)
+        )
+        return cursor.rowcount == 1
+
+    async def get(self, key):
+        return await self._run(self._get, key)
+
+    async def set(self, key, value, ttl):
+        await self._run(self._set, key, value, ttl)
+
+    async def add(self, key, value, ttl):
+        return await self._run(self._add, key, value, ttl)
+
+    async def close(self):
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
+
+
+class RedisError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RedisBackend(CacheBackend):
+    """
+    Minimal client for Redis-protocol servers (Redis, Valkey, KeyDB, ...)
+
+    Speaks RESP over a single connection with commands serialized by a
+    lock; only GET and SET (EX/NX) are used. Reconnects on the next command
+    after a connection error.
+    """
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connexion Redis fermée")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b'+':
+            return payload.decode()
+        if prefix == b'-':
+            raise RedisError(payload.decode())
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if prefix == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"Réponse Redis invalide: {line!r}")
+
+    async def _send(self, *args):
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await asyncio.wait_for(self._read_reply(), self.timeout)
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        if self.password:
+            await self._send('AUTH', self.password)
+        if self.db:
+            await self._send('SELECT', self.db)
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def command(self, *args):
+        """Send one command and return its reply"""
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._send(*args)
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                self._disconnect()
+                raise
+
+    async def get(self, key):
+        return await self.command('GET', key)
+
+    async def set(self, key, value, ttl):
+        await self.command('SET', key, value, 'PX', max(1, int(ttl * 1000)))
+
+    async def add(self, key, value, ttl):
+        return await self.command('SET', key, value, 'PX', max(1, int(ttl * 1000)), 'NX') == 'OK'
+
+    async def close(self):
+        async with self._lock:
+            self._disconnect()
+
+
+def create_backend(url):
+    """
+    Create a cache backend from a URL
+
+    Args:
+        url (str): 'memory://', 'sqlite:///relative/path.db',
+            'sqlite:////absolute/path.db' or 'redis://[:password@]host:port/db'
+
+    Returns:
+        CacheBackend: The configured backend
+    """
+    parsed = urlparse(url)
+    if parsed.scheme in ('', 'memory'):
+        return MemoryBackend()
+    if parsed.scheme == 'sqlite':
+        path = url[len('sqlite:///'):]
+        if not os.path.isabs(path):
+            path = os.path.join(BASE_DIR, path)
+        return SQLiteBackend(path)
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.lstrip('/') or 0)
+        return RedisBackend(parsed.hostname or 'localhost', parsed.port or 6379, db, parsed.password)
+    raise ValueError(f"Backend de cache inconnu: {url}")
@@ -0,0 +1,224 @@
+"""
+Async TTL Cache
+Size-bounded LRU cache with jittered per-entry expiry and single-flight
+coalescing of concurrent misses. Can also be bounded by total weight
+(e.g. bytes of cached images) and backed by a shared backend so several
+processes reuse each other's fetches.
+"""
+import asyncio
+import random
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class AsyncTTLCache:
+    """
+    LRU cache whose entries expire after a jittered TTL
+
+    Concurrent misses for the same key share a single in-flight fetch, so a
+    burst of identical requests only reaches the upstream API once.
+    """
+
+    def __init__(self, maxsize=1000, ttl=300, jitter=0.1, max_weight=None, weigher=None,
+                 backend=None, namespace='', serializer=None):
+        """
+        Args:
+            maxsize (int): Maximum number of entries before LRU eviction
+            ttl (float): Default time-to-live in seconds
+            jitter (float): Fraction of the TTL randomly added or removed per
+                entry, so entries written together do not all expire together
+            max_weight (int): Maximum total weight before LRU eviction, or None
+            weigher: Callable returning the weight of a value (e.g. len for bytes)
+            backend (CacheBackend): Shared backend checked on local misses and
+                written after fetches (see utils/backends.py), or None
+            namespace (str): Key prefix in the shared backend
+            serializer: (dumps, loads) pair converting values to bytes
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.jitter = jitter
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self.backend = backend
+        self.namespace = namespace
+        self.serializer = serializer
+        self._entries = OrderedDict()  # key -> (expires_at, value, weight)
+        self._inflight = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.shared_hits = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expires_at(self, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        if self.jitter:
+            ttl *= 1 + random.uniform(-self.jitter, self.jitter)
+        return time.monotonic() + ttl
+
+    def get(self, key, default=None):
+        """Return a fresh cached value without fetching"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def expires_in(self, key):
+        """Seconds until an entry expires (negative if stale), or None if absent"""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0] - time.monotonic()
+
+    def peek(self, key, default=None):
+        """Return a cached value even if it has expired (stale fallback)"""
+        entry = self._entries.get(key)
+        return default if entry is None else entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting least recently used entries if full"""
+        weight = self.weigher(value) if self.weigher and value is not None else 0
+        self.invalidate(key)
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+
+        self._entries[key] = (self._expires_at(ttl), value, weight)
+        self.weight += weight
+        while len(self._entries) > self.maxsize or (
+                self.max_weight is not None and self.weight > self.max_weight):
+            _, (_, _, evicted_weight) = self._entries.popitem(last=False)
+            self.weight -= evicted_weight
+
+    def invalidate(self, key):
+        """Drop a cached value"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+
+    async def get_or_fetch(self, key, fetch, ttl=None):
+        """
+        Return the cached value for key, fetching it on a miss
+
+        Args:
+            key: Cache key
+            fetch: Zero-argument coroutine function producing the value
+            ttl: Time-to-live for this entry, defaults to the cache TTL. May be
+                a callable taking the fetched value; a result of 0 means the
+                value is returned but not cached
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._start_fill(key, fetch, ttl, shared=True)
+        else:
+            self.coalesced += 1
+
+        # Shield the shared fetch so one cancelled caller does not cancel it for the others
+        return await asyncio.shield(task)
+
+    async def refresh(self, key, fetch, ttl=None):
+        """
+        Fetch a new value for key even if the cached one is still fresh
+
+        The current value keeps being served until the new one arrives; a
+        fetch already in flight for the key is reused.
+
+        Returns:
+            The freshly fetched value
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.refreshes += 1
+            task = self._start_fill(key, fetch, ttl, shared=False)
+        return await asyncio.shield(task)
+
+    def _start_fill(self, key, fetch, ttl, shared):
+        task = asyncio.ensure_future(self._fill(key, fetch, ttl, shared))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._fill_done(key, t))
+        return task
+
+    async def _fill(self, key, fetch, ttl, shared):
+        if shared and self.backend is not None:
+            value, remaining = await self._shared_get(key)
+            if value is not _MISSING:
+                self.shared_hits += 1
+                self.set(key, value, remaining)
+                return value
+
+        value = await fetch()
+        if callable(ttl):
+            ttl = ttl(value)
+        if ttl != 0:
+            self.set(key, value, ttl)
+            if self.backend is not None:
+                await self._shared_set(key, value, self.ttl if ttl is None else ttl)
+        return value
+
+    def _shared_key(self, key):
+        return f"{self.namespace}:{key}"
+
+    async def _shared_get(self, key):
+        """Read a value and its remaining TTL from the shared backend"""
+        try:
+            data = await self.backend.get(self._shared_key(key))
+            if data is None:
+                return _MISSING, None
+            # Stored as "<wall-clock expiry>\n<payload>"
+            expires_at, payload = data.split(b'\n', 1)
+            remaining = float(expires_at) - time.time()
+            if remaining <= 0:
+                return _MISSING, None
+            return self.serializer[1](payload), remaining
+        except Exception as e:
+            print(f"Erreur de lecture du cache partagé ({self.namespace}): {e}")
+            return _MISSING, None
+
+    async def _shared_set(self, key, value, ttl):
+        try:
+            data = b'%.3f\n' % (time.time() + ttl) + self.serializer[0](value)
+            await self.backend.set(self._shared_key(key), data, ttl)
+        except Exception as e:
+            print(f"Erreur d'écriture du cache partagé ({self.namespace}): {e}")
+
+    def _fill_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved when every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """
+        Return cache counters
+
+        Returns:
+            dict: hits, misses, coalesced, refreshes, shared_hits, size, weight and hit_ratio
+        """
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'refreshes': self.refreshes,
+            'shared_hits': self.shared_hits,
+            'size': len(self._entries),
+            'weight': self.weight,
+            'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,121 @@
+"""
+Failure Handling
+Circuit breaker for upstream APIs and per-key exponential backoff for
+lookups that keep failing
+"""
+import time
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream after repeated failures
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every call is refused for `reset_timeout` seconds. Then a single trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60):
+        """
+        Args:
+            name (str): Upstream name, used in log messages
+            failure_threshold (int): Consecutive failures before opening
+            reset_timeout (float): Seconds to stay open before a trial call
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self):
+        """
+        Check whether a call may go to the upstream
+
+        Returns:
+            bool: False while the circuit is open
+        """
+        if self.state == self.CLOSED:
+            return True
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return False
+        # Let one trial call through; the timer restarts so a trial that
+        # never reports back does not block the circuit forever
+        self.state = self.HALF_OPEN
+        self._opened_at = time.monotonic()
+        return True
+
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        if self.state != self.CLOSED:
+            print(f"Circuit {self.name} refermé")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        """Count a failed call, opening the circuit past the threshold"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"Circuit {self.name} ouvert pour {self.reset_timeout:.0f}s après {self.failures} échecs")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class Backoff:
+    """Per-key exponential backoff after failures"""
+
+    def __init__(self, base=5, maximum=300, maxsize=10_000):
+        """
+        Args:
+            base (float): Delay after the first failure, in seconds
+            maximum (float): Upper bound for the delay
+            maxsize (int): Keys tracked before expired entries are pruned
+        """
+        self.base = base
+        self.maximum = maximum
+        self.maxsize = maxsize
+        self._entries = {}  # key -> (failures, retry_at)
+
+    def ready(self, key):
+        """True if the key is not currently backing off"""
+        entry = self._entries.get(key)
+        return entry is None or entry[1] <= time.monotonic()
+
+    def failure(self, key):
+        """
+        Record a failure and extend the backoff
+
+        Failures reported while the key is already backing off (e.g. by
+        several callers sharing one failed request) count only once.
+
+        Returns:
+            float: Seconds until the key may be retried
+        """
+        now = time.monotonic()
+        failures, retry_at = self._entries.get(key, (0, 0.0))
+        if retry_at > now:
+            return retry_at - now
+
+        delay = min(self.base * 2 ** failures, self.maximum)
+        self._entries[key] = (failures + 1, now + delay)
+        if len(self._entries) > self.maxsize:
+            self._prune(now)
+        return delay
+
+    def success(self, key):
+        """Forget the failures of a key"""
+        self._entries.pop(key, None)
+
+    def _prune(self, now):
+        # Keys whose backoff elapsed long ago are unlikely to fail again soon
+        self._entries = {
+            key: entry for key, entry in self._entries.items()
+            if entry[1] + self.maximum > now
+        }
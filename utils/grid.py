@@ -0,0 +1,69 @@
+"""
+Chart Grid
+Combines the charts of several timeframes into one image, so a
+multi-timeframe reply is a single upload and a single message
+
+Pillow is imported on first use, off the startup path.
+"""
+import io
+from config import MULTI_GRID_MAX_WIDTH
+
+BACKGROUNDS = {'dark': (19, 23, 34), 'light': (255, 255, 255)}
+LABEL_COLORS = {'dark': (209, 212, 220), 'light': (19, 23, 34)}
+
+
+def grid_columns(count):
+    """Columns of the grid: two, so charts stay readable at Discord's embed size"""
+    return 1 if count == 1 else 2
+
+
+def _label_font():
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.load_default(size=22)
+    except TypeError:  # Pillow < 10.1 has a single bitmap size
+        return ImageFont.load_default()
+
+
+def compose_chart_grid(charts, theme='dark', max_width=MULTI_GRID_MAX_WIDTH):
+    """
+    Paste chart images into one grid image (blocking)
+
+    Charts are scaled down to fit max_width and labelled with their
+    timeframe in the top right corner. An incomplete last row is centered.
+
+    Args:
+        charts (list): (label, PNG bytes) pairs, in grid order
+        theme (str): 'dark' or 'light'
+        max_width (int): Grid width limit in pixels
+
+    Returns:
+        bytes: PNG data
+    """
+    from PIL import Image, ImageDraw
+
+    images = [(label, Image.open(io.BytesIO(data)).convert('RGB')) for label, data in charts]
+    columns = grid_columns(len(images))
+    rows = -(-len(images) // columns)
+
+    tile_width = min(max(image.width for _, image in images), max_width // columns)
+    tile_height = max(round(image.height * tile_width / image.width) for _, image in images)
+
+    grid = Image.new('RGB', (tile_width * columns, tile_height * rows), BACKGROUNDS.get(theme, BACKGROUNDS['dark']))
+    draw = ImageDraw.Draw(grid)
+    font = _label_font()
+    last_row_offset = (columns * rows - len(images)) * tile_width // 2
+    for index, (label, image) in enumerate(images):
+        if image.width != tile_width:
+            image = image.resize((tile_width, round(image.height * tile_width / image.width)), Image.LANCZOS)
+        row, column = divmod(index, columns)
+        x = column * tile_width + (last_row_offset if row == rows - 1 else 0)
+        y = row * tile_height
+        grid.paste(image, (x, y))
+        draw.text((x + tile_width - 12, y + 8), label, font=font, anchor='ra',
+                  fill=LABEL_COLORS.get(theme, LABEL_COLORS['dark']))
+
+    output = io.BytesIO()
+    grid.save(output, format='PNG', optimize=True)
+    return output.getvalue()
@@ -0,0 +1,218 @@
+"""
+OHLCV History Store
+Keeps price bars on disk, one memory-mapped columnar file per
+(symbol, interval), so charts and indicators read local history and only
+the bars newer than the last stored one are downloaded
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+import numpy as np
+from config import HISTORY_DIR, HISTORY_RETENTION
+
+COLUMNS = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+# Intervals stored on disk -> (Yahoo interval, backfill period, oldest start
+# Yahoo accepts for that interval in seconds, None if unlimited)
+STORED_INTERVALS = {
+    '1': ('1m', '5d', 7 * 86400),
+    '5': ('5m', '60d', 59 * 86400),
+    '15': ('15m', '60d', 59 * 86400),
+    '30': ('30m', '60d', 59 * 86400),
+    '60': ('60m', '2y', 729 * 86400),
+    'D': ('1d', '10y', None),
+    'W': ('1wk', 'max', None),
+    'M': ('1mo', 'max', None),
+}
+
+# Locks shared by all the stored series, a series using the one its key hashes to
+SYNC_LOCK_STRIPES = 64
+
+# TradingView interval -> (stored interval, stored bars per candle)
+# Intervals Yahoo does not serve are built by merging consecutive bars
+HISTORY_INTERVALS = {
+    '1': ('1', 1),
+    '3': ('1', 3),
+    '5': ('5', 1),
+    '15': ('15', 1),
+    '30': ('30', 1),
+    '45': ('15', 3),
+    '60': ('60', 1),
+    '120': ('60', 2),
+    '180': ('60', 3),
+    '240': ('60', 4),
+    '360': ('60', 6),
+    '480': ('60', 8),
+    '720': ('60', 12),
+    'D': ('D', 1),
+    'W': ('W', 1),
+    'M': ('M', 1),
+}
+
+SAFE_SYMBOL = re.compile(r'^[A-Z0-9][A-Z0-9.\-^=]*$')
+
+
+def merge_bars(bars, factor):
+    """
+    Merge every `factor` consecutive bars into one candle
+
+    Groups are aligned on the last bar so the newest candle is complete;
+    they do not follow session boundaries.
+
+    Args:
+        bars (dict): OHLCV arrays ('time', 'open', 'high', 'low', 'close', 'volume')
+        factor (int): Bars per merged candle
+
+    Returns:
+        dict: Merged OHLCV arrays
+    """
+    if factor <= 1:
+        return bars
+    count = len(bars['close']) // factor * factor
+    if count == 0:
+        return bars
+
+    def grouped(key):
+        return np.asarray(bars[key][-count:]).reshape(-1, factor)
+
+    return {
+        'time': grouped('time')[:, 0],
+        'open': grouped('open')[:, 0],
+        'high': grouped('high').max(axis=1),
+        'low': grouped('low').min(axis=1),
+        'close': grouped('close')[:, -1],
+        'volume': grouped('volume').sum(axis=1),
+    }
+
+
+class BarStore:
+    """
+    On-disk OHLCV bars, one .npy file per (symbol, interval)
+
+    Each file holds a (6, n) float64 array: one contiguous row per column in
+    COLUMNS order, oldest bar first. Reads are memory-mapped, so callers get
+    zero-copy column views. Writes go to a temporary file that atomically
+    replaces the old one: existing maps keep reading the previous version
+    and other processes never see a half-written file.
+    """
+
+    def __init__(self, root=HISTORY_DIR, retention=None):
+        """
+        Args:
+            root (str): Directory holding one sub-directory per interval
+            retention (dict): Stored interval -> bars kept (HISTORY_RETENTION)
+        """
+        self.root = root
+        self.retention = retention or HISTORY_RETENTION
+        # Several chart intervals share a stored series (60, 120, 240 -> '60'),
+        # so concurrent syncs of one series are serialized. A fixed set of
+        # striped locks keeps memory bounded whatever symbols users type
+        self._locks = tuple(threading.Lock() for _ in range(SYNC_LOCK_STRIPES))
+
+    def path(self, symbol, interval):
+        if not SAFE_SYMBOL.match(symbol) or interval not in STORED_INTERVALS:
+            raise ValueError(f"Série invalide: {symbol} ({interval})")
+        return os.path.join(self.root, interval, f"{symbol}.npy")
+
+    def _load(self, symbol, interval):
+        path = self.path(symbol, interval)
+        try:
+            data = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"Historique illisible {path}: {e}")
+            return None
+        if data.ndim != 2 or data.shape[0] != len(COLUMNS):
+            print(f"Historique illisible {path}: forme {data.shape}")
+            return None
+        return data
+
+    def read(self, symbol, interval):
+        """
+        Stored bars of a series (blocking)
+
+        Returns:
+            dict: column name -> read-only memory-mapped array, or None if
+            nothing is stored
+        """
+        data = self._load(symbol, interval)
+        if data is None or data.shape[1] == 0:
+            return None
+        return dict(zip(COLUMNS, data))
+
+    def last_time(self, symbol, interval):
+        """Timestamp of the newest stored bar, or None"""
+        data = self._load(symbol, interval)
+        if data is None or data.shape[1] == 0:
+            return None
+        return float(data[0, -1])
+
+    def write(self, symbol, interval, bars, replace=False):
+        """
+        Merge new bars into a series (blocking)
+
+        Stored bars at or after the first new bar are replaced, so a bar
+        that was still forming when stored is overwritten by its final
+        version. The oldest bars beyond the retention limit are dropped.
+
+        Args:
+            bars (dict): OHLCV arrays, oldest first
+            replace (bool): Discard the stored bars instead of merging
+        """
+        new = np.vstack([np.asarray(bars[column], dtype=np.float64) for column in COLUMNS])
+        stored = None if replace else self._load(symbol, interval)
+        if stored is not None:
+            keep = int(np.searchsorted(stored[0], new[0, 0], side='left'))
+            new = np.hstack((stored[:, :keep], new))
+        retention = self.retention.get(interval)
+        if retention and new.shape[1] > retention:
+            new = new[:, -retention:]
+
+        path = self.path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{symbol}.", suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                np.save(f, np.ascontiguousarray(new))
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def sync(self, symbol, interval, fetch):
+        """
+        Download the bars newer than the last stored one and store them (blocking)
+
+        An empty series, or one older than Yahoo keeps for the interval, is
+        backfilled over the interval's full period instead. Syncs of the same
+        series run one at a time.
+
+        Args:
+            symbol (str): Stock ticker symbol
+            interval (str): Stored interval (key of STORED_INTERVALS)
+            fetch: Blocking callable (symbol, yahoo_interval, period=None,
+                start=None) returning OHLCV arrays or None
+
+        Returns:
+            dict: The stored bars after the update (see read)
+        """
+        with self._series_lock(symbol, interval):
+            return self._sync(symbol, interval, fetch)
+
+    def _series_lock(self, symbol, interval):
+        return self._locks[hash((symbol, interval)) % SYNC_LOCK_STRIPES]
+
+    def _sync(self, symbol, interval, fetch):
+        yahoo_interval, period, lookback = STORED_INTERVALS[interval]
+        last = self.last_time(symbol, interval)
+        if last is None or (lookback is not None and time.time() - last > lookback):
+            bars, replace = fetch(symbol, yahoo_interval, period=period), True
+        else:
+            bars, replace = fetch(symbol, yahoo_interval, start=last), False
+
+        if bars is not None and len(bars['time']):
+            self.write(symbol, interval, bars, replace=replace)
+        return self.read(symbol, interval)
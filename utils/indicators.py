@@ -0,0 +1,643 @@
+"""
+Technical Indicators
+NumPy implementations of the studies in TECHNICAL_INDICATORS, with
+TradingView's default lengths. Every function works along the last axis,
+so a 2D array computes one series per row (many symbols in one call), and
+returns arrays of the input's shape, padded with NaN until enough bars are
+available.
+
+IndicatorState keeps the latest values of one series and updates them
+bar by bar, so a reply only pays for the bars that arrived since the last
+one; IndicatorEngine holds those states for every (symbol, interval).
+"""
+import asyncio
+from collections import OrderedDict
+import numpy as np
+
+_windows = np.lib.stride_tricks.sliding_window_view
+
+
+def _rolling(values, length, reducer):
+    """Apply reducer to each window of `length` bars (NaN if a window has NaN)"""
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] >= length:
+        result[..., length - 1:] = reducer(_windows(values, length, axis=-1), axis=-1)
+    return result
+
+
+def sma(values, length=9):
+    """Simple moving average"""
+    return _rolling(values, length, np.mean)
+
+
+def _smooth(values, alpha, length):
+    """Exponential smoothing seeded with the SMA of the first `length` valid values"""
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(values.shape, np.nan)
+    size = values.shape[-1]
+
+    if values.ndim == 1:
+        valid = np.flatnonzero(~np.isnan(values))
+        if len(valid) < length:
+            return result
+        start = valid[0] + length - 1
+        current = values[valid[0]:start + 1].mean()
+        result[start] = current
+        for i in range(start + 1, size):
+            current += alpha * (values[i] - current)
+            result[i] = current
+        return result
+
+    # One row per series: step through time, vectorized across rows
+    rows = values.reshape(-1, size)
+    out = result.reshape(-1, size)
+    valid = ~np.isnan(rows)
+    first = np.where(valid.any(axis=-1), valid.argmax(axis=-1), size)
+    seeds = first + length - 1
+    ready = np.flatnonzero(seeds < size)
+    if len(ready) == 0:
+        return result
+    rows, seeds, first = rows[ready], seeds[ready], first[ready]
+    seed_values = _windows(rows, length, axis=-1)[np.arange(len(ready)), first].mean(axis=-1)
+    current = np.full(len(ready), np.nan)
+    for t in range(seeds.min(), size):
+        current = np.where(seeds == t, seed_values, current + alpha * (rows[:, t] - current))
+        out[ready, t] = current
+    return result
+
+
+def ema(values, length=9):
+    """Exponential moving average"""
+    return _smooth(values, 2.0 / (length + 1), length)
+
+
+def rma(values, length=14):
+    """Wilder's moving average (used by RSI, ATR and ADX)"""
+    return _smooth(values, 1.0 / length, length)
+
+
+def wma(values, length=9):
+    """Linearly weighted moving average"""
+    weights = np.arange(1, length + 1, dtype=np.float64)
+    return _rolling(values, length, lambda windows, axis: windows @ weights / weights.sum())
+
+
+def bollinger(values, length=20, mult=2.0):
+    """
+    Bollinger Bands
+
+    Returns:
+        tuple: (basis, upper, lower)
+    """
+    basis = sma(values, length)
+    deviation = _rolling(values, length, np.std)
+    return basis, basis + mult * deviation, basis - mult * deviation
+
+
+def _changes(values):
+    return np.diff(np.asarray(values, dtype=np.float64), prepend=np.nan, axis=-1)
+
+
+def _gains_losses(values):
+    change = _changes(values)
+    return np.maximum(change, 0.0), np.maximum(-change, 0.0)  # NaN stays NaN
+
+
+def rsi(values, length=14):
+    """Relative strength index (0-100)"""
+    gains, losses = _gains_losses(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # A window without losses gives gain / 0 = inf, i.e. an RSI of 100
+        return 100.0 - 100.0 / (1.0 + rma(gains, length) / rma(losses, length))
+
+
+def macd(values, fast=12, slow=26, signal=9):
+    """
+    Moving average convergence/divergence
+
+    Returns:
+        tuple: (macd, signal, histogram)
+    """
+    line = ema(values, fast) - ema(values, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def _stochastic_k(high, low, close, length):
+    highest = _rolling(high, length, np.max)
+    lowest = _rolling(low, length, np.min)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 * (np.asarray(close, dtype=np.float64) - lowest) / (highest - lowest)
+
+
+def stochastic(high, low, close, length=14, smooth_k=1, smooth_d=3):
+    """
+    Stochastic oscillator
+
+    Returns:
+        tuple: (%K, %D)
+    """
+    raw = _stochastic_k(high, low, close, length)
+    k = sma(raw, smooth_k) if smooth_k > 1 else raw
+    return k, sma(k, smooth_d)
+
+
+def _mean_deviation(windows, axis):
+    return np.abs(windows - windows.mean(axis=axis, keepdims=True)).mean(axis=axis)
+
+
+def cci(high, low, close, length=20):
+    """Commodity channel index"""
+    typical = (np.asarray(high) + np.asarray(low) + np.asarray(close)) / 3.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (typical - sma(typical, length)) / (0.015 * _rolling(typical, length, _mean_deviation))
+
+
+def true_range(high, low, close):
+    """True range of each bar (the first bar uses its high-low range)"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    previous = np.roll(np.asarray(close, dtype=np.float64), 1, axis=-1)
+    previous[..., 0] = np.nan
+    # fmax ignores NaN, so a missing previous close falls back to high - low
+    return np.fmax(np.fmax(high - low, np.abs(high - previous)), np.abs(low - previous))
+
+
+def atr(high, low, close, length=14):
+    """Average true range"""
+    return rma(true_range(high, low, close), length)
+
+
+def _directional_movement(high, low, close):
+    """+DM, -DM and true range of each bar (NaN on the first bar of a series)"""
+    up = _changes(high)
+    down = -_changes(low)
+    first = np.isnan(up) | np.isnan(down)
+    plus_dm = np.where(first, np.nan, np.where((up > down) & (up > 0), up, 0.0))
+    minus_dm = np.where(first, np.nan, np.where((down > up) & (down > 0), down, 0.0))
+    return plus_dm, minus_dm, np.where(first, np.nan, true_range(high, low, close))
+
+
+def _dx(plus, minus, tr):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = 100.0 * plus / tr
+        minus_di = 100.0 * minus / tr
+        return 100.0 * np.abs(plus_di - minus_di) / (plus_di + minus_di), plus_di, minus_di
+
+
+def adx(high, low, close, length=14):
+    """
+    Average directional index
+
+    Returns:
+        tuple: (adx, +DI, -DI)
+    """
+    plus_dm, minus_dm, tr = _directional_movement(high, low, close)
+    dx, plus_di, minus_di = _dx(rma(plus_dm, length), rma(minus_dm, length), rma(tr, length))
+    return rma(dx, length), plus_di, minus_di
+
+
+def obv(close, volume):
+    """On balance volume"""
+    close = np.asarray(close, dtype=np.float64)
+    direction = np.sign(np.diff(close, prepend=close[..., :1], axis=-1))
+    result = np.nancumsum(direction * np.asarray(volume, dtype=np.float64), axis=-1)
+    result[np.isnan(close)] = np.nan
+    return result
+
+
+def _midpoint(high, low, length):
+    return (_rolling(high, length, np.max) + _rolling(low, length, np.min)) / 2.0
+
+
+def ichimoku(high, low, conversion=9, base=26, span_b=52):
+    """
+    Ichimoku cloud lines, not displaced
+
+    Leading spans are plotted `base` bars ahead by the caller.
+
+    Returns:
+        tuple: (conversion line, base line, leading span A, leading span B)
+    """
+    conversion_line = _midpoint(high, low, conversion)
+    base_line = _midpoint(high, low, base)
+    return conversion_line, base_line, (conversion_line + base_line) / 2.0, _midpoint(high, low, span_b)
+
+
+# Bars kept per series by IndicatorState: enough for every window above
+# (Ichimoku span B over 52 bars, displaced by 26) and for a full warm-up
+TAIL = 200
+
+# Bars a state is seeded from: the running averages forget their start
+# geometrically ((25/27)^500 for EMA 26, (13/14)^500 for Wilder's 14 are
+# below 1e-16), so older bars would not change the result
+SEED_BARS = 500
+
+# Running averages carried from bar to bar: name -> (source, length, kind)
+_RECURRENCES = (
+    ('ema9', 'close', 9, 'ema'),
+    ('ema12', 'close', 12, 'ema'),
+    ('ema26', 'close', 26, 'ema'),
+    ('signal', 'macd', 9, 'ema'),
+    ('gain', 'gain', 14, 'rma'),
+    ('loss', 'loss', 14, 'rma'),
+    ('atr', 'tr', 14, 'rma'),
+    ('plus', 'plus_dm', 14, 'rma'),
+    ('minus', 'minus_dm', 14, 'rma'),
+    ('trs', 'tr_dm', 14, 'rma'),
+    ('adx', 'dx', 14, 'rma'),
+)
+
+
+def _recurrence_state(high, low, close, volume):
+    """Running averages at the last bar of each row (vectorized over rows)"""
+    gains, losses = _gains_losses(close)
+    plus_dm, minus_dm, tr_dm = _directional_movement(high, low, close)
+    sources = {
+        'close': close, 'gain': gains, 'loss': losses, 'tr': true_range(high, low, close),
+        'plus_dm': plus_dm, 'minus_dm': minus_dm, 'tr_dm': tr_dm,
+    }
+    full = {}
+    for name, source, length, kind in _RECURRENCES:
+        if name == 'signal':
+            sources['macd'] = full['ema12'] - full['ema26']
+        if name == 'adx':
+            sources['dx'] = _dx(full['plus'], full['minus'], full['trs'])[0]
+        full[name] = (ema if kind == 'ema' else rma)(sources[source], length)
+    state = {name: values[..., -1] for name, values in full.items()}
+    state['obv'] = obv(close, volume)[..., -1]
+    return state
+
+
+def _step(state, previous, bar):
+    """Running averages after one more bar (scalar version of _recurrence_state)"""
+    _, _, prev_high, prev_low, prev_close, _ = previous
+    _, _, high, low, close, volume = bar
+    change = close - prev_close
+    tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+    up, down = high - prev_high, prev_low - low
+    inputs = {
+        'close': close, 'gain': max(change, 0.0), 'loss': max(-change, 0.0), 'tr': tr,
+        'plus_dm': up if up > down and up > 0 else 0.0,
+        'minus_dm': down if down > up and down > 0 else 0.0,
+        'tr_dm': tr,
+    }
+    new = {}
+    for name, source, length, kind in _RECURRENCES:
+        if name == 'signal':
+            inputs['macd'] = new['ema12'] - new['ema26']
+        if name == 'adx':
+            inputs['dx'] = float(_dx(new['plus'], new['minus'], new['trs'])[0])
+        alpha = 2.0 / (length + 1) if kind == 'ema' else 1.0 / length
+        new[name] = state[name] + alpha * (inputs[source] - state[name])
+    new['obv'] = state['obv'] + np.sign(change) * volume
+    return new
+
+
+COLUMNS = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+
+class IndicatorState:
+    """
+    Latest indicator values of one series, updated bar by bar
+
+    The last bar of a series may still be forming: it is evaluated on top
+    of the committed state without being committed, so a revised last bar
+    simply replaces it on the next update. Updating costs a few scalar
+    operations per new bar plus windows over the last TAIL bars.
+    """
+
+    __slots__ = ('tail', 'state', 'values', 'last')
+
+    def __init__(self, tail, state):
+        """
+        Args:
+            tail (np.ndarray): Last committed bars, shape (n, 6) in COLUMNS order
+            state (dict): Running averages at the last committed bar
+        """
+        self.tail = tail
+        self.state = state
+        self.values = {}
+        self.last = None  # Bar the values were computed for
+
+    @classmethod
+    def from_bars(cls, bars):
+        """Build the state of one series from its full history"""
+        return load_states({None: bars})[None]
+
+    @property
+    def time(self):
+        """Timestamp of the last committed bar"""
+        return self.tail[-1, 0] if len(self.tail) else None
+
+    @property
+    def warmed_up(self):
+        return not any(np.isnan(value) for value in self.state.values())
+
+    def update(self, bars):
+        """
+        Apply the bars newer than the committed state
+
+        Nothing is applied if the history does not line up with the
+        committed bars (gap, split adjustment), too many bars arrived or the
+        series is not warmed up yet: the state must then be rebuilt with
+        load_states, which the caller runs off the event loop.
+
+        Args:
+            bars (dict): OHLCV arrays, oldest first
+
+        Returns:
+            bool: False if the state needs a full rebuild
+        """
+        times = bars['time']
+        start = int(np.searchsorted(times, self.time, side='right')) if self.time is not None else 0
+        aligned = start > 0 and times[start - 1] == self.time and bars['close'][start - 1] == self.tail[-1, 4]
+        if not aligned or not self.warmed_up or len(times) - start > TAIL:
+            return False
+        if len(times) - start == 1 and self.last is not None and \
+                all(bars[column][-1] == self.last[i] for i, column in enumerate(COLUMNS)):
+            return True  # Same bars as last time
+
+        new = np.column_stack([bars[column][start:] for column in COLUMNS])
+        for bar in new[:-1]:
+            self.state = _step(self.state, self.tail[-1], bar)
+            self.tail = np.vstack((self.tail[1 - TAIL:], bar))
+        if len(new):
+            self.preview(new[-1])
+        return True
+
+    def preview(self, bar):
+        """Compute the values as of a (possibly forming) bar without committing it"""
+        state = _step(self.state, self.tail[-1], bar)
+        self.values = _snapshot(np.vstack((self.tail, bar)), state, self.state)
+        self.last = bar
+
+
+_WMA_WEIGHTS = np.arange(1, 10, dtype=np.float64) / 45.0
+
+
+def _snapshot(bars, state, previous):
+    """Current indicator values from the last bars and the running averages"""
+    high, low, close, volume = bars[:, 2], bars[:, 3], bars[:, 4], bars[:, 5]
+    price = close[-1]
+    nan = np.nan
+    values = {
+        'close': price,
+        'ema': state['ema9'],
+        'sma': nan, 'wma': nan, 'bb_basis': nan, 'bb_upper': nan, 'bb_lower': nan,
+        'stoch_k': nan, 'stoch_d': nan, 'cci': nan, 'cloud_top': nan, 'cloud_bottom': nan,
+        'atr': state['atr'],
+        'adx': state['adx'],
+        'obv': state['obv'],
+        'volume': volume[-1],
+        'volume_average': volume[-20:].mean(),
+    }
+
+    macd_line = state['ema12'] - state['ema26']
+    values['macd'] = macd_line
+    values['macd_signal'] = state['signal']
+    values['macd_histogram'] = macd_line - state['signal']
+    values['macd_previous_histogram'] = previous['ema12'] - previous['ema26'] - previous['signal']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values['rsi'] = 100.0 - 100.0 / (1.0 + state['gain'] / state['loss'])
+        dx, plus_di, minus_di = _dx(state['plus'], state['minus'], state['trs'])
+        values['plus_di'], values['minus_di'] = float(plus_di), float(minus_di)
+
+        if len(close) >= 9:
+            values['sma'] = close[-9:].mean()
+            values['wma'] = close[-9:] @ _WMA_WEIGHTS
+        if len(close) >= 16:
+            # %K of the last three bars, %D is their mean
+            highest = _windows(high[-16:], 14).max(axis=1)
+            lowest = _windows(low[-16:], 14).min(axis=1)
+            k_values = 100.0 * (close[-3:] - lowest) / (highest - lowest)
+            values['stoch_k'], values['stoch_d'] = k_values[-1], k_values.mean()
+        if len(close) >= 20:
+            window = close[-20:]
+            basis, deviation = window.mean(), window.std()
+            values['bb_basis'] = basis
+            values['bb_upper'], values['bb_lower'] = basis + 2 * deviation, basis - 2 * deviation
+            typical = (high[-20:] + low[-20:] + window) / 3.0
+            values['cci'] = (typical[-1] - typical.mean()) / (0.015 * np.abs(typical - typical.mean()).mean())
+        if len(close) >= 78:
+            # Leading spans displayed at this bar were computed 26 bars ago
+            span_high, span_low = high[-78:-26], low[-78:-26]
+            conversion = (span_high[-9:].max() + span_low[-9:].min()) / 2
+            base = (span_high[-26:].max() + span_low[-26:].min()) / 2
+            span_a, span_b = (conversion + base) / 2, (span_high.max() + span_low.min()) / 2
+            values['cloud_top'], values['cloud_bottom'] = max(span_a, span_b), min(span_a, span_b)
+    return values
+
+
+def load_states(series):
+    """
+    Build the indicator states of many series in one vectorized pass
+
+    Series are right-aligned in one matrix (shorter ones padded with NaN)
+    so every running average is computed once for all of them. Only the
+    last SEED_BARS bars are stepped through; OBV, a plain cumulative sum,
+    still covers the whole history.
+
+    Args:
+        series (dict): key -> OHLCV arrays (see utils.quotes.fetch_ohlcv)
+
+    Returns:
+        dict: key -> IndicatorState (series with fewer than 2 bars are skipped)
+    """
+    series = {key: bars for key, bars in series.items() if len(bars['close']) >= 2}
+    if not series:
+        return {}
+
+    # Committed history excludes the last (possibly forming) bar
+    width = min(max(len(bars['close']) for bars in series.values()) - 1, SEED_BARS)
+    matrix = np.full((len(COLUMNS), len(series), width), np.nan)
+    for row, bars in enumerate(series.values()):
+        count = min(len(bars['close']) - 1, width)
+        for column, name in enumerate(COLUMNS):
+            matrix[column, row, width - count:] = bars[name][-count - 1:-1]
+
+    _, _, high, low, close, volume = matrix
+    recurrences = _recurrence_state(high, low, close, volume)
+    recurrences['obv'] = np.array([
+        obv(bars['close'][:-1], bars['volume'][:-1])[-1] for bars in series.values()
+    ])
+
+    states = {}
+    for row, (key, bars) in enumerate(series.items()):
+        count = min(len(bars['close']) - 1, TAIL)
+        tail = matrix[:, row, width - count:].T.copy()
+        state = IndicatorState(tail, {name: float(values[row]) for name, values in recurrences.items()})
+        state.preview(np.array([bars[column][-1] for column in COLUMNS], dtype=np.float64))
+        states[key] = state
+    return states
+
+
+def _number(value, digits=2):
+    return f"{value:,.{digits}f}"
+
+
+def describe_indicators(values, indicators):
+    """
+    Format the current values and signals of the requested indicators
+
+    Args:
+        values (dict): IndicatorState.values
+        indicators (iterable): Indicator names from TECHNICAL_INDICATORS
+
+    Returns:
+        list: (field name, field value) pairs for the embed; indicators
+        without enough history are left out
+    """
+    price = values['close']
+    fields = []
+
+    def position(level):
+        return "prix au-dessus" if price >= level else "prix en dessous"
+
+    for name in dict.fromkeys(indicators):
+        if name == 'Exponential Moving Average' and not np.isnan(values['ema']):
+            fields.append(("EMA 9", f"{_number(values['ema'])} ({position(values['ema'])})"))
+        elif name == 'Simple Moving Average' and not np.isnan(values['sma']):
+            fields.append(("SMA 9", f"{_number(values['sma'])} ({position(values['sma'])})"))
+        elif name == 'Weighted Moving Average' and not np.isnan(values['wma']):
+            fields.append(("WMA 9", f"{_number(values['wma'])} ({position(values['wma'])})"))
+        elif name == 'Relative Strength Index' and not np.isnan(values['rsi']):
+            rsi_value = values['rsi']
+            zone = "suracheté" if rsi_value >= 70 else "survendu" if rsi_value <= 30 else "neutre"
+            fields.append(("RSI 14", f"**{rsi_value:.1f}** ({zone})"))
+        elif name == 'MACD' and not np.isnan(values['macd_signal']):
+            histogram, previous = values['macd_histogram'], values['macd_previous_histogram']
+            if histogram >= 0 > previous:
+                signal = "📈 croisement haussier"
+            elif histogram < 0 <= previous:
+                signal = "📉 croisement baissier"
+            else:
+                signal = "au-dessus du signal" if histogram >= 0 else "sous le signal"
+            fields.append((
+                "MACD 12 26 9",
+                f"{_number(values['macd'], 3)} / signal {_number(values['macd_signal'], 3)}\n{signal}"
+            ))
+        elif name == 'Bollinger Bands' and not np.isnan(values['bb_upper']):
+            upper, lower = values['bb_upper'], values['bb_lower']
+            if price > upper:
+                signal = "au-dessus de la bande haute"
+            elif price < lower:
+                signal = "sous la bande basse"
+            else:
+                signal = f"dans les bandes (%B {(price - lower) / (upper - lower):.2f})" if upper > lower \
+                    else "dans les bandes"
+            fields.append(("Bollinger 20 2", f"{_number(lower)} - {_number(upper)}\n{signal}"))
+        elif name == 'Stochastic' and not np.isnan(values['stoch_d']):
+            k = values['stoch_k']
+            zone = "suracheté" if k >= 80 else "survendu" if k <= 20 else "neutre"
+            fields.append(("Stoch 14 1 3", f"%K {k:.1f} / %D {values['stoch_d']:.1f} ({zone})"))
+        elif name == 'Commodity Channel Index' and not np.isnan(values['cci']):
+            fields.append(("CCI 20", f"{values['cci']:.1f}"))
+        elif name == 'Average Directional Index' and not np.isnan(values['adx']):
+            strength = "tendance forte" if values['adx'] >= 25 else "tendance faible"
+            direction = "haussière" if values['plus_di'] >= values['minus_di'] else "baissière"
+            fields.append(("ADX 14", f"{values['adx']:.1f} ({strength}, {direction})"))
+        elif name == 'Average True Range' and not np.isnan(values['atr']):
+            fields.append(("ATR 14", f"{_number(values['atr'])} ({values['atr'] / price * 100:.2f}% du prix)"))
+        elif name == 'On Balance Volume' and not np.isnan(values['obv']):
+            fields.append(("OBV", f"{values['obv']:,.0f}"))
+        elif name == 'Volume' and values['volume_average'] > 0:
+            fields.append(("Volume", f"{values['volume'] / values['volume_average']:.1f}x la moyenne 20"))
+        elif name == 'Ichimoku Cloud' and not np.isnan(values['cloud_top']):
+            if price > values['cloud_top']:
+                signal = "prix au-dessus du nuage"
+            elif price < values['cloud_bottom']:
+                signal = "prix sous le nuage"
+            else:
+                signal = "prix dans le nuage"
+            fields.append(("Ichimoku", signal))
+    return fields
+
+
+class IndicatorEngine:
+    """
+    Indicator states of many series, kept up to date between requests
+
+    Series requested for the first time (or needing a full rebuild, see
+    IndicatorState.update) during the same event loop iteration are loaded
+    together by one load_states call, run in a worker thread so the event
+    loop keeps serving other messages.
+    """
+
+    def __init__(self, maxsize=1000):
+        """
+        Args:
+            maxsize (int): Series kept before the least recently used are dropped
+        """
+        self.maxsize = maxsize
+        self._states = OrderedDict()  # key -> IndicatorState
+        self._pending = {}  # key -> (bars, future), waiting for the next load
+        self._loading = {}  # key -> future, being loaded
+        self._flushes = set()  # Running load tasks, referenced until done
+
+    def __len__(self):
+        return len(self._states)
+
+    def clear(self):
+        self._states.clear()
+
+    async def values(self, key, bars):
+        """
+        Current indicator values of a series
+
+        Args:
+            key: Series identifier, e.g. (symbol, interval)
+            bars (dict): Latest OHLCV arrays of the series
+
+        Returns:
+            dict: IndicatorState.values, or None if the series is too short
+        """
+        state = self._states.get(key)
+        if state is not None:
+            if state.update(bars):
+                self._states.move_to_end(key)
+                return state.values
+            # Rebuilt like a new series, in the worker thread
+            del self._states[key]
+
+        future = self._loading.get(key)
+        if future is None:
+            pending = self._pending.get(key)
+            future = pending[1] if pending is not None else None
+        if future is not None:
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[key] = (bars, future)
+        if len(self._pending) == 1:
+            loop.call_soon(self._start_flush)
+        return await asyncio.shield(future)
+
+    def _start_flush(self):
+        task = asyncio.get_running_loop().create_task(self._flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        self._loading.update((key, future) for key, (_, future) in pending.items())
+        try:
+            states = await asyncio.to_thread(load_states, {key: bars for key, (bars, _) in pending.items()})
+        except Exception as e:
+            for _, future in pending.values():
+                future.set_exception(e)
+                future.exception()
+            return
+        finally:
+            for key in pending:
+                self._loading.pop(key, None)
+
+        for key, (_, future) in pending.items():
+            state = states.get(key)
+            if state is not None:
+                self._states[key] = state
+            future.set_result(state.values if state is not None else None)
+        while len(self._states) > self.maxsize:
+            self._states.popitem(last=False)
@@ -0,0 +1,290 @@
+"""
+Metrics
+Latency histograms, counters and gauges for the message pipeline, exposed
+in the Prometheus text format on a local HTTP endpoint (METRICS_PORT) and
+summarized by the !stats command
+"""
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from aiohttp import web
+
+# Histogram upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Pipeline stages, in the order they are reported by !stats
+STAGES = ('parse', 'queue', 'quote', 'chart', 'indicators', 'embed', 'send', 'reply')
+
+HELP = {
+    'stage_seconds': 'Latency of each message pipeline stage',
+    'stage_in_flight': 'Pipeline stages currently running',
+    'upstream_seconds': 'Latency of upstream API calls',
+    'upstream_requests_total': 'Upstream API calls by outcome',
+    'event_loop_lag_seconds': 'Delay of the event loop in running a scheduled callback',
+    'errors_total': 'Unhandled errors by event',
+    'queue_depth': 'Ticker jobs waiting for a worker',
+    'queue_shed_total': 'Ticker jobs dropped because the queue was full, by priority',
+    'throttled_total': 'Ticker requests refused by the per-user or per-channel limit',
+    'startup_seconds': 'Seconds from process start to each startup phase',
+    'alerts_active': 'Price alerts waiting to trigger',
+    'alerts_triggered_total': 'Price alerts triggered',
+}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside its bucket
+
+        Returns:
+            float: Estimated value in seconds, 0.0 if nothing was observed
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets, self.counts):
+            if seen + count >= rank:
+                estimate = lower + (upper - lower) * (rank - seen) / count if count else lower
+                return min(estimate, self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+
+class Metrics:
+    """
+    Process-wide metric registry
+
+    Series are keyed by metric name and label values. Cache counters are
+    read from the registered caches when the metrics are rendered.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}  # (name, labels) -> float
+        self.gauges = {}  # (name, labels) -> float
+        self.caches = {}  # name -> AsyncTTLCache
+        self.started = time.time()
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram"""
+        key = (name, _labels(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = (name, _labels(labels))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges[(name, _labels(labels))] = value
+
+    def add_gauge(self, name, amount, **labels):
+        key = (name, _labels(labels))
+        self.gauges[key] = self.gauges.get(key, 0) + amount
+
+    def register_cache(self, name, cache):
+        """Report the hit counters of an AsyncTTLCache under cache=name"""
+        self.caches[name] = cache
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time a pipeline stage and count it as in flight while it runs
+
+        Usage:
+            with metrics.timer('quote'):
+                info = await ...
+        """
+        self.add_gauge('stage_in_flight', 1, stage=stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+            self.add_gauge('stage_in_flight', -1, stage=stage)
+
+    async def timed(self, stage, awaitable):
+        """Await an awaitable inside timer(stage) and return its result"""
+        with self.timer(stage):
+            return await awaitable
+
+    def record_upstream(self, upstream, status, seconds=None):
+        """
+        Count one upstream call by outcome
+
+        Args:
+            upstream (str): 'yahoo', 'chartimg' or 'discord'
+            status: HTTP status code, or 'ok', 'timeout', 'error',
+                'rate_limited', 'circuit_open'
+            seconds (float): Call latency, or None if no call was made
+        """
+        self.increment('upstream_requests_total', upstream=upstream, status=str(status))
+        if seconds is not None:
+            self.observe('upstream_seconds', seconds, upstream=upstream)
+
+    async def watch_loop_lag(self, interval=1.0):
+        """
+        Measure how late the event loop wakes up from a sleep, forever
+
+        A lag of more than a few milliseconds means some callback blocked
+        the loop (and every reply waiting behind it).
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - start - interval)
+            self.observe('event_loop_lag_seconds', lag)
+            self.set_gauge('event_loop_lag_last_seconds', lag)
+
+    def _cache_samples(self):
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            labels = (('cache', name),)
+            for field in ('hits', 'misses', 'coalesced', 'shared_hits'):
+                yield f'cache_{field}_total', 'counter', labels, stats[field]
+            yield 'cache_hit_ratio', 'gauge', labels, stats['hit_ratio']
+            yield 'cache_entries', 'gauge', labels, stats['size']
+            yield 'cache_weight', 'gauge', labels, stats['weight']
+
+    def render(self):
+        """
+        Render every series in the Prometheus text exposition format
+
+        Returns:
+            str: Metrics page
+        """
+        families = {}  # name -> (type, [lines])
+
+        def family(name, kind):
+            return families.setdefault(name, (kind, []))[1]
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            lines = family(name, 'histogram')
+            cumulative = 0
+            for upper, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if upper == float('inf') else repr(upper)
+                lines.append(f'{name}_bucket{_format_labels(labels, (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum!r}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        for (name, labels), value in sorted(self.counters.items()):
+            family(name, 'counter').append(f'{name}{_format_labels(labels)} {value}')
+        for (name, labels), value in sorted(self.gauges.items()):
+            family(name, 'gauge').append(f'{name}{_format_labels(labels)} {value}')
+        for name, kind, labels, value in self._cache_samples():
+            family(name, kind).append(f'{name}{_format_labels(labels)} {value}')
+        family('uptime_seconds', 'gauge').append(f'uptime_seconds {time.time() - self.started:.0f}')
+
+        output = []
+        for name, (kind, lines) in families.items():
+            if name in HELP:
+                output.append(f'# HELP {name} {HELP[name]}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(lines)
+        return '\n'.join(output) + '\n'
+
+    def summary(self):
+        """
+        Compact text report for the !stats command
+
+        Returns:
+            str: Stage latencies, cache hit ratios, upstream outcomes,
+            in-flight stages and event loop lag
+        """
+        lines = [f"{'Étape':<11}{'n':>7}{'p50':>9}{'p95':>9}{'max':>9}"]
+        for stage in STAGES:
+            histogram = self.histograms.get(('stage_seconds', (('stage', stage),)))
+            if histogram is None:
+                continue
+            lines.append(
+                f"{stage:<11}{histogram.count:>7}"
+                f"{histogram.quantile(0.5) * 1000:>7.1f}ms{histogram.quantile(0.95) * 1000:>7.1f}ms"
+                f"{histogram.max * 1000:>7.1f}ms"
+            )
+
+        if self.caches:
+            ratios = ', '.join(
+                f"{name} {stats['hit_ratio']:.0%} ({stats['size']})"
+                for name, stats in ((name, cache.stats()) for name, cache in self.caches.items())
+            )
+            lines.append(f"Caches: {ratios}")
+
+        upstream = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            if name == 'upstream_requests_total':
+                labels = dict(labels)
+                upstream.setdefault(labels['upstream'], []).append(f"{labels['status']} {value:.0f}")
+        for name, outcomes in upstream.items():
+            lines.append(f"{name}: {', '.join(outcomes)}")
+
+        in_flight = sum(value for (name, _), value in self.gauges.items() if name == 'stage_in_flight')
+        lag = self.histograms.get(('event_loop_lag_seconds', ()))
+        lag_text = f"{lag.quantile(0.95) * 1000:.1f}ms p95, {lag.max * 1000:.0f}ms max" if lag else "n/a"
+        lines.append(f"En cours: {in_flight:.0f} · Latence boucle: {lag_text}")
+        return '\n'.join(lines)
+
+
+async def start_metrics_server(registry, host, port):
+    """
+    Serve GET /metrics in the Prometheus text format
+
+    Args:
+        registry (Metrics): Metrics to expose
+        host (str): Interface to bind, 127.0.0.1 keeps the endpoint local
+        port (int): TCP port
+
+    Returns:
+        web.AppRunner: Runner to clean up on shutdown
+    """
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# Shared registry for the whole process
+metrics = Metrics()
@@ -0,0 +1,72 @@
+"""
+Popularity Tracking
+Exponentially decayed request counts per symbol, used to pick the hot
+symbols that are refreshed ahead of their cache expiry
+"""
+import heapq
+import math
+import time
+
+
+class PopularityTracker:
+    """
+    Tracks how often each symbol is requested, with exponential decay
+
+    A request adds 1 to the symbol's score and scores halve every
+    `half_life` seconds, so the ranking follows current traffic.
+    """
+
+    def __init__(self, half_life=1800, maxsize=5000):
+        """
+        Args:
+            half_life (float): Seconds for a score to decay by half
+            maxsize (int): Symbols tracked before the coldest are dropped
+        """
+        self.decay = math.log(2) / half_life
+        self.maxsize = maxsize
+        self._scores = {}  # symbol -> (score, updated_at)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def _decayed(self, score, updated_at, now):
+        return score * math.exp(-self.decay * (now - updated_at))
+
+    def record(self, symbol, weight=1.0):
+        """Count one request for a symbol"""
+        now = time.monotonic()
+        score, updated_at = self._scores.get(symbol, (0.0, now))
+        self._scores[symbol] = (self._decayed(score, updated_at, now) + weight, now)
+        if len(self._scores) > self.maxsize:
+            self._prune(now)
+
+    def score(self, symbol):
+        """Current decayed score of a symbol"""
+        entry = self._scores.get(symbol)
+        if entry is None:
+            return 0.0
+        return self._decayed(*entry, time.monotonic())
+
+    def top(self, n):
+        """
+        Return the n most requested symbols
+
+        Returns:
+            list: (symbol, score) pairs, highest score first
+        """
+        now = time.monotonic()
+        return heapq.nlargest(
+            n,
+            ((symbol, self._decayed(score, updated_at, now))
+             for symbol, (score, updated_at) in self._scores.items()),
+            key=lambda item: item[1]
+        )
+
+    def _prune(self, now):
+        # Keep the hottest three quarters
+        keep = heapq.nlargest(
+            self.maxsize * 3 // 4,
+            self._scores.items(),
+            key=lambda item: self._decayed(*item[1], now)
+        )
+        self._scores = dict(keep)
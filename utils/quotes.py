@@ -0,0 +1,476 @@
+"""
+Quote Fetcher
+Runs the blocking yfinance lookups on a bounded thread pool so the
+Discord event loop keeps serving heartbeats and other messages.
+Lookups arriving within a short window are resolved with one bulk request.
+
+yfinance (and the pandas stack behind it) is imported by the fetch functions
+on first use rather than at module load, so it does not delay startup; the
+cog warms it in the background once connected (see utils.startup).
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from config import (QUOTE_WORKERS, QUOTE_TIMEOUT_SECONDS, QUOTE_BATCH_WINDOW, QUOTE_BATCH_SIZE,
+                    YAHOO_RATE_LIMIT, YAHOO_BURST, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+from utils.ratelimit import TokenBucket, PRIORITY_PASSIVE
+from utils.circuit import CircuitBreaker
+from utils.metrics import metrics
+from utils.history import HISTORY_INTERVALS, STORED_INTERVALS, merge_bars
+
+
+class QuoteUnavailable(Exception):
+    """Raised when a quote could not be fetched (timeout, rate limit or upstream error)"""
+
+
+class CircuitOpen(QuoteUnavailable):
+    """Raised without calling Yahoo while the circuit breaker is open"""
+
+
+class RateLimited(QuoteUnavailable):
+    """Raised without calling Yahoo when the rate limiter refuses the request"""
+
+
+def _first(info, *keys):
+    """Value of the first key present and not None in a yfinance info dict"""
+    for key in keys:
+        value = info.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+class Quote:
+    """
+    Quote fields shown in the stock embed
+
+    Extracted once at fetch time from yfinance's info dict (hundreds of keys
+    per symbol), so the quote cache holds a few floats per symbol and the
+    formatting code reads plain attributes. Missing values are None.
+    """
+
+    __slots__ = ('price', 'previous_close', 'name', 'volume', 'market_cap', 'pe_ratio',
+                 'day_low', 'day_high', 'year_low', 'year_high', 'fetched_at')
+
+    # Fields a bulk download (daily bars only) cannot provide
+    DESCRIPTIVE_FIELDS = ('name', 'market_cap', 'pe_ratio')
+
+    def __init__(self, price, previous_close=None, name=None, volume=None, market_cap=None, pe_ratio=None,
+                 day_low=None, day_high=None, year_low=None, year_high=None, fetched_at=None):
+        self.price = price
+        self.previous_close = previous_close
+        self.name = name
+        self.volume = volume
+        self.market_cap = market_cap
+        self.pe_ratio = pe_ratio
+        self.day_low = day_low
+        self.day_high = day_high
+        self.year_low = year_low
+        self.year_high = year_high
+        self.fetched_at = time.time() if fetched_at is None else fetched_at  # Epoch seconds
+
+    @classmethod
+    def from_info(cls, info):
+        """Extract a quote from a yfinance info dict, resolving its alternative keys"""
+        return cls(
+            price=_first(info, 'regularMarketPrice', 'currentPrice'),
+            previous_close=_first(info, 'regularMarketPreviousClose', 'previousClose'),
+            name=_first(info, 'longName', 'shortName'),
+            volume=_first(info, 'volume', 'regularMarketVolume'),
+            market_cap=info.get('marketCap'),
+            pe_ratio=_first(info, 'trailingPE', 'forwardPE'),
+            day_low=_first(info, 'regularMarketDayLow', 'dayLow'),
+            day_high=_first(info, 'regularMarketDayHigh', 'dayHigh'),
+            year_low=info.get('fiftyTwoWeekLow'),
+            year_high=info.get('fiftyTwoWeekHigh'),
+        )
+
+    def fill_missing(self, other):
+        """
+        Copy the descriptive fields this quote lacks from an earlier quote
+
+        Name, market cap and P/E move slowly, so an earlier full quote is a
+        better source for them than leaving a bulk quote's embed without.
+        """
+        for field in self.DESCRIPTIVE_FIELDS:
+            if getattr(self, field) is None:
+                setattr(self, field, getattr(other, field))
+
+    def fields(self):
+        """Field values in __slots__ order (the constructor's argument order)"""
+        return [getattr(self, field) for field in self.__slots__]
+
+    def __repr__(self):
+        return f"Quote({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+
+
+def _dump_quote(quote):
+    return json.dumps(quote.fields() if quote is not None else None).encode()
+
+
+def _load_quote(data):
+    value = json.loads(data)
+    if isinstance(value, dict):  # Info dict cached by an older version
+        return Quote.from_info(value)
+    return Quote(*value) if value is not None else None
+
+
+# (dumps, loads) pair storing quotes (or None for unknown symbols) in a shared cache backend
+QUOTE_SERIALIZER = (_dump_quote, _load_quote)
+
+
+def quote_fingerprint(quote):
+    """
+    Snapshot of the displayed fields of a quote
+
+    Two quotes with the same fingerprint render the same embed.
+
+    Returns:
+        tuple: Field values, without the fetch time
+    """
+    return (quote.price, quote.previous_close, quote.name, quote.volume, quote.market_cap, quote.pe_ratio,
+            quote.day_low, quote.day_high, quote.year_low, quote.year_high)
+
+
+def fetch_stock_info(symbol):
+    """
+    Fetch the quote of a symbol (blocking)
+
+    Args:
+        symbol (str): Stock ticker symbol
+
+    Returns:
+        Quote: Quote, or None if the symbol has no market price
+    """
+    import yfinance as yf
+
+    info = yf.Ticker(symbol).info
+
+    # Check if we got valid data
+    if not info or 'regularMarketPrice' not in info:
+        return None
+
+    return Quote.from_info(info)
+
+
+def _quote_from_history(history):
+    """
+    Build a quote from one year of daily bars
+
+    The bulk download only carries OHLCV data, so name, market cap and P/E
+    are absent; the cog fills them from the symbol's earlier quote and the
+    symbol directory (see StockTicker.fetch_quote).
+    """
+    last = history.iloc[-1]
+    return Quote(
+        price=float(last['Close']),
+        previous_close=float(history.iloc[-2]['Close']) if len(history) > 1 else None,
+        volume=float(last['Volume']),
+        day_low=float(last['Low']),
+        day_high=float(last['High']),
+        year_low=float(history['Low'].min()),
+        year_high=float(history['High'].max()),
+    )
+
+
+# yf.download reports per-ticker failures in a module-level dict it resets on
+# every call, so downloads are serialized to read the errors of their own call
+_DOWNLOAD_LOCK = threading.Lock()
+# Error text meaning Yahoo has no data for the symbol itself (not a failed request)
+UNKNOWN_SYMBOL_ERRORS = ('delisted', 'No data found', 'Quote not found', 'symbol may be delisted',
+                         'YFTzMissingError', 'YFPricesMissingError')
+
+
+def _download_errors():
+    """Per-ticker errors of the last yf.download call, as ticker -> message"""
+    try:
+        from yfinance import shared
+    except ImportError:
+        return {}
+    return {str(ticker).upper(): str(error) for ticker, error in (getattr(shared, '_ERRORS', None) or {}).items()}
+
+
+def fetch_stock_infos(symbols):
+    """
+    Fetch quotes for several symbols with a single bulk download (blocking)
+
+    yf.download does not raise for tickers whose request failed (rate limit,
+    HTTP error, timeout): it leaves their columns empty and records the
+    error. Those symbols get a QuoteUnavailable instead of a quote, so a
+    Yahoo outage is not mistaken for unknown symbols.
+
+    Args:
+        symbols (list): Stock ticker symbols
+
+    Returns:
+        dict: symbol -> Quote, None if Yahoo has no data for the symbol, or
+        a QuoteUnavailable if its download failed
+    """
+    if len(symbols) == 1:
+        return {symbols[0]: fetch_stock_info(symbols[0])}
+
+    import yfinance as yf
+
+    with _DOWNLOAD_LOCK:
+        data = yf.download(
+            symbols,
+            period='1y',
+            interval='1d',
+            group_by='ticker',
+            auto_adjust=False,
+            progress=False
+        )
+        errors = _download_errors()
+
+    results = {}
+    for symbol in symbols:
+        error = errors.get(symbol)
+        if error is not None and not any(marker in error for marker in UNKNOWN_SYMBOL_ERRORS):
+            results[symbol] = QuoteUnavailable(f"{symbol}: {error}")
+            continue
+        try:
+            history = data[symbol].dropna(subset=['Close'])
+        except KeyError:
+            history = None
+        results[symbol] = _quote_from_history(history) if history is not None and not history.empty else None
+    return results
+
+
+def fetch_ohlcv(symbol, yahoo_interval='1d', period=None, start=None):
+    """
+    Fetch OHLCV bars from Yahoo (blocking)
+
+    Args:
+        symbol (str): Stock ticker symbol
+        yahoo_interval (str): Yahoo bar size ('1m', '60m', '1d', ...)
+        period (str): Range to download ('5d', '1y', 'max'), if start is not given
+        start (float): Epoch seconds of the first bar to download
+
+    Returns:
+        dict: numpy arrays 'time' (epoch seconds), 'open', 'high', 'low',
+        'close' and 'volume', oldest first; None if there is no data
+    """
+    import yfinance as yf
+
+    ticker = yf.Ticker(symbol)
+    if start is not None:
+        history = ticker.history(start=datetime.fromtimestamp(start, timezone.utc), interval=yahoo_interval,
+                                 auto_adjust=False)
+    else:
+        history = ticker.history(period=period, interval=yahoo_interval, auto_adjust=False)
+    history = history.dropna(subset=['Open', 'High', 'Low', 'Close'])
+    if history.empty:
+        return None
+
+    return {
+        'time': history.index.asi8 // 1_000_000_000,
+        'open': history['Open'].to_numpy(dtype=np.float64),
+        'high': history['High'].to_numpy(dtype=np.float64),
+        'low': history['Low'].to_numpy(dtype=np.float64),
+        'close': history['Close'].to_numpy(dtype=np.float64),
+        'volume': history['Volume'].fillna(0).to_numpy(dtype=np.float64),
+    }
+
+
+class QuoteFetcher:
+    """
+    Async front-end for yfinance backed by a bounded thread pool
+
+    Symbols requested within QUOTE_BATCH_WINDOW seconds of each other are
+    collected and resolved together by fetch_stock_infos. Each batch takes
+    one token from the Yahoo rate limiter; repeated batch failures open the
+    circuit breaker and further lookups fail fast until it resets.
+    """
+
+    def __init__(self, max_workers=QUOTE_WORKERS, timeout=QUOTE_TIMEOUT_SECONDS,
+                 batch_window=QUOTE_BATCH_WINDOW, batch_size=QUOTE_BATCH_SIZE, limiter=None, store=None):
+        """
+        Args:
+            store (BarStore): Local history updated by history(); without one
+                the full period is downloaded on every call
+        """
+        self.timeout = timeout
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.limiter = limiter or TokenBucket(YAHOO_RATE_LIMIT, YAHOO_BURST)
+        self.breaker = CircuitBreaker('Yahoo', BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yfinance')
+        self._pending = {}  # symbol -> asyncio.Future
+        self._pending_priority = PRIORITY_PASSIVE
+        self._flush_handle = None
+
+    async def run(self, func, *args, timeout=None):
+        """
+        Run a blocking function on the quote pool with a timeout
+
+        Cancelling the awaiting task (or hitting the timeout) cancels the job
+        if it has not started yet; a job already running in a worker thread
+        is left to finish and its result is discarded.
+
+        Args:
+            func: Blocking callable
+            *args: Arguments passed to func
+            timeout (float): Seconds to wait, defaults to QUOTE_TIMEOUT_SECONDS
+
+        Returns:
+            The return value of func
+
+        Raises:
+            asyncio.TimeoutError: If the job did not finish in time
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, func, *args)
+        return await asyncio.wait_for(future, timeout or self.timeout)
+
+    async def fetch(self, symbol, timeout=None, priority=PRIORITY_PASSIVE):
+        """
+        Fetch the quote of a symbol without blocking the event loop
+
+        The lookup joins the current batch; the batch is sent when the
+        window elapses or it reaches QUOTE_BATCH_SIZE symbols.
+
+        Args:
+            symbol (str): Stock ticker symbol
+            timeout (float): Per-request timeout in seconds
+            priority (int): Rate limiter priority (see utils.ratelimit)
+
+        Returns:
+            Quote: Quote, or None if the symbol was not found
+
+        Raises:
+            QuoteUnavailable: On timeout or upstream error
+            RateLimited: When the rate limiter refused the batch
+            CircuitOpen: While Yahoo is considered down
+        """
+        future = self._pending.get(symbol)
+        if future is None and not self.breaker.allow():
+            metrics.record_upstream('yahoo', 'circuit_open')
+            raise CircuitOpen("Yahoo Finance indisponible")
+
+        loop = asyncio.get_running_loop()
+        if future is None:
+            future = loop.create_future()
+            self._pending[symbol] = future
+        # A batch is scheduled with the most urgent priority of its members
+        self._pending_priority = min(self._pending_priority, priority)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise QuoteUnavailable(f"Délai dépassé pour {symbol}") from None
+
+    async def history(self, symbol, interval='D', priority=PRIORITY_PASSIVE):
+        """
+        Fetch chart bars for a symbol and TradingView interval
+
+        With a bar store, only the bars newer than the stored history are
+        downloaded. Takes one token from the Yahoo rate limiter and counts
+        towards the circuit breaker like a quote batch.
+
+        Returns:
+            dict: OHLCV arrays, or None if there is no data for the interval
+            (Yahoo does not serve seconds intervals)
+
+        Raises:
+            QuoteUnavailable: On timeout or upstream error
+            RateLimited: When the rate limiter refused the request
+            CircuitOpen: While Yahoo is considered down
+        """
+        if interval not in HISTORY_INTERVALS:
+            return None
+        stored_interval, factor = HISTORY_INTERVALS[interval]
+
+        if not self.breaker.allow():
+            metrics.record_upstream('yahoo', 'circuit_open')
+            raise CircuitOpen("Yahoo Finance indisponible")
+        if not await self.limiter.acquire(priority, timeout=self.timeout):
+            metrics.record_upstream('yahoo', 'rate_limited')
+            raise RateLimited("Limite de requêtes Yahoo atteinte")
+        start = time.perf_counter()
+        try:
+            if self.store is not None:
+                bars = await self.run(self.store.sync, symbol, stored_interval, fetch_ohlcv)
+            else:
+                yahoo_interval, period, _ = STORED_INTERVALS[stored_interval]
+                bars = await self.run(fetch_ohlcv, symbol, yahoo_interval, period)
+        except asyncio.TimeoutError:
+            metrics.record_upstream('yahoo', 'timeout', time.perf_counter() - start)
+            self.breaker.record_failure()
+            raise QuoteUnavailable(f"Délai dépassé pour l'historique de {symbol}") from None
+        except Exception as e:
+            metrics.record_upstream('yahoo', 'error', time.perf_counter() - start)
+            self.breaker.record_failure()
+            raise QuoteUnavailable(str(e)) from e
+        metrics.record_upstream('yahoo', 'ok', time.perf_counter() - start)
+        self.breaker.record_success()
+        return merge_bars(bars, factor) if bars is not None else None
+
+    def _flush(self):
+        """Send every pending symbol as one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        priority, self._pending_priority = self._pending_priority, PRIORITY_PASSIVE
+        if batch:
+            asyncio.ensure_future(self._resolve(batch, priority))
+
+    async def _resolve(self, batch, priority):
+        symbols = list(batch)
+        results, error = {}, None
+        if not await self.limiter.acquire(priority, timeout=self.timeout):
+            metrics.record_upstream('yahoo', 'rate_limited')
+            error = RateLimited("Limite de requêtes Yahoo atteinte")
+        else:
+            start = time.perf_counter()
+            try:
+                results = await self.run(fetch_stock_infos, symbols)
+                failed = sum(isinstance(result, QuoteUnavailable) for result in results.values())
+                if failed and failed == len(symbols):
+                    # Every ticker of the batch failed: Yahoo is failing, not the symbols
+                    metrics.record_upstream('yahoo', 'error', time.perf_counter() - start)
+                    self.breaker.record_failure()
+                else:
+                    metrics.record_upstream('yahoo', 'ok', time.perf_counter() - start)
+                    self.breaker.record_success()
+            except asyncio.TimeoutError:
+                metrics.record_upstream('yahoo', 'timeout', time.perf_counter() - start)
+                error = QuoteUnavailable("Délai dépassé")
+                self.breaker.record_failure()
+            except Exception as e:
+                metrics.record_upstream('yahoo', 'error', time.perf_counter() - start)
+                error = QuoteUnavailable(str(e))
+                self.breaker.record_failure()
+
+        for symbol, future in batch.items():
+            if future.done():
+                continue
+            result = results.get(symbol)
+            if error is None and isinstance(result, QuoteUnavailable):
+                future.set_exception(result)
+                future.exception()
+            elif error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+                # Waiters may already have timed out; mark the exception as retrieved
+                future.exception()
+
+    def close(self):
+        """Stop accepting work and drop jobs that have not started"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,204 @@
+"""
+Upstream Rate Limiting
+Token bucket with prioritized waiters and a daily request quota, used in
+front of Yahoo Finance and chart-img.com
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# Request priorities (lower is served first)
+PRIORITY_COMMAND = 0  # Explicit !stock commands
+PRIORITY_PASSIVE = 1  # Passive $TICKER detection
+PRIORITY_PREFETCH = 2  # Background refresh of popular symbols
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter
+
+    Tokens refill continuously at `rate` per second up to `burst`. When the
+    bucket is empty, waiters are served by priority, then in arrival order.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        Args:
+            rate (float): Tokens added per second
+            burst (int): Bucket capacity
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._wakeup = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self):
+        """Tokens that could be taken right now (0 while requests are queued)"""
+        self._refill()
+        return 0 if self._waiters else int(self.tokens)
+
+    def try_acquire(self):
+        """Take a token if one is available right now, without waiting"""
+        self._refill()
+        if self.tokens >= 1 and not self._waiters:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, priority=PRIORITY_PASSIVE, timeout=None):
+        """
+        Wait for a token
+
+        Args:
+            priority (int): Waiter priority, lower is served first
+            timeout (float): Maximum seconds to wait, or None to wait forever
+
+        Returns:
+            bool: True if a token was taken, False on timeout
+        """
+        if self.try_acquire():
+            return True
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def _schedule(self):
+        if self._wakeup is not None or not self._waiters:
+            return
+        delay = max(0.0, (1 - self.tokens) / self.rate)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        """Hand available tokens to the highest priority waiters"""
+        self._wakeup = None
+        self._refill()
+        while self._waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.tokens -= 1
+            future.set_result(None)
+        # Drop waiters that gave up so they do not hold up the schedule
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        self._schedule()
+
+
+class KeyedLimiter:
+    """
+    One token bucket per key (user, channel), for throttling without waiting
+
+    Only the most recently used keys are kept; a key that was dropped starts
+    again with a full bucket, as it would have refilled meanwhile.
+    """
+
+    def __init__(self, rate, burst, maxsize=10_000):
+        """
+        Args:
+            rate (float): Tokens added per second for each key
+            burst (int): Bucket capacity for each key
+            maxsize (int): Keys tracked before the least recently used is dropped
+        """
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> TokenBucket
+
+    def available(self, key):
+        """Tokens the key could take right now, without taking one"""
+        bucket = self._buckets.get(key)
+        return self.burst if bucket is None else bucket.available()
+
+    def allow(self, key):
+        """
+        Take a token from the key's bucket
+
+        Returns:
+            bool: False if the key is over its rate
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.try_acquire()
+
+
+class DailyQuota:
+    """Counts requests against a budget that resets at midnight UTC"""
+
+    def __init__(self, limit):
+        """
+        Args:
+            limit (int): Requests allowed per day, 0 for unlimited
+        """
+        self.limit = limit
+        self.used = 0
+        self.exhausted = False  # Upstream refused a request for the rest of the day
+        self._day = self._today()
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    def _roll(self):
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self.used = 0
+            self.exhausted = False
+
+    def remaining(self):
+        """Requests left today, or None if unlimited"""
+        self._roll()
+        if self.exhausted:
+            return 0
+        if not self.limit:
+            return None
+        return max(0, self.limit - self.used)
+
+    def consume(self):
+        """
+        Count one request against today's budget
+
+        Returns:
+            bool: False if the budget was already used up
+        """
+        self._roll()
+        if self.exhausted or (self.limit and self.used >= self.limit):
+            return False
+        self.used += 1
+        return True
+
+    def exhaust(self):
+        """
+        Mark today's budget as used up (e.g. after the upstream refused a request)
+
+        Applies to unlimited budgets too: the upstream's own quota is the one that counts.
+        """
+        self._roll()
+        self.exhausted = True
+        if self.limit:
+            self.used = self.limit
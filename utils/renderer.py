@@ -0,0 +1,227 @@
+"""
+Local Chart Renderer
+Draws candlestick charts with volume and technical indicators from OHLCV
+bars, as an alternative to the chart-img.com API (CHART_RENDERER=local).
+Rendering is CPU-bound, so it runs in a process pool off the event loop.
+"""
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from config import CHART_RENDER_WORKERS, CHART_LOCAL_BARS
+from utils import indicators as ta
+
+THEMES = {
+    'dark': {
+        'background': '#131722', 'text': '#d1d4dc', 'grid': '#2a2e39',
+        'up': '#26a69a', 'down': '#ef5350',
+        'lines': ('#2962ff', '#ff6d00', '#ab47bc', '#00bcd4'),
+    },
+    'light': {
+        'background': '#ffffff', 'text': '#131722', 'grid': '#e0e3eb',
+        'up': '#089981', 'down': '#f23645',
+        'lines': ('#2962ff', '#ff6d00', '#9c27b0', '#00897b'),
+    },
+}
+
+# Indicators drawn over the price candles, the others get their own pane
+OVERLAYS = frozenset({
+    'Exponential Moving Average', 'Simple Moving Average', 'Weighted Moving Average',
+    'Bollinger Bands', 'Ichimoku Cloud',
+})
+
+
+def _draw_overlay(ax, name, bars, start, x, colors):
+    high, low, close = bars['high'], bars['low'], bars['close']
+    if name == 'Exponential Moving Average':
+        ax.plot(x, ta.ema(close)[start:], color=colors[0], linewidth=1, label='EMA 9')
+    elif name == 'Simple Moving Average':
+        ax.plot(x, ta.sma(close)[start:], color=colors[1], linewidth=1, label='SMA 9')
+    elif name == 'Weighted Moving Average':
+        ax.plot(x, ta.wma(close)[start:], color=colors[2], linewidth=1, label='WMA 9')
+    elif name == 'Bollinger Bands':
+        basis, upper, lower = (line[start:] for line in ta.bollinger(close))
+        ax.plot(x, basis, color=colors[1], linewidth=1, label='BB 20 2')
+        ax.plot(x, upper, color=colors[0], linewidth=0.8)
+        ax.plot(x, lower, color=colors[0], linewidth=0.8)
+        ax.fill_between(x, upper, lower, color=colors[0], alpha=0.06)
+    elif name == 'Ichimoku Cloud':
+        conversion, base, span_a, span_b = ta.ichimoku(high, low)
+        ax.plot(x, conversion[start:], color=colors[0], linewidth=1, label='Ichimoku 9 26 52')
+        ax.plot(x, base[start:], color=colors[3], linewidth=1)
+        # Leading spans are displaced 26 bars ahead
+        shifted = x + 26
+        ax.fill_between(shifted, span_a[start:], span_b[start:], where=span_a[start:] >= span_b[start:],
+                        color=colors[3], alpha=0.15)
+        ax.fill_between(shifted, span_a[start:], span_b[start:], where=span_a[start:] < span_b[start:],
+                        color=colors[2], alpha=0.15)
+
+
+def _draw_pane(ax, name, bars, start, x, theme):
+    from matplotlib.ticker import EngFormatter
+
+    high, low, close = bars['high'], bars['low'], bars['close']
+    colors = theme['lines']
+    if name == 'Relative Strength Index':
+        ax.plot(x, ta.rsi(close)[start:], color=colors[2], linewidth=1)
+        for level in (30, 70):
+            ax.axhline(level, color=theme['grid'], linewidth=0.8, linestyle='--')
+        ax.set_ylim(0, 100)
+        label = 'RSI 14'
+    elif name == 'MACD':
+        line, signal, histogram = (values[start:] for values in ta.macd(close))
+        ax.bar(x, histogram, width=0.6,
+               color=np.where(histogram >= 0, theme['up'], theme['down']), alpha=0.6)
+        ax.plot(x, line, color=colors[0], linewidth=1)
+        ax.plot(x, signal, color=colors[1], linewidth=1)
+        label = 'MACD 12 26 9'
+    elif name == 'Stochastic':
+        k, d = ta.stochastic(high, low, close)
+        ax.plot(x, k[start:], color=colors[0], linewidth=1)
+        ax.plot(x, d[start:], color=colors[1], linewidth=1)
+        for level in (20, 80):
+            ax.axhline(level, color=theme['grid'], linewidth=0.8, linestyle='--')
+        ax.set_ylim(0, 100)
+        label = 'Stoch 14 1 3'
+    elif name == 'Commodity Channel Index':
+        ax.plot(x, ta.cci(high, low, close)[start:], color=colors[3], linewidth=1)
+        for level in (-100, 100):
+            ax.axhline(level, color=theme['grid'], linewidth=0.8, linestyle='--')
+        label = 'CCI 20'
+    elif name == 'Average Directional Index':
+        value, plus_di, minus_di = ta.adx(high, low, close)
+        ax.plot(x, value[start:], color=colors[1], linewidth=1)
+        ax.plot(x, plus_di[start:], color=theme['up'], linewidth=0.8)
+        ax.plot(x, minus_di[start:], color=theme['down'], linewidth=0.8)
+        label = 'ADX 14'
+    elif name == 'Average True Range':
+        ax.plot(x, ta.atr(high, low, close)[start:], color=colors[2], linewidth=1)
+        label = 'ATR 14'
+    elif name == 'On Balance Volume':
+        ax.plot(x, ta.obv(close, bars['volume'])[start:], color=colors[0], linewidth=1)
+        ax.yaxis.set_major_formatter(EngFormatter())
+        label = 'OBV'
+    else:
+        return
+    ax.text(0.005, 0.95, label, transform=ax.transAxes, va='top', fontsize=7, color=theme['text'])
+
+
+def _time_labels(times, interval):
+    fmt = '%d/%m/%y' if interval in ('D', 'W', 'M') else '%d/%m %H:%M'
+    return [datetime.fromtimestamp(int(t), timezone.utc).strftime(fmt) for t in times]
+
+
+def render_chart_png(title, interval, bars, indicators=(), width=800, height=500, theme='dark'):
+    """
+    Draw a candlestick chart to PNG bytes (blocking, run in a worker process)
+
+    Indicators are computed on every bar and the last CHART_LOCAL_BARS are
+    drawn, so moving averages are already warmed up on the first candle.
+
+    Args:
+        title (str): Chart title, e.g. 'NASDAQ:AAPL'
+        interval (str): TradingView interval, used for the time axis format
+        bars (dict): OHLCV arrays (see QuoteFetcher.history)
+        indicators (tuple): Indicator names from TECHNICAL_INDICATORS
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        theme (str): 'dark' or 'light'
+
+    Returns:
+        bytes: PNG data
+    """
+    from matplotlib.figure import Figure
+
+    palette = THEMES.get(theme, THEMES['dark'])
+    count = len(bars['close'])
+    start = max(0, count - CHART_LOCAL_BARS)
+    x = np.arange(count - start)
+    opens, highs, lows, closes = (bars[key][start:] for key in ('open', 'high', 'low', 'close'))
+    volumes = bars['volume'][start:]
+
+    panes = [name for name in dict.fromkeys(indicators) if name not in OVERLAYS and name != 'Volume']
+    figure = Figure(figsize=(width / 100, height / 100), dpi=100, facecolor=palette['background'])
+    grid = figure.add_gridspec(2 + len(panes), 1, height_ratios=[4, 1] + [1.2] * len(panes), hspace=0.05)
+    price_ax = figure.add_subplot(grid[0])
+    axes = [price_ax] + [figure.add_subplot(grid[i], sharex=price_ax) for i in range(1, 2 + len(panes))]
+
+    for ax in axes:
+        ax.set_facecolor(palette['background'])
+        ax.tick_params(colors=palette['text'], labelsize=7)
+        ax.grid(color=palette['grid'], linewidth=0.5)
+        ax.yaxis.tick_right()
+        for spine in ax.spines.values():
+            spine.set_color(palette['grid'])
+        if ax is not axes[-1]:
+            ax.tick_params(labelbottom=False)
+
+    # Candles: wicks then bodies, one call each
+    rising = closes >= opens
+    colors = np.where(rising, palette['up'], palette['down'])
+    price_ax.vlines(x, lows, highs, colors=colors, linewidth=0.8)
+    price_ax.bar(x, np.maximum(np.abs(closes - opens), 1e-9), bottom=np.minimum(opens, closes),
+                 width=0.6, color=colors)
+
+    for name in dict.fromkeys(indicators):
+        if name in OVERLAYS:
+            _draw_overlay(price_ax, name, bars, start, x, palette['lines'])
+    if price_ax.get_legend_handles_labels()[0]:
+        price_ax.legend(loc='upper left', fontsize=7, facecolor=palette['background'],
+                        edgecolor=palette['grid'], labelcolor=palette['text'])
+    price_ax.set_title(title, color=palette['text'], fontsize=9, loc='left')
+    price_ax.set_xlim(-1, len(x))
+
+    axes[1].bar(x, volumes, width=0.6, color=colors, alpha=0.6)
+    axes[1].set_yticks([])
+    axes[1].text(0.005, 0.95, 'Volume', transform=axes[1].transAxes, va='top', fontsize=7,
+                 color=palette['text'])
+
+    for ax, name in zip(axes[2:], panes):
+        _draw_pane(ax, name, bars, start, x, palette)
+
+    ticks = x[::max(1, len(x) // 6)]
+    axes[-1].set_xticks(ticks)
+    axes[-1].set_xticklabels(_time_labels(bars['time'][start:][ticks], interval))
+
+    figure.subplots_adjust(left=0.02, right=0.92, top=0.94, bottom=0.07)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', facecolor=palette['background'])
+    return buffer.getvalue()
+
+
+class LocalChartRenderer:
+    """
+    Renders charts in a pool of worker processes
+
+    The pool is started on first use so the bot does not fork workers
+    when the local renderer is not selected.
+    """
+
+    def __init__(self, max_workers=CHART_RENDER_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+
+    async def render(self, title, interval, bars, indicators=(), width=800, height=500, theme='dark'):
+        """
+        Render a chart without blocking the event loop
+
+        Returns:
+            bytes: PNG data, or None if rendering failed
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, render_chart_png, title, interval, bars, tuple(indicators), width, height, theme
+            )
+        except Exception as e:
+            print(f"Erreur lors du rendu local du graphique {title}: {e!r}")
+            return None
+
+    def close(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
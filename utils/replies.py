@@ -0,0 +1,231 @@
+"""
+Reply Batcher
+Packs ticker embeds bound for the same channel into as few Discord
+messages as the API allows, and folds error notices into one summary
+"""
+import asyncio
+import io
+import os
+from config import (REPLY_BATCH_WINDOW, REPLY_MAX_EMBEDS, REPLY_MAX_FILES, REPLY_MAX_EMBED_CHARS,
+                    REPLY_MAX_UPLOAD_BYTES, REPLY_ERROR_DELETE_AFTER)
+
+# Error notice kind -> summary line, formatted with the joined symbols
+ERROR_LINES = {
+    'not_found': "❌ Impossible de trouver les données pour {symbols}. Vérifiez que le symbole est correct.",
+    'error': "❌ Erreur lors de la récupération des données pour {symbols}.",
+    'unavailable': "⏳ Données temporairement indisponibles pour {symbols}, réessayez dans quelques instants.",
+}
+
+
+def _file_size(file):
+    fp = file.fp
+    position = fp.tell()
+    size = fp.seek(0, io.SEEK_END)
+    fp.seek(position)
+    return size
+
+
+class _Reply:
+    __slots__ = ('embed', 'file', 'size', 'alone', 'future')
+
+    def __init__(self, embed, file, alone, future):
+        self.embed = embed
+        self.file = file
+        self.size = _file_size(file) if file is not None else 0
+        self.alone = alone
+        self.future = future
+
+
+class _ChannelBatch:
+    __slots__ = ('channel', 'replies', 'errors', 'handle', 'lock', 'flushing')
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.replies = []
+        self.errors = {}  # kind -> symbols, in order
+        self.handle = None
+        self.lock = asyncio.Lock()
+        self.flushing = 0
+
+    @property
+    def idle(self):
+        return not self.replies and not self.errors and self.handle is None and not self.flushing
+
+
+class ReplyBatcher:
+    """
+    Coalesces replies per channel for a short window
+
+    Replies queued for a channel within REPLY_BATCH_WINDOW seconds are sent
+    together, in queue order, packed up to Discord's per-message limits
+    (embeds, attachments, upload size and embed characters). A batch that
+    fills up is sent right away. Replies that must stay alone in their
+    message (live quotes, which are edited in place) are never packed.
+    """
+
+    def __init__(self, send, window=REPLY_BATCH_WINDOW, max_embeds=REPLY_MAX_EMBEDS, max_files=REPLY_MAX_FILES,
+                 max_chars=REPLY_MAX_EMBED_CHARS, max_bytes=REPLY_MAX_UPLOAD_BYTES):
+        """
+        Args:
+            send: Coroutine function (channel, embeds, files) sending one
+                message and returning it
+            window (float): Seconds a channel's first reply waits for others
+            max_embeds (int): Embeds per message
+            max_files (int): Attachments per message
+            max_chars (int): Total embed characters per message
+            max_bytes (int): Total attachment bytes per message, lowered to
+                the guild's own limit when it is smaller
+        """
+        self.send = send
+        self.window = window
+        self.max_embeds = max_embeds
+        self.max_files = max_files
+        self.max_chars = max_chars
+        self.max_bytes = max_bytes
+        self._batches = {}  # channel id -> _ChannelBatch
+        self._flushes = set()
+
+    def add(self, channel, embed, file=None, alone=False):
+        """
+        Queue a ticker reply
+
+        Args:
+            channel: Destination channel
+            embed (discord.Embed): Reply embed
+            file (discord.File): Chart attachment referenced by the embed, or None
+            alone (bool): Send in a message of its own, right away
+
+        Returns:
+            asyncio.Future: Resolved with the sent discord.Message
+        """
+        batch = self._batch(channel)
+        future = asyncio.get_running_loop().create_future()
+        batch.replies.append(_Reply(embed, file, alone, future))
+        if alone or len(batch.replies) >= self.max_embeds:
+            self._flush_now(batch)
+        else:
+            self._schedule(batch)
+        return future
+
+    def add_error(self, channel, kind, symbol):
+        """
+        Queue an error notice, folded into one summary message per batch
+
+        Args:
+            kind (str): 'not_found', 'unavailable' or 'error' (see ERROR_LINES)
+            symbol (str): Symbol the notice is about
+        """
+        batch = self._batch(channel)
+        symbols = batch.errors.setdefault(kind, [])
+        if symbol not in symbols:
+            symbols.append(symbol)
+        self._schedule(batch)
+
+    async def close(self):
+        """Send everything still queued"""
+        for batch in list(self._batches.values()):
+            self._flush_now(batch)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _batch(self, channel):
+        batch = self._batches.get(channel.id)
+        if batch is None:
+            batch = self._batches[channel.id] = _ChannelBatch(channel)
+        return batch
+
+    def _schedule(self, batch):
+        if batch.handle is None:
+            batch.handle = asyncio.get_running_loop().call_later(self.window, self._flush_now, batch)
+
+    def _flush_now(self, batch):
+        if batch.handle is not None:
+            batch.handle.cancel()
+            batch.handle = None
+        replies, batch.replies = batch.replies, []
+        errors, batch.errors = batch.errors, {}
+        if not replies and not errors:
+            return
+        batch.flushing += 1
+        task = asyncio.ensure_future(self._flush(batch, replies, errors))
+        self._flushes.add(task)
+        task.add_done_callback(lambda t: self._flush_done(batch, t))
+
+    def _flush_done(self, batch, task):
+        self._flushes.discard(task)
+        batch.flushing -= 1
+        # Forget idle channels so the map only holds channels with replies in progress
+        if batch.idle and self._batches.get(batch.channel.id) is batch:
+            del self._batches[batch.channel.id]
+
+    async def _flush(self, batch, replies, errors):
+        # The lock keeps the messages of successive flushes in queue order
+        async with batch.lock:
+            for chunk in self._pack(batch.channel, replies):
+                self._rename_duplicates(chunk)
+                embeds = [reply.embed for reply in chunk]
+                files = [reply.file for reply in chunk if reply.file is not None]
+                try:
+                    sent = await self.send(batch.channel, embeds, files)
+                except Exception as e:
+                    print(f"Erreur lors de l'envoi de {len(embeds)} réponse(s) dans le salon {batch.channel.id}: {e!r}")
+                    for reply in chunk:
+                        if not reply.future.done():
+                            reply.future.set_exception(e)
+                            # Callers may not await the future; mark the exception as retrieved
+                            reply.future.exception()
+                    continue
+                for reply in chunk:
+                    if not reply.future.done():
+                        reply.future.set_result(sent)
+
+            if errors:
+                lines = [
+                    ERROR_LINES[kind].format(symbols=', '.join(f"`${symbol}`" for symbol in symbols))
+                    for kind, symbols in errors.items()
+                ]
+                try:
+                    await batch.channel.send("\n".join(lines), delete_after=REPLY_ERROR_DELETE_AFTER)
+                except Exception as e:
+                    print(f"Erreur lors de l'envoi du résumé d'erreurs dans le salon {batch.channel.id}: {e!r}")
+
+    def _pack(self, channel, replies):
+        """Split replies into messages within the per-message limits"""
+        guild_limit = getattr(getattr(channel, 'guild', None), 'filesize_limit', None)
+        max_bytes = min(self.max_bytes, guild_limit) if guild_limit else self.max_bytes
+
+        chunk, files, size, chars = [], 0, 0, 0
+        for reply in replies:
+            reply_files = 1 if reply.file is not None else 0
+            reply_chars = len(reply.embed)
+            if chunk and (reply.alone or chunk[0].alone
+                          or len(chunk) >= self.max_embeds
+                          or files + reply_files > self.max_files
+                          or size + reply.size > max_bytes
+                          or chars + reply_chars > self.max_chars):
+                yield chunk
+                chunk, files, size, chars = [], 0, 0, 0
+            chunk.append(reply)
+            files += reply_files
+            size += reply.size
+            chars += reply_chars
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _rename_duplicates(chunk):
+        """Give each attachment of a message a distinct name, updating the embed that shows it"""
+        seen = set()
+        for reply in chunk:
+            if reply.file is None:
+                continue
+            name = reply.file.filename
+            stem, extension = os.path.splitext(name)
+            index = 1
+            while name in seen:
+                index += 1
+                name = f"{stem}_{index}{extension}"
+            seen.add(name)
+            if name != reply.file.filename:
+                reply.file.filename = name
+                reply.embed.set_image(url=f"attachment://{name}")
@@ -0,0 +1,88 @@
+"""
+Startup
+Timing of the startup path (imports, cog loading, gateway connection, first
+reply) and background warm-up of the heavy libraries kept off that path
+"""
+import asyncio
+import importlib
+import time
+from utils.metrics import metrics
+
+# Startup phases, in the order they normally complete
+PHASE_LABELS = {
+    'imports': "Imports",
+    'cogs': "Cogs chargés",
+    'connected': "Connecté à Discord",
+    'ready': "Prêt",
+    'warm': "Bibliothèques préchargées",
+    'first_reply': "Première réponse",
+}
+
+# Modules imported on first use by the reply pipeline, warmed once connected
+WARM_MODULES = ('yfinance', 'PIL.Image')
+
+
+class StartupTimer:
+    """
+    Seconds from process start to each startup phase
+
+    Only the first occurrence of a phase is kept, so reconnections do not
+    overwrite the cold start figures.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # phase -> seconds since start
+
+    def mark(self, phase):
+        """
+        Record a phase as reached now, if it was not already
+
+        Returns:
+            bool: True if the phase was recorded by this call
+        """
+        if phase in self.phases:
+            return False
+        elapsed = time.perf_counter() - self.started
+        self.phases[phase] = elapsed
+        metrics.set_gauge('startup_seconds', elapsed, phase=phase)
+        print(f"⏱️ Démarrage · {PHASE_LABELS.get(phase, phase)}: {elapsed:.2f}s")
+        return True
+
+    def report(self):
+        """
+        One-line summary of the phases reached so far
+
+        Returns:
+            str: Phases with their time since start, plus connect-to-first-reply
+            time once a reply was sent
+        """
+        parts = [f"{PHASE_LABELS.get(phase, phase)} {seconds:.2f}s" for phase, seconds in self.phases.items()]
+        if 'connected' in self.phases and 'first_reply' in self.phases:
+            parts.append(f"connexion → première réponse {self.phases['first_reply'] - self.phases['connected']:.2f}s")
+        return ' · '.join(parts)
+
+
+async def warm_imports(modules=WARM_MODULES):
+    """
+    Import modules in a worker thread so the first reply does not pay for them
+
+    Missing optional modules are skipped.
+
+    Returns:
+        dict: module name -> import seconds, for the modules imported
+    """
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(importlib.import_module, name)
+        except ImportError as e:
+            print(f"Préchargement de {name} impossible: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+# Started when this module is first imported, which main.py does before anything else
+startup = StartupTimer()
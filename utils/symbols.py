@@ -0,0 +1,264 @@
+"""
+Symbol Directory
+Compact sorted index of listed symbols (symbol -> exchange, type, name)
+built from NASDAQ Trader symbol directory files, and conversions between
+the symbol forms of messages, Yahoo Finance and TradingView
+"""
+import asyncio
+import bisect
+import os
+from collections import namedtuple
+from config import SYMBOL_FILES, CRYPTO_BASES, CRYPTO_QUOTES
+
+SymbolInfo = namedtuple('SymbolInfo', ['symbol', 'exchange', 'type', 'name'])
+
+# NASDAQ Trader exchange codes -> TradingView exchange prefix
+EXCHANGE_CODES = {
+    'Q': 'NASDAQ',
+    'N': 'NYSE',
+    'A': 'AMEX',     # NYSE American
+    'P': 'AMEX',     # NYSE Arca (listed as AMEX on TradingView)
+    'Z': 'CBOE',     # Cboe BZX
+    'V': 'NYSE',     # IEX
+}
+
+
+def split_crypto_pair(symbol):
+    """
+    Base and quote currency of a crypto pair written BTCUSD or BTC-USD
+
+    Returns:
+        tuple: (base, quote), or None if the symbol is not a known crypto pair
+    """
+    base, dash, quote = symbol.partition('-')
+    if dash:
+        return (base, quote) if base in CRYPTO_BASES and quote in CRYPTO_QUOTES else None
+    for quote in CRYPTO_QUOTES:
+        if symbol.endswith(quote) and symbol[:-len(quote)] in CRYPTO_BASES:
+            return symbol[:-len(quote)], quote
+    return None
+
+
+def normalize_symbol(symbol):
+    """
+    Yahoo Finance form of a symbol as typed in a message
+
+    Share classes use a dash and crypto pairs are split base-quote:
+
+    >>> normalize_symbol('AAPL')
+    'AAPL'
+    >>> normalize_symbol('BRK.B')
+    'BRK-B'
+    >>> normalize_symbol('BRK-B')
+    'BRK-B'
+    >>> normalize_symbol('BTCUSD')
+    'BTC-USD'
+    >>> normalize_symbol('BTC-USD')
+    'BTC-USD'
+    >>> normalize_symbol('ETHEUR')
+    'ETH-EUR'
+    """
+    pair = split_crypto_pair(symbol)
+    if pair is not None:
+        return '-'.join(pair)
+    return symbol.replace('.', '-')
+
+
+def listing_symbol(symbol):
+    """
+    Listing file and TradingView form of a normalized symbol
+
+    >>> listing_symbol('BRK-B')
+    'BRK.B'
+    >>> listing_symbol('BTC-USD')
+    'BTCUSD'
+    """
+    pair = split_crypto_pair(symbol)
+    if pair is not None:
+        return ''.join(pair)
+    return symbol.replace('-', '.')
+
+
+def parse_listing_file(path):
+    """
+    Parse a pipe-delimited listing file
+
+    Understands nasdaqlisted.txt (every row is NASDAQ), otherlisted.txt
+    (exchange code column) and any file with a header containing Symbol,
+    Exchange, ETF and Security Name columns. Test issues are skipped.
+
+    Args:
+        path (str): Path to the listing file
+
+    Yields:
+        tuple: (symbol, exchange, type, name)
+    """
+    with open(path, encoding='utf-8', errors='replace') as f:
+        header = [column.strip().lower() for column in f.readline().split('|')]
+        column = {name: i for i, name in enumerate(header)}
+        symbol_col = column.get('symbol', column.get('act symbol'))
+        if symbol_col is None:
+            raise ValueError(f"Colonne Symbol introuvable dans {path}")
+        exchange_col = column.get('exchange')
+        etf_col = column.get('etf')
+        name_col = column.get('security name', column.get('name'))
+        test_col = column.get('test issue')
+
+        for line in f:
+            # Skip the "File Creation Time" footer and malformed rows
+            if line.startswith('File Creation Time'):
+                continue
+            fields = line.rstrip('\r\n').split('|')
+            if len(fields) != len(header):
+                continue
+            if test_col is not None and fields[test_col] == 'Y':
+                continue
+
+            symbol = fields[symbol_col].strip().upper()
+            if not symbol:
+                continue
+            exchange = fields[exchange_col].strip() if exchange_col is not None else 'Q'
+            exchange = EXCHANGE_CODES.get(exchange, exchange.upper() or 'NYSE')
+            is_etf = etf_col is not None and fields[etf_col].strip() == 'Y'
+            name = fields[name_col].strip() if name_col is not None else ''
+            yield symbol, exchange, 'ETF' if is_etf else 'Stock', name
+
+
+class SymbolIndex:
+    """
+    Immutable lookup table stored as sorted parallel arrays
+
+    Symbols are kept in a sorted tuple and looked up with bisect; exchanges
+    and types are stored as one byte each, indexing small shared tables.
+    """
+
+    __slots__ = ('symbols', 'exchange_ids', 'type_ids', 'names', 'exchanges', 'types')
+
+    def __init__(self, rows=()):
+        """
+        Args:
+            rows: Iterable of (symbol, exchange, type, name); for duplicate
+                symbols the first row wins
+        """
+        entries = {}
+        for row in rows:
+            entries.setdefault(row[0], row)
+
+        self.exchanges = sorted({row[1] for row in entries.values()})
+        self.types = sorted({row[2] for row in entries.values()})
+        exchange_ids = {exchange: i for i, exchange in enumerate(self.exchanges)}
+        type_ids = {kind: i for i, kind in enumerate(self.types)}
+
+        ordered = [entries[symbol] for symbol in sorted(entries)]
+        self.symbols = tuple(row[0] for row in ordered)
+        self.exchange_ids = bytes(exchange_ids[row[1]] for row in ordered)
+        self.type_ids = bytes(type_ids[row[2]] for row in ordered)
+        self.names = tuple(row[3] for row in ordered)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _position(self, symbol):
+        i = bisect.bisect_left(self.symbols, symbol)
+        if i < len(self.symbols) and self.symbols[i] == symbol:
+            return i
+        return None
+
+    def __contains__(self, symbol):
+        return self._position(symbol) is not None
+
+    def lookup(self, symbol):
+        """
+        Look up a symbol
+
+        Returns:
+            SymbolInfo: Listing details, or None if the symbol is not listed
+        """
+        i = self._position(symbol)
+        if i is None:
+            return None
+        return SymbolInfo(
+            self.symbols[i],
+            self.exchanges[self.exchange_ids[i]],
+            self.types[self.type_ids[i]],
+            self.names[i]
+        )
+
+
+class SymbolDirectory:
+    """
+    Reloadable symbol directory
+
+    The index is rebuilt off the event loop when a listing file changes
+    and swapped in atomically; lookups always see a complete index.
+    """
+
+    def __init__(self, paths=SYMBOL_FILES):
+        self.paths = paths
+        self.index = SymbolIndex()
+        self._mtimes = None
+
+    @property
+    def loaded(self):
+        """True if at least one symbol was loaded"""
+        return len(self.index) > 0
+
+    def lookup(self, symbol):
+        """
+        Look up a normalized symbol (see normalize_symbol) in the current index
+
+        Crypto pairs are not in the listing files and are always accepted,
+        on TradingView's CRYPTO exchange.
+        """
+        if split_crypto_pair(symbol) is not None:
+            return SymbolInfo(symbol, 'CRYPTO', 'Crypto', '')
+        return self.index.lookup(listing_symbol(symbol))
+
+    def __contains__(self, symbol):
+        return split_crypto_pair(symbol) is not None or listing_symbol(symbol) in self.index
+
+    def _current_mtimes(self):
+        return tuple(
+            os.path.getmtime(path) if os.path.exists(path) else None
+            for path in self.paths
+        )
+
+    def load(self):
+        """
+        Rebuild the index from the listing files (blocking)
+
+        Missing files are skipped, so without any listing file the index
+        stays empty and callers fall back to their defaults.
+
+        Returns:
+            bool: True if the index was replaced
+        """
+        mtimes = self._current_mtimes()
+        if mtimes == self._mtimes:
+            return False
+
+        rows = []
+        for path in self.paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                rows.extend(parse_listing_file(path))
+            except Exception as e:
+                print(f"Erreur lors du chargement de la liste de symboles {path}: {e}")
+
+        self.index = SymbolIndex(rows)
+        self._mtimes = mtimes
+        return True
+
+    async def reload(self):
+        """
+        Rebuild the index in a worker thread if a listing file changed
+
+        Returns:
+            bool: True if the index was replaced
+        """
+        return await asyncio.to_thread(self.load)
+
+
+# Shared directory used by the TradingView helpers and the cog
+symbol_directory = SymbolDirectory()
@@ -0,0 +1,106 @@
+"""
+Ticker Tokenizer
+Single-pass parser turning message text into ticker requests
+
+Grammar: a $SYMBOL followed by any run of timeframes, indicators and
+keywords, separated by spaces or commas. The run stops at the first
+word that is none of those.
+
+    $AAPL                    -> AAPL, 1 day
+    $TSLA 1h EMA,RSI         -> TSLA, 1 hour, EMA + RSI
+    $MSFT 1h 4h MACD         -> one request per timeframe
+    $BRK.B $BTCUSD $BTC-USD  -> BRK-B, BTC-USD, BTC-USD (Yahoo forms)
+    $NVDA live               -> keyword options
+    $AAPL 1h 4h 1d multi     -> one request for a grid of timeframes
+"""
+import re
+from typing import NamedTuple
+from config import (TIMEFRAME_MAPPING, TECHNICAL_INDICATORS, CHART_INTERVALS, LIVE_KEYWORD, MULTI_KEYWORD,
+                    MULTI_MAX_INTERVALS)
+from utils.symbols import normalize_symbol
+
+# $ + letter-led symbol (up to 10 chars) with an optional .B / -USD style suffix
+SYMBOL_PATTERN = re.compile(r'\$([A-Z][A-Z0-9]{0,9}(?:[.\-][A-Z0-9]{1,5})?)(?![A-Za-z0-9]|[.\-][A-Za-z0-9])')
+# Next word after the symbol, separated by spaces and/or commas
+WORD_PATTERN = re.compile(r'[ \t,]+([A-Za-z0-9]+)')
+
+# Lookup tables built once; exact case first so 1M (month) and 1m (minute) differ
+TIMEFRAMES = {key: value for key, value in TIMEFRAME_MAPPING.items() if key != 'default'}
+TIMEFRAMES_LOWER = {key.lower(): value for key, value in reversed(TIMEFRAMES.items())}
+DEFAULT_INTERVAL = TIMEFRAME_MAPPING['default']
+KEYWORDS = frozenset({LIVE_KEYWORD, MULTI_KEYWORD})
+# Timeframes of a multi request without explicit ones (1h, 4h, 1d)
+MULTI_DEFAULT_INTERVALS = tuple(CHART_INTERVALS.values())
+# TradingView interval -> first label mapping to it, for display ('60' -> '1h')
+INTERVAL_LABELS = {value: key for key, value in reversed(TIMEFRAMES.items())}
+
+
+class TickerRequest(NamedTuple):
+    """One ticker request parsed from a message"""
+    symbol: str
+    interval: str
+    indicators: tuple = ()
+    options: frozenset = frozenset()
+    # Timeframes of a multi-timeframe grid, empty for a single chart
+    intervals: tuple = ()
+
+
+def tokenize(content):
+    """
+    Extract ticker requests from message text
+
+    Messages without a '$' are rejected before any regex work.
+
+    Args:
+        content (str): Message text
+
+    Returns:
+        list: TickerRequest tuples in order of appearance
+
+    Symbols are normalized to their Yahoo Finance form:
+
+    >>> [request.symbol for request in tokenize('$BRK.B $BTCUSD $BTC-USD $AAPL')]
+    ['BRK-B', 'BTC-USD', 'BTC-USD', 'AAPL']
+    """
+    if '$' not in content:
+        return []
+
+    requests = []
+    for match in SYMBOL_PATTERN.finditer(content):
+        intervals = []
+        indicators = []
+        options = set()
+
+        pos = match.end()
+        while True:
+            word_match = WORD_PATTERN.match(content, pos)
+            if word_match is None:
+                break
+            word = word_match.group(1)
+            lower = word.lower()
+
+            interval = TIMEFRAMES.get(word) or TIMEFRAMES_LOWER.get(lower)
+            if interval is not None:
+                if interval not in intervals:
+                    intervals.append(interval)
+            elif lower in TECHNICAL_INDICATORS:
+                indicator = TECHNICAL_INDICATORS[lower]
+                if indicator not in indicators:
+                    indicators.append(indicator)
+            elif lower in KEYWORDS:
+                options.add(lower)
+            else:
+                break
+            pos = word_match.end()
+
+        symbol = normalize_symbol(match.group(1))
+        indicators = tuple(indicators)
+        options = frozenset(options)
+        if MULTI_KEYWORD in options:
+            grid = tuple(intervals[:MULTI_MAX_INTERVALS]) or MULTI_DEFAULT_INTERVALS
+            requests.append(TickerRequest(symbol, grid[0], indicators, options, grid))
+            continue
+        for interval in intervals or [DEFAULT_INTERVAL]:
+            requests.append(TickerRequest(symbol, interval, indicators, options))
+
+    return requests
@@ -3,33 +3,87 @@ TradingView URL Generator
 Generates direct links to TradingView charts with specific intervals
 Also supports embedded chart images via chart-img.com API
 """
-from config import CHART_INTERVALS, CHARTIMG_API_KEY, USE_EMBEDDED_CHARTS
+from config import (CHART_INTERVALS, CHARTIMG_API_KEY, USE_EMBEDDED_CHARTS, CHART_CACHE_MAX_TTL,
+                    CHARTIMG_API_URL, CHARTIMG_MAX_CONNECTIONS, CHARTIMG_KEEPALIVE_SECONDS,
+                    CHARTIMG_CONNECT_TIMEOUT, CHARTIMG_READ_TIMEOUT, CHARTIMG_TOTAL_TIMEOUT)
+from utils.symbols import symbol_directory, listing_symbol
+from utils.tokenizer import INTERVAL_LABELS
+from utils.metrics import metrics
+import asyncio
+import functools
+import time
 import aiohttp
 import urllib.parse
 
 
+# Common NASDAQ stocks, used when no symbol directory is loaded
+NASDAQ_FALLBACK = frozenset({
+    'AAPL', 'MSFT', 'GOOGL', 'GOOG', 'AMZN', 'TSLA', 'META', 'NVDA',
+    'AMD', 'NFLX', 'INTC', 'CSCO', 'ADBE', 'PYPL', 'CMCSA', 'AVGO',
+    'TXN', 'QCOM', 'COST', 'SBUX', 'CHTR', 'INTU', 'AMGN', 'TMUS',
+    'GILD', 'MDLZ', 'VRTX', 'ADP', 'ISRG', 'FISV', 'BKNG', 'REGN',
+    'ATVI', 'CSX', 'ILMN', 'BIIB', 'MU', 'LRCX', 'ADSK', 'MNST'
+})
+
+# Words of a 429 body meaning the daily quota is used up, not just the request rate
+QUOTA_EXCEEDED_MARKERS = ('limit exceeded', 'quota', 'daily')
+
+
+class ChartImageError(Exception):
+    """
+    A chart-img.com request that returned no image
+
+    Attributes:
+        status: HTTP status of the response, or 'timeout' / 'error' when
+            no response was received
+    """
+
+    def __init__(self, status, message=''):
+        super().__init__(f"chart-img.com {status}: {message}" if message else f"chart-img.com {status}")
+        self.status = status
+        self.message = message
+
+    @property
+    def upstream_failure(self):
+        """True if chart-img.com is failing (5xx, timeout, connection error) rather than refusing the request"""
+        return not isinstance(self.status, int) or self.status >= 500
+
+    @property
+    def quota_exceeded(self):
+        """True if chart-img.com refused the request because the daily quota is used up"""
+        message = self.message.lower()
+        return self.status == 429 and any(marker in message for marker in QUOTA_EXCEEDED_MARKERS)
+
+
 def get_exchange_for_symbol(symbol):
     """
     Determine the exchange for a given stock symbol
-    This is a simplified version - in production, you'd want to use an API
-    to get the correct exchange.
-    """
-    # Common NASDAQ stocks
-    nasdaq_stocks = {
-        'AAPL', 'MSFT', 'GOOGL', 'GOOG', 'AMZN', 'TSLA', 'META', 'NVDA',
-        'AMD', 'NFLX', 'INTC', 'CSCO', 'ADBE', 'PYPL', 'CMCSA', 'AVGO',
-        'TXN', 'QCOM', 'COST', 'SBUX', 'CHTR', 'INTU', 'AMGN', 'TMUS',
-        'GILD', 'MDLZ', 'VRTX', 'ADP', 'ISRG', 'FISV', 'BKNG', 'REGN',
-        'ATVI', 'CSX', 'ILMN', 'BIIB', 'MU', 'LRCX', 'ADSK', 'MNST'
-    }
 
-    # Default to NASDAQ for tech stocks, NYSE for others
-    if symbol.upper() in nasdaq_stocks:
+    Uses the symbol directory loaded from the listing files (see
+    utils/symbols.py). Without it, falls back to a short list of NASDAQ
+    stocks and guesses NYSE for everything else.
+    """
+    symbol = symbol.upper()
+    info = symbol_directory.lookup(symbol)
+    if info is not None:
+        return info.exchange
+
+    if symbol in NASDAQ_FALLBACK:
         return 'NASDAQ'
     else:
         return 'NYSE'
 
 
+def tradingview_ticker(symbol):
+    """
+    TradingView ticker of a normalized symbol
+
+    Returns:
+        str: EXCHANGE:SYMBOL, e.g. 'NYSE:BRK.B' for BRK-B or 'CRYPTO:BTCUSD' for BTC-USD
+    """
+    return f"{get_exchange_for_symbol(symbol)}:{listing_symbol(symbol)}"
+
+
 def generate_tradingview_url(symbol, interval='60'):
     """
     Generate a TradingView chart URL for a given symbol and interval
@@ -41,9 +95,8 @@ def generate_tradingview_url(symbol, interval='60'):
     Returns:
         str: TradingView chart URL
     """
-    exchange = get_exchange_for_symbol(symbol)
     base_url = "https://www.tradingview.com/chart/"
-    params = f"?symbol={exchange}:{symbol}&interval={interval}"
+    params = f"?symbol={tradingview_ticker(symbol)}&interval={interval}"
     return base_url + params
 
 
@@ -63,10 +116,14 @@ def generate_all_chart_links(symbol):
     }
 
 
+@functools.lru_cache(maxsize=4096)
 def format_chart_links_markdown(symbol):
     """
     Format chart links as Discord markdown with clickable links
 
+    Cached per symbol; call format_chart_links_markdown.cache_clear() after
+    the symbol directory is reloaded.
+
     Args:
         symbol (str): Stock ticker symbol
 
@@ -81,7 +138,100 @@ def format_chart_links_markdown(symbol):
     return f"📊 **Graphiques TradingView:** {formatted}"
 
 
-async def generate_chart_image_bytes(symbol, interval='D', width=800, height=500, indicators=None):
+# TradingView interval -> chart-img.com interval
+CHARTIMG_INTERVALS = {
+    '60': '1h',
+    '240': '4h',
+    'D': '1D',
+    '1': '1m',
+    '3': '3m',
+    '5': '5m',
+    '15': '15m',
+    '30': '30m',
+    '45': '45m',
+    '120': '2h',
+    '180': '3h',
+    '360': '6h',
+    '480': '8h',
+    '720': '12h',
+    'W': '1W',
+    'M': '1M'
+}
+
+
+def build_chart_studies(indicators=None):
+    """
+    Build the list of studies drawn on a chart
+
+    Volume is always shown, followed by the requested indicators.
+
+    Args:
+        indicators (list): List of technical indicator names
+
+    Returns:
+        tuple: Study names in drawing order
+    """
+    return ('Volume',) + tuple(indicators or ())
+
+
+def chart_cache_key(symbol, interval='D', width=800, height=500, indicators=None, theme='dark'):
+    """
+    Build the cache key identifying a rendered chart image
+
+    Returns:
+        tuple: (ticker, interval, studies, width, height, theme)
+    """
+    return (tradingview_ticker(symbol), interval, build_chart_studies(indicators), width, height, theme)
+
+
+def chart_cache_ttl(interval):
+    """
+    How long a rendered chart stays fresh, based on its interval
+
+    Intraday charts live for about one bar (between 1 and 30 minutes),
+    daily charts 30 minutes and weekly/monthly charts 4 hours.
+
+    Args:
+        interval (str): TradingView interval ('1S', '5', '60', 'D', 'W', ...)
+
+    Returns:
+        int: Time-to-live in seconds
+    """
+    if interval.endswith('S'):
+        return 30
+    if interval.isdigit():
+        return min(max(int(interval) * 60, 60), CHART_CACHE_MAX_TTL)
+    if interval == 'D':
+        return CHART_CACHE_MAX_TTL
+    return 4 * 3600
+
+
+def create_chart_session():
+    """
+    Create the long-lived, connection-pooled HTTP session for chart-img.com
+
+    Must be called from a running event loop. The caller owns the session
+    and is responsible for closing it.
+
+    Returns:
+        aiohttp.ClientSession: Session with pooled keep-alive connections
+    """
+    connector = aiohttp.TCPConnector(
+        limit=CHARTIMG_MAX_CONNECTIONS,
+        limit_per_host=CHARTIMG_MAX_CONNECTIONS,
+        keepalive_timeout=CHARTIMG_KEEPALIVE_SECONDS,
+        ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=CHARTIMG_TOTAL_TIMEOUT,
+        connect=CHARTIMG_CONNECT_TIMEOUT,
+        sock_read=CHARTIMG_READ_TIMEOUT
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def generate_chart_image_bytes(symbol, interval='D', width=800, height=500, indicators=None,
+                                     session=None, theme='dark'):
     """
     Generate a chart image using chart-img.com API v2 and return image bytes
 
@@ -91,9 +241,16 @@ async def generate_chart_image_bytes(symbol, interval='D', width=800, height=500
         width (int): Image width in pixels (max 800 for free tier)
         height (int): Image height in pixels (max 600 for free tier)
         indicators (list): List of technical indicator names to display
+        session (aiohttp.ClientSession): Shared session from create_chart_session;
+            a temporary one is opened and closed when omitted
+        theme (str): Chart theme - 'dark' or 'light'
 
     Returns:
-        bytes: Image data as bytes, or None if API key not configured or error
+        bytes: Image data as bytes, or None if API key not configured
+
+    Raises:
+        ChartImageError: If chart-img.com answered with an error status or
+            could not be reached
 
     Note:
         Free tier limit is 800x600 pixels maximum
@@ -101,111 +258,100 @@ async def generate_chart_image_bytes(symbol, interval='D', width=800, height=500
     if not CHARTIMG_API_KEY:
         return None
 
-    exchange = get_exchange_for_symbol(symbol)
-    ticker = f"{exchange}:{symbol}"
+    ticker = tradingview_ticker(symbol)
 
     # Convert interval format if needed (60 -> 1h, 240 -> 4h)
-    interval_mapping = {
-        '60': '1h',
-        '240': '4h',
-        'D': '1D',
-        '1': '1m',
-        '3': '3m',
-        '5': '5m',
-        '15': '15m',
-        '30': '30m',
-        '45': '45m',
-        '120': '2h',
-        '180': '3h',
-        '360': '6h',
-        '480': '8h',
-        '720': '12h',
-        'W': '1W',
-        'M': '1M'
-    }
-    chart_interval = interval_mapping.get(interval, interval)
-
-    # chart-img.com API v2 endpoint
-    api_url = "https://api.chart-img.com/v2/tradingview/advanced-chart"
+    chart_interval = CHARTIMG_INTERVALS.get(interval, interval)
 
     headers = {
         'x-api-key': CHARTIMG_API_KEY,
         'content-type': 'application/json'
     }
 
-    # Build studies list (indicators)
-    studies = []
-
-    # Always add Volume by default if no indicators specified
-    if not indicators:
-        studies.append({
-            'name': 'Volume',
-            'forceOverlay': False
-        })
-    else:
-        # Add Volume + requested indicators
-        studies.append({
-            'name': 'Volume',
-            'forceOverlay': False
-        })
-        for indicator in indicators:
-            studies.append({
-                'name': indicator,
-                'forceOverlay': False
-            })
+    # Build studies list (Volume + requested indicators)
+    studies = [
+        {'name': name, 'forceOverlay': False}
+        for name in build_chart_studies(indicators)
+    ]
 
     payload = {
         'symbol': ticker,
         'interval': chart_interval,
         'width': width,
         'height': height,
-        'theme': 'dark',
+        'theme': theme,
         'studies': studies
     }
 
+    owns_session = session is None
+    if owns_session:
+        session = create_chart_session()
+
+    start = time.perf_counter()
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(api_url, headers=headers, json=payload) as response:
-                if response.status == 200:
-                    # API v2 returns the image data directly
-                    image_bytes = await response.read()
-                    return image_bytes
-                else:
-                    error_text = await response.text()
-                    print(f"Erreur API chart-img.com (status {response.status}): {error_text}")
-                    return None
+        async with session.post(CHARTIMG_API_URL, headers=headers, json=payload) as response:
+            if response.status == 200:
+                # API v2 returns the image data directly
+                image_bytes = await response.read()
+                metrics.record_upstream('chartimg', response.status, time.perf_counter() - start)
+                return image_bytes
+            else:
+                error_text = await response.text()
+                metrics.record_upstream('chartimg', response.status, time.perf_counter() - start)
+                print(f"Erreur API chart-img.com (status {response.status}): {error_text}")
+                raise ChartImageError(response.status, error_text)
+    except ChartImageError:
+        raise
+    except asyncio.TimeoutError:
+        metrics.record_upstream('chartimg', 'timeout', time.perf_counter() - start)
+        print(f"Délai dépassé lors de la génération du graphique pour {symbol}")
+        raise ChartImageError('timeout')
     except Exception as e:
+        metrics.record_upstream('chartimg', 'error', time.perf_counter() - start)
         print(f"Erreur lors de la génération du graphique: {e}")
         import traceback
         traceback.print_exc()
-        return None
+        raise ChartImageError('error', str(e)) from e
+    finally:
+        if owns_session:
+            await session.close()
 
 
-async def generate_multiple_chart_images(symbol, intervals=['60', '240', 'D']):
+async def generate_multiple_chart_images(symbol, intervals=('60', '240', 'D'), indicators=None,
+                                         session=None, theme='dark'):
     """
-    Generate multiple chart image URLs for different intervals
+    Generate chart images for several intervals concurrently
 
     Args:
         symbol (str): Stock ticker symbol
-        intervals (list): List of intervals to generate
+        intervals (tuple): TradingView intervals to generate
+        indicators (list): List of technical indicator names to display
+        session (aiohttp.ClientSession): Shared session from create_chart_session;
+            a temporary one is opened and closed when omitted
+        theme (str): Chart theme - 'dark' or 'light'
 
     Returns:
-        dict: Dictionary mapping interval names to image URLs
+        dict: Interval label ('1h', '4h', '1d', ...) -> image bytes, in
+        interval order; intervals that failed are left out
     """
     if not CHARTIMG_API_KEY:
         return {}
 
-    interval_map = {
-        '60': '1h',
-        '240': '4h',
-        'D': '1d'
-    }
+    owns_session = session is None
+    if owns_session:
+        session = create_chart_session()
 
-    charts = {}
-    for interval in intervals:
-        url = await generate_chart_image_url(symbol, interval)
-        if url:
-            interval_name = interval_map.get(interval, interval)
-            charts[interval_name] = url
+    try:
+        images = await asyncio.gather(*(
+            generate_chart_image_bytes(symbol, interval, indicators=indicators, session=session, theme=theme)
+            for interval in intervals
+        ), return_exceptions=True)
+    finally:
+        if owns_session:
+            await session.close()
 
-    return charts
+    return {
+        INTERVAL_LABELS.get(interval, interval): image
+        for interval, image in zip(intervals, images)
+        if isinstance(image, bytes) and image
+    }
@@ -0,0 +1,183 @@
+"""
+Live Quote Watches
+One central scheduler refreshes every watched symbol once per tick and
+fans the new quote out to all subscribed Discord messages
+"""
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, time as dtime
+from zoneinfo import ZoneInfo
+
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+
+def is_market_open(now=None):
+    """
+    Check whether US equity markets are in regular trading hours
+
+    Holidays are not taken into account.
+
+    Args:
+        now (datetime): Aware datetime to check, defaults to the current time
+    """
+    now = (now or datetime.now(MARKET_TIMEZONE)).astimezone(MARKET_TIMEZONE)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+class WatchSubscription:
+    """A Discord message kept up to date with the quote of one symbol"""
+
+    __slots__ = ('message', 'symbol', 'expires_at', 'fingerprint', 'image_url', 'request')
+
+    def __init__(self, message, symbol, expires_at, fingerprint=None, image_url=None, request=None):
+        self.message = message
+        self.symbol = symbol
+        self.expires_at = expires_at
+        self.fingerprint = fingerprint
+        self.image_url = image_url
+        self.request = request  # Details of the reply redrawn on each edit, e.g. interval and indicators
+
+    @property
+    def channel_id(self):
+        return self.message.channel.id
+
+
+class WatchScheduler:
+    """
+    Fan-out scheduler for live quote messages
+
+    Each tick fetches every watched symbol once, then edits only the
+    messages whose displayed quote changed, with a cap on edits per channel
+    to stay clear of Discord's rate limits. Edits skipped by the cap are
+    retried on the next tick.
+    """
+
+    def __init__(self, fetch_quotes, update_message, fingerprint, max_edits_per_channel=4):
+        """
+        Args:
+            fetch_quotes: Coroutine function taking a list of symbols and
+                returning a dict symbol -> quote (None if unavailable)
+            update_message: Coroutine function (subscription, quote) editing the
+                message; returns False if the message is gone
+            fingerprint: Function returning a comparable snapshot of the
+                displayed quote fields
+            max_edits_per_channel (int): Message edits per channel per tick
+        """
+        self.fetch_quotes = fetch_quotes
+        self.update_message = update_message
+        self.fingerprint = fingerprint
+        self.max_edits_per_channel = max_edits_per_channel
+        self._subscriptions = {}  # symbol -> {message_id: WatchSubscription}
+        self._reserved = Counter()  # channel id -> live messages being sent
+
+    def __len__(self):
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    @property
+    def symbols(self):
+        """Symbols with at least one live message"""
+        return list(self._subscriptions)
+
+    def channel_count(self, channel_id):
+        """Number of live messages in a channel"""
+        return sum(
+            1 for subs in self._subscriptions.values()
+            for sub in subs.values() if sub.channel_id == channel_id
+        )
+
+    def reserve(self, channel_id, limit):
+        """
+        Claim a live message slot in a channel before sending the message
+
+        Slots being sent count against the limit, so concurrent requests
+        cannot overshoot it. Give the slot back with release once the
+        message is subscribed or the send failed.
+
+        Returns:
+            bool: False if the channel already has `limit` live messages
+        """
+        if self.channel_count(channel_id) + self._reserved[channel_id] >= limit:
+            return False
+        self._reserved[channel_id] += 1
+        return True
+
+    def release(self, channel_id):
+        """Give back a slot claimed by reserve"""
+        self._reserved[channel_id] -= 1
+        if self._reserved[channel_id] <= 0:
+            del self._reserved[channel_id]
+
+    def subscribe(self, message, symbol, duration, quote=None, image_url=None, request=None):
+        """
+        Keep a message updated with the quote of a symbol
+
+        Args:
+            message (discord.Message): Message to edit
+            symbol (str): Stock ticker symbol
+            duration (float): Seconds before the watch expires
+            quote: Quote currently displayed, so unchanged quotes are not re-sent
+            image_url (str): Chart image to keep on the edited embed
+            request: Details of the reply passed back to update_message
+                with the subscription
+        """
+        fingerprint = self.fingerprint(quote) if quote is not None else None
+        self._subscriptions.setdefault(symbol, {})[message.id] = WatchSubscription(
+            message, symbol, time.monotonic() + duration, fingerprint, image_url, request
+        )
+
+    def unsubscribe(self, symbol, message_id):
+        """Stop updating a message"""
+        subs = self._subscriptions.get(symbol)
+        if subs is None:
+            return
+        subs.pop(message_id, None)
+        if not subs:
+            del self._subscriptions[symbol]
+
+    def _expire(self):
+        now = time.monotonic()
+        for symbol, subs in list(self._subscriptions.items()):
+            for message_id, sub in list(subs.items()):
+                if sub.expires_at <= now:
+                    self.unsubscribe(symbol, message_id)
+
+    async def tick(self):
+        """
+        Refresh every watched symbol once and update the changed messages
+
+        Returns:
+            int: Number of messages edited
+        """
+        self._expire()
+        if not self._subscriptions or not is_market_open():
+            return 0
+
+        quotes = await self.fetch_quotes(self.symbols)
+
+        edits = []
+        per_channel = Counter()
+        for symbol, subs in self._subscriptions.items():
+            quote = quotes.get(symbol)
+            if quote is None:
+                continue
+            fingerprint = self.fingerprint(quote)
+            for sub in subs.values():
+                if sub.fingerprint == fingerprint:
+                    continue
+                if per_channel[sub.channel_id] >= self.max_edits_per_channel:
+                    continue
+                per_channel[sub.channel_id] += 1
+                edits.append(self._apply(sub, quote, fingerprint))
+
+        results = await asyncio.gather(*edits, return_exceptions=True)
+        return sum(1 for result in results if result is True)
+
+    async def _apply(self, sub, quote, fingerprint):
+        if await self.update_message(sub, quote) is False:
+            self.unsubscribe(sub.symbol, sub.message.id)
+            return False
+        sub.fingerprint = fingerprint
+        return True
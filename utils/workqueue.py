@@ -0,0 +1,187 @@
+"""
+Ticker Work Queue
+Bounded, prioritized queue of ticker replies served by a fixed pool of
+workers, so a burst of messages cannot start unbounded upstream work.
+When the queue is full, passive detections are shed before commands.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from utils.ratelimit import PRIORITY_COMMAND, PRIORITY_PASSIVE, PRIORITY_PREFETCH
+from utils.metrics import metrics
+
+PRIORITIES = (PRIORITY_COMMAND, PRIORITY_PASSIVE, PRIORITY_PREFETCH)
+
+
+class Shed(Exception):
+    """Raised to the submitters of a job dropped because the queue was full"""
+
+
+class _Job:
+    __slots__ = ('key', 'work', 'priority', 'deadline', 'queued_at', 'waiters')
+
+    def __init__(self, key, work, priority, deadline):
+        self.key = key
+        self.work = work
+        self.priority = priority
+        self.deadline = deadline
+        self.queued_at = time.monotonic()
+        self.waiters = []
+
+
+class WorkQueue:
+    """
+    Fixed worker pool in front of a bounded, prioritized queue
+
+    Jobs are served by priority, then in arrival order. Submitting a key
+    that is already queued joins the pending job instead of taking a slot
+    (a command joining a passive job raises its priority); every submitter
+    gets the result, copied with `clone` for all but the first. A job still
+    queued at its deadline is shed; one that runs past it fails with
+    asyncio.TimeoutError.
+
+    When the queue is full, the oldest job of the lowest priority below the
+    new job's is shed to make room; if there is none, the new job is shed.
+    """
+
+    def __init__(self, workers, maxsize, timeout, clone=None):
+        """
+        Args:
+            workers (int): Jobs run concurrently
+            maxsize (int): Jobs waiting to run
+            timeout (float): Seconds from submission to result before a job
+                is abandoned
+            clone: Function copying a result for additional submitters, or
+                None to share the same object
+        """
+        self.workers = workers
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.clone = clone
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}  # key -> _Job
+        self._jobs = {}  # key -> _Job, queued or running
+        self._ready = asyncio.Event()
+        self._tasks = []
+        self.shed = 0
+        self.joined = 0
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def start(self):
+        """Start the workers (from a running event loop)"""
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop the workers and fail the jobs still queued"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for queue in self._queues.values():
+            while queue:
+                _, job = queue.popitem(last=False)
+                self._finish(job, error=Shed("File d'attente arrêtée"))
+
+    def submit(self, key, work, priority=PRIORITY_PASSIVE):
+        """
+        Queue a job, or join the identical job already pending
+
+        Args:
+            key: Hashable job identity used for deduplication
+            work: Zero-argument coroutine function producing the result
+            priority (int): PRIORITY_COMMAND, PRIORITY_PASSIVE or PRIORITY_PREFETCH
+
+        Returns:
+            asyncio.Future: Resolved with the result; fails with Shed if the
+            job was dropped under load, or asyncio.TimeoutError if it ran past
+            its deadline
+        """
+        future = asyncio.get_running_loop().create_future()
+        job = self._jobs.get(key)
+        if job is not None:
+            self.joined += 1
+            job.waiters.append(future)
+            if priority < job.priority and key in self._queues[job.priority]:
+                del self._queues[job.priority][key]
+                job.priority = priority
+                self._queues[priority][key] = job
+            return future
+
+        if len(self) >= self.maxsize and not self._make_room(priority):
+            self._count_shed(priority)
+            future.set_exception(Shed("File d'attente pleine"))
+            return future
+
+        job = _Job(key, work, priority, time.monotonic() + self.timeout)
+        job.waiters.append(future)
+        self._jobs[key] = job
+        self._queues[priority][key] = job
+        metrics.set_gauge('queue_depth', len(self))
+        self._ready.set()
+        return future
+
+    def _make_room(self, priority):
+        """Shed the oldest job of the lowest priority below `priority`"""
+        for lower in reversed(PRIORITIES):
+            if lower <= priority:
+                return False
+            queue = self._queues[lower]
+            if queue:
+                _, job = queue.popitem(last=False)
+                self._count_shed(lower)
+                self._finish(job, error=Shed("Requête abandonnée, bot surchargé"))
+                return True
+        return False
+
+    def _count_shed(self, priority):
+        self.shed += 1
+        metrics.increment('queue_shed_total', priority=priority)
+
+    def _next(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            if queue:
+                return queue.popitem(last=False)[1]
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._next()
+            if job is None:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            metrics.set_gauge('queue_depth', len(self))
+            metrics.observe('stage_seconds', time.monotonic() - job.queued_at, stage='queue')
+
+            remaining = job.deadline - time.monotonic()
+            if remaining <= 0:
+                self._count_shed(job.priority)
+                self._finish(job, error=Shed("Délai dépassé dans la file d'attente"))
+                continue
+            try:
+                result = await asyncio.wait_for(job.work(), remaining)
+            except asyncio.CancelledError:
+                self._finish(job, error=Shed("File d'attente arrêtée"))
+                raise
+            except Exception as e:
+                self._finish(job, error=e)
+            else:
+                self._finish(job, result=result)
+
+    def _finish(self, job, result=None, error=None):
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        first = True
+        for future in job.waiters:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+                # Submitters may have stopped waiting; mark the exception as retrieved
+                future.exception()
+            else:
+                future.set_result(result if first or self.clone is None else self.clone(result))
+                first = False